@@ -33,12 +33,13 @@ import gevent
 import copy
 import string
 import random
-import re
 import locale
 import threading
 import cStringIO
 import base64
+import hashlib
 import uuid
+import time
 
 from gevent import socket
 
@@ -49,6 +50,12 @@ import x2go.utils as utils
 import x2go.x2go_exceptions as x2go_exceptions
 import x2go.defaults as defaults
 import x2go.checkhosts as checkhosts
+import x2go.pubappcache as pubappcache
+import x2go.capcache as capcache
+import x2go.pubappmenu as pubappmenu
+import x2go.execoutput as execoutput
+import x2go.netmonitor as netmonitor
+import x2go.liveness as liveness
 
 from x2go.defaults import BACKENDS as _BACKENDS
 
@@ -126,6 +133,7 @@ class X2GoControlSession(paramiko.SSHClient):
                  logger=None, loglevel=log.loglevel_DEFAULT,
                  published_applications_no_submenus=0,
                  low_latency=False,
+                 auto_link=False,
                  **kwargs):
         """\
         Initialize an X2Go control session. For each connected session profile there will be one SSH-based
@@ -170,6 +178,9 @@ class X2GoControlSession(paramiko.SSHClient):
         @type loglevel: C{int}
         @param low_latency: set this boolean switch for weak connections, it will double all timeout values.
         @type low_latency: C{bool}
+        @param auto_link: measure the link quality while connecting (for sessions in C{auto} link mode,
+            see L{get_link_quality()})
+        @type auto_link: C{bool}
         @param kwargs: catch any non-defined parameters in C{kwargs}
         @type kwargs: C{dict}
 
@@ -213,6 +224,13 @@ class X2GoControlSession(paramiko.SSHClient):
         self.ssh_rootdir = ssh_rootdir
 
         self._published_applications_menu = {}
+        self._published_applications_cache = pubappcache.X2GoPublishedApplicationsCache(os.path.join(self.client_rootdir, defaults.X2GO_PUBAPP_CACHE_DIRNAME),
+                                                                                        logger=self.logger)
+        self._capability_cache = capcache.X2GoServerCapabilityCache(os.path.join(self.client_rootdir, defaults.X2GO_CAPCACHE_DIRNAME),
+                                                                    logger=self.logger)
+        self._capability_key = None
+        # server-side command tests that have succeeded (see X2GoTerminalSession.has_command())
+        self.available_commands = set()
 
         self.agent_chan = None
         self.agent_handler = None
@@ -222,13 +240,21 @@ class X2GoControlSession(paramiko.SSHClient):
             self.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
         self.session_died = False
+        self.liveness_monitor = None
 
         self.low_latency = low_latency
+        self.auto_link = auto_link
+        self._link_quality = None
+        self._link_quality_query = None
+        self.fast_start = defaults.X2GO_FASTSTART
 
         self.published_applications_no_submenus = published_applications_no_submenus
         self._already_querying_published_applications = threading.Lock()
 
         self._transport_lock = threading.Lock()
+        self._exec_channels = threading.BoundedSemaphore(defaults.X2GO_CONTROLSESSION_MAX_EXEC_CHANNELS)
+        self._exec_conflict_locks = {}
+        self._exec_conflict_locks_lock = threading.Lock()
 
     def set_hostname(self, hname):
         self.hostname = hname
@@ -282,7 +308,7 @@ class X2GoControlSession(paramiko.SSHClient):
         """
         Put a local file on the remote server via sFTP.
 
-        During sFTP operations, remote command execution gets blocked.
+        sFTP operations are serialized, remote command execution does not get blocked by them.
 
         @param local_path: full local path name of the file to be put on the server
         @type local_path: C{str}
@@ -333,7 +359,7 @@ class X2GoControlSession(paramiko.SSHClient):
         """
         Create a text file on the remote server via sFTP.
 
-        During sFTP operations, remote command execution gets blocked.
+        sFTP operations are serialized, remote command execution does not get blocked by them.
 
         @param remote_path: full remote path name of the server-side target location, path names have to be Unix-compliant
         @type remote_path: C{str}
@@ -389,7 +415,7 @@ class X2GoControlSession(paramiko.SSHClient):
         """
         Remote a remote file from the server via sFTP.
 
-        During sFTP operations, remote command execution gets blocked.
+        sFTP operations are serialized, remote command execution does not get blocked by them.
 
         @param remote_path: full remote path name of the server-side file to be removed, path names have to be Unix-compliant
         @type remote_path: C{str}
@@ -436,11 +462,78 @@ class X2GoControlSession(paramiko.SSHClient):
             self.sftp_client = None
         self._transport_lock.release()
 
-    def _x2go_exec_command(self, cmd_line, loglevel=log.loglevel_INFO, timeout=20, **kwargs):
+    def _exec_conflict_lock(self, conflict_key):
+        """\
+        Retrieve the lock that serializes commands with the same conflict key. Each call has to be
+        paired with a call of L{_drop_exec_conflict_lock()}.
+
+        @param conflict_key: commands with the same conflict key (e.g. a session name) must not
+            run concurrently
+        @type conflict_key: C{str}
+
+        @return: the lock for C{conflict_key} or C{None} if C{conflict_key} is C{None}
+        @rtype: C{threading.Lock} instance
+
+        """
+        if conflict_key is None:
+            return None
+        self._exec_conflict_locks_lock.acquire()
+        try:
+            if not self._exec_conflict_locks.has_key(conflict_key):
+                self._exec_conflict_locks[conflict_key] = [threading.Lock(), 0]
+            self._exec_conflict_locks[conflict_key][1] += 1
+            return self._exec_conflict_locks[conflict_key][0]
+        finally:
+            self._exec_conflict_locks_lock.release()
+
+    def _drop_exec_conflict_lock(self, conflict_key):
+        """\
+        Give up a lock retrieved via L{_exec_conflict_lock()}. Locks that are not used by any
+        command anymore get forgotten.
+
+        @param conflict_key: the conflict key of the command
+        @type conflict_key: C{str}
+
+        """
+        if conflict_key is None:
+            return
+        self._exec_conflict_locks_lock.acquire()
+        try:
+            self._exec_conflict_locks[conflict_key][1] -= 1
+            if self._exec_conflict_locks[conflict_key][1] <= 0:
+                del self._exec_conflict_locks[conflict_key]
+        finally:
+            self._exec_conflict_locks_lock.release()
+
+    def _exec_timed_out(self):
+        """\
+        A server-side command has timed out: consider the control session to have died.
+
+        """
+        self.session_died = True
+        if self.sshproxy_session:
+            self.sshproxy_session.stop_thread()
+
+    def _x2go_exec_command(self, cmd_line, loglevel=log.loglevel_INFO, timeout=20, conflict_key=None, stream=False, stdin_data=None, **kwargs):
         """
         Execute an X2Go server-side command via SSH.
 
-        During SSH command executions, sFTP operations get blocked.
+        Each command runs in its own SSH exec channel, up to
+        L{defaults.X2GO_CONTROLSESSION_MAX_EXEC_CHANNELS} commands can be executed concurrently
+        on the same control session. Commands that must not overlap can be serialized by giving
+        them the same C{conflict_key}.
+
+        Waiting for a free exec channel (and the C{conflict_key} lock), executing the command and
+        reading its output have to finish within C{timeout} seconds.
+
+        With C{stream} set, the returned stdout is an L{X2GoExecOutputReader} that hands out the
+        command's output as it arrives. The exec channel (and the C{conflict_key} lock) is held until
+        the output has been consumed completely or the reader gets closed, so callers have to close
+        the reader when they are done with it (C{try/finally} or C{with}). The reader gives up if the
+        command does not send any output for C{timeout} seconds.
+
+        Data that the command shall read from its stdin (e.g. secrets that must not show up on
+        the server's command lines) can be passed in via C{stdin_data}.
 
         @param cmd_line: the command to be executed on the remote server
         @type cmd_line: C{str} or C{list}
@@ -449,6 +542,12 @@ class X2GoControlSession(paramiko.SSHClient):
         @param timeout: if commands take longer than C{<timeout>} to be executed, consider the control session connection
             to have died.
         @type timeout: C{int}
+        @param conflict_key: commands with the same conflict key (e.g. a session name) get serialized
+        @type conflict_key: C{str}
+        @param stream: return a reader for the command's output instead of reading it completely
+        @type stream: C{bool}
+        @param stdin_data: data to write to the command's stdin (stdin gets closed afterwards)
+        @type stdin_data: C{str}
         @param kwargs: parameters that get passed through to the C{paramiko.SSHClient.exec_command()} method.
         @type kwargs: C{dict}
 
@@ -470,80 +569,135 @@ class X2GoControlSession(paramiko.SSHClient):
             self.logger("control session seams to be dead, not executing command ,,%s'' on X2Go server %s" % (_rerewrite_blanks(cmd), self.profile_name,), loglevel=loglevel)
             return (cStringIO.StringIO(), cStringIO.StringIO(), cStringIO.StringIO('failed to execute command'))
 
-        self._transport_lock.acquire()
+        if self.low_latency: timeout = timeout * 2
 
-        _retval = None
-        _password = None
+        _conflict_lock = self._exec_conflict_lock(conflict_key)
+        _held = []
 
-        ssh_transport = self.get_transport()
-        if ssh_transport and ssh_transport.is_authenticated():
+        def _release_exec_channel():
+            while _held:
+                _held.pop().release()
+            self._drop_exec_conflict_lock(conflict_key)
 
-            if self.low_latency: timeout = timeout * 2
-            timer = gevent.Timeout(timeout)
-            timer.start()
+        _handed_over = False
+        timer = gevent.Timeout(timeout)
+        timer.start()
+        try:
             try:
-                self.logger("executing command on X2Go server ,,%s'': %s" % (self.profile_name, _rerewrite_blanks(cmd)), loglevel=loglevel)
-                if self._session_password:
-                    _password = base64.b64decode(self._session_password)
-                _retval = self.exec_command(_rewrite_password(cmd, user=self.get_transport().get_username(), password=_password), **kwargs)
-            except AttributeError:
-                self.session_died = True
-                self._transport_lock.release()
-                if self.sshproxy_session:
-                    self.sshproxy_session.stop_thread()
-                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session has died unexpectedly')
-            except EOFError:
-                self.session_died = True
-                self._transport_lock.release()
-                if self.sshproxy_session:
-                    self.sshproxy_session.stop_thread()
-                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session has died unexpectedly')
-            except x2go_exceptions.SSHException:
-                self.session_died = True
-                self._transport_lock.release()
-                if self.sshproxy_session:
-                    self.sshproxy_session.stop_thread()
-                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session has died unexpectedly')
-            except gevent.timeout.Timeout:
-                self.session_died = True
-                self._transport_lock.release()
-                if self.sshproxy_session:
-                    self.sshproxy_session.stop_thread()
-                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session command timed out')
-            except socket.error:
-                self.session_died = True
-                self._transport_lock.release()
-                if self.sshproxy_session:
-                    self.sshproxy_session.stop_thread()
-                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session has died unexpectedly')
-            finally:
-                timer.cancel()
+                if _conflict_lock is not None:
+                    _conflict_lock.acquire()
+                    _held.append(_conflict_lock)
+                self._exec_channels.acquire()
+                _held.append(self._exec_channels)
+            except gevent.timeout.Timeout, t:
+                if t is not timer:
+                    raise
+                raise x2go_exceptions.X2GoControlSessionException('no SSH exec channel became available for an X2Go server-side command within %ss' % timeout)
+
+            _retval = None
+            _password = None
+
+            ssh_transport = self.get_transport()
+            if ssh_transport and ssh_transport.is_authenticated():
 
-        else:
-            self._transport_lock.release()
-            raise x2go_exceptions.X2GoControlSessionException('the X2Go control session is not connected (while issuing SSH command=%s)' % cmd)
-
-        self._transport_lock.release()
+                try:
+                    self.logger("executing command on X2Go server ,,%s'': %s" % (self.profile_name, _rerewrite_blanks(cmd)), loglevel=loglevel)
+                    if self._session_password:
+                        _password = base64.b64decode(self._session_password)
+                    _retval = self.exec_command(_rewrite_password(cmd, user=self.get_transport().get_username(), password=_password), **kwargs)
+                    if stdin_data is not None:
+                        _retval[0].write(stdin_data)
+                        _retval[0].flush()
+                        _retval[0].channel.shutdown_write()
+                except (AttributeError, EOFError, x2go_exceptions.SSHException, socket.error):
+                    self.session_died = True
+                    if self.sshproxy_session:
+                        self.sshproxy_session.stop_thread()
+                    raise x2go_exceptions.X2GoControlSessionException('the X2Go control session has died unexpectedly')
+                except gevent.timeout.Timeout, t:
+                    if t is not timer:
+                        raise
+                    self._exec_timed_out()
+                    raise x2go_exceptions.X2GoControlSessionException('the X2Go control session command timed out')
 
-        # sanitized X2Go relevant data, protect against data injection via .bashrc files
-        (_stdin, _stdout, _stderr) = _retval
-        raw_stdout = _stdout.read()
+            else:
+                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session is not connected (while issuing SSH command=%s)' % cmd)
 
-        sanitized_stdout = ''
-        is_x2go_data = False
-        for line in raw_stdout.split('\n'):
-            if line.startswith('X2GODATABEGIN:'+cmd_uuid): 
-                is_x2go_data = True
-                continue
-            if not is_x2go_data: continue
-            if line.startswith('X2GODATAEND:'+cmd_uuid): break
-            sanitized_stdout += line + "\n"
+            # the exec channel stays in use until the command's output has been read completely,
+            # only the framed X2Go data is used (protects against data injection via .bashrc files)
+            (_stdin, _stdout, _stderr) = _retval
+            if stream:
+                timer.cancel()
+                _reader = execoutput.X2GoExecOutputReader(_stdout, cmd_uuid, on_close=_release_exec_channel, timeout=timeout, on_timeout=self._exec_timed_out)
+                _handed_over = True
+                return (_stdin, _reader, _stderr)
+            _reader = execoutput.X2GoExecOutputReader(_stdout, cmd_uuid)
+            try:
+                _stdout_new = cStringIO.StringIO(_reader.read())
+            except gevent.timeout.Timeout, t:
+                if t is not timer:
+                    raise
+                _reader.abort()
+                self._exec_timed_out()
+                raise x2go_exceptions.X2GoControlSessionException('the X2Go control session command timed out')
 
-        _stdout_new = cStringIO.StringIO(sanitized_stdout)
+        finally:
+            timer.cancel()
+            if not _handed_over:
+                _release_exec_channel()
 
         _retval = (_stdin, _stdout_new, _stderr)
         return _retval
 
+    def _x2go_exec_command_async(self, cmd_line, loglevel=log.loglevel_INFO, timeout=20, conflict_key=None, **kwargs):
+        """
+        Execute an X2Go server-side command via SSH without waiting for its result.
+
+        @param cmd_line: the command to be executed on the remote server
+        @type cmd_line: C{str} or C{list}
+        @param loglevel: use this loglevel for reporting about remote command execution
+        @type loglevel: C{int}
+        @param timeout: if commands take longer than C{<timeout>} to be executed, consider the control session connection
+            to have died.
+        @type timeout: C{int}
+        @param conflict_key: commands with the same conflict key (e.g. a session name) get serialized
+        @type conflict_key: C{str}
+        @param kwargs: parameters that get passed through to the C{paramiko.SSHClient.exec_command()} method.
+        @type kwargs: C{dict}
+
+        @return: a greenlet, its C{get()} method returns the C{(stdin, stdout, stderr)} tuple of
+            L{X2GoControlSession._x2go_exec_command()} or raises its exception
+        @rtype: C{gevent.Greenlet} instance
+
+        """
+        return gevent.spawn(self._x2go_exec_command, cmd_line, loglevel=loglevel, timeout=timeout, conflict_key=conflict_key, **kwargs)
+
+    def _x2go_exec_commands(self, cmd_lines, loglevel=log.loglevel_INFO, timeout=20, **kwargs):
+        """
+        Execute several X2Go server-side commands via SSH concurrently.
+
+        The total execution time is that of the slowest command (not the sum of all of them), as
+        long as the number of commands does not exceed L{defaults.X2GO_CONTROLSESSION_MAX_EXEC_CHANNELS}.
+
+        @param cmd_lines: the commands to be executed on the remote server
+        @type cmd_lines: C{list}
+        @param loglevel: use this loglevel for reporting about remote command execution
+        @type loglevel: C{int}
+        @param timeout: per-command timeout
+        @type timeout: C{int}
+        @param kwargs: parameters that get passed through to the C{paramiko.SSHClient.exec_command()} method.
+        @type kwargs: C{dict}
+
+        @return: a list of C{(stdin, stdout, stderr)} tuples, in the order of C{cmd_lines}
+        @rtype: C{list}
+
+        @raise X2GoControlSessionException: if any of the command executions failed (due to a lost connection)
+
+        """
+        _jobs = [ self._x2go_exec_command_async(cmd_line, loglevel=loglevel, timeout=timeout, **kwargs) for cmd_line in cmd_lines ]
+        gevent.joinall(_jobs)
+        return [ _job.get() for _job in _jobs ]
+
     @property
     def _x2go_server_versions(self):
         """\
@@ -561,6 +715,7 @@ class X2GoControlSession(paramiko.SSHClient):
                 version = _line.split(':')[1].strip()
                 self._server_versions.update({comp: version})
             self.logger('server-side X2Go components and their versions are: %s' % self._server_versions, loglevel=log.loglevel_DEBUG)
+            self.store_capabilities()
         return self._server_versions
 
     def query_server_versions(self, force=False):
@@ -609,6 +764,89 @@ class X2GoControlSession(paramiko.SSHClient):
         return self._x2go_server_features
     get_server_features = query_server_features
 
+    def _load_capabilities(self, capabilities):
+        """\
+        Take over cached server capabilities (see L{capcache.X2GoServerCapabilityCache}).
+
+        @param capabilities: the cached capabilities
+        @type capabilities: C{dict}
+
+        """
+        def _str(s):
+            if type(s) is types.UnicodeType:
+                return s.encode('utf-8')
+            return s
+        if capabilities.get('features') is not None:
+            self._server_features = [ _str(f) for f in capabilities['features'] ]
+        if capabilities.get('versions') is not None:
+            self._server_versions = dict([ (_str(c), _str(v)) for (c, v) in capabilities['versions'].items() ])
+        if capabilities.get('remote_home'):
+            self._remote_home = _str(capabilities['remote_home'])
+        if capabilities.get('groups'):
+            self._remote_group = dict([ (_str(g), [ _str(m) for m in members ]) for (g, members) in capabilities['groups'].items() ])
+        self.available_commands = set([ _str(c) for c in capabilities.get('commands', []) ])
+
+    def store_capabilities(self):
+        """\
+        Write the known capabilities of the connected X2Go server (features, component versions, available
+        commands, remote home directory and group memberships) to the on-disk capability cache.
+
+        """
+        if self._capability_key is None:
+            return
+        self._capability_cache.put(self._capability_key, {
+            'features': self._server_features,
+            'versions': self._server_versions,
+            'remote_home': self._remote_home,
+            'groups': self._remote_group,
+            'commands': sorted(self.available_commands),
+        })
+
+    def add_available_command(self, test_cmd):
+        """\
+        Remember a server-side command test that has succeeded (see L{X2GoTerminalSession.has_command()}).
+
+        @param test_cmd: the command test
+        @type test_cmd: C{str}
+
+        """
+        if test_cmd not in self.available_commands:
+            self.available_commands.add(test_cmd)
+            self.store_capabilities()
+
+    def revalidate_capabilities(self):
+        """\
+        Query the cached capabilities of the connected X2Go server again and update the
+        capability cache.
+
+        """
+        try:
+            self.query_server_features(force=True)
+            if self._server_versions is not None:
+                self.query_server_versions(force=True)
+
+            (stdin, stdout, stderr) = self._x2go_exec_command('echo $HOME')
+            _home = stdout.read().split()
+            if _home:
+                self._remote_home = _home[0]
+
+            _groups = self._remote_group.keys()
+            self._remote_group = {}
+            for _group in _groups:
+                self._x2go_remote_group(_group)
+
+            _tests = sorted(self.available_commands)
+            if _tests:
+                _cmd_line = '; '.join([ '{ %s ; } >/dev/null 2>&1 && echo %s' % (_test, _i) for (_i, _test) in enumerate(_tests) ])
+                (stdin, stdout, stderr) = self._x2go_exec_command(_cmd_line)
+                _passed = stdout.read().split()
+                self.available_commands = set([ _test for (_i, _test) in enumerate(_tests) if str(_i) in _passed ])
+
+            self.store_capabilities()
+            self.logger('revalidated cached capabilities of X2Go server', loglevel=log.loglevel_DEBUG)
+        except x2go_exceptions.X2GoControlSessionException, e:
+            self.logger('failed to revalidate capabilities of X2Go server: %s' % str(e), loglevel=log.loglevel_INFO)
+
     #apprime server info code begin
     def get_apprime_server_info(self):
         (stdin, stdout, stderr) = self._x2go_exec_command('which vg_server_status >/dev/null && vg_server_status')
@@ -646,6 +884,7 @@ class X2GoControlSession(paramiko.SSHClient):
             (stdin, stdout, stderr) = self._x2go_exec_command('getent group %s | cut -d":" -f4' % group)
             self._remote_group[group] = stdout.read().split('\n')[0].split(',')
             self.logger('remote %s group: %s' % (group, self._remote_group[group]), loglevel=log.loglevel_DEBUG)
+            self.store_capabilities()
             return self._remote_group[group]
         else:
             return self._remote_group[group]
@@ -1152,16 +1391,34 @@ class X2GoControlSession(paramiko.SSHClient):
         except TypeError:
             self._session_password = None
 
+        self._remote_home = None
+        self._remote_group = {}
+        self._server_versions = None
+        self.available_commands = set()
+        _features_query = None
+        _capabilities_age = None
         if ssh_transport is not None:
 
             # since Paramiko 1.7.7.1 there is compression available, let's use it if present...
             if x2go._paramiko.PARAMIKO_FEATURE['use-compression']:
                 ssh_transport.use_compression(compress=False)
-            # enable keep alive callbacks
-            ssh_transport.set_keepalive(30) #apprime: earlier this was 5 seconds. Why so frequent?
-
             self.session_died = False
-            self.query_server_features(force=True)
+
+            # servers deployed from the same image have the same capabilities, they rarely change
+            self._capability_key = capcache.server_key(ssh_transport, username)
+            _capabilities = None
+            if self._capability_key is not None:
+                (_capabilities, _capabilities_age) = self._capability_cache.get(self._capability_key)
+            if _capabilities is not None:
+                self.logger('using cached capabilities of X2Go server (cached %ds ago)' % _capabilities_age, loglevel=log.loglevel_DEBUG)
+                self._load_capabilities(_capabilities)
+            else:
+                # query server features while the remote home directory gets checked (see below)
+                _features_query = gevent.spawn(self.query_server_features, force=True)
+            self._link_quality = None
+            if self.auto_link:
+                # the link quality is needed once a session gets started, measure it in the background
+                self._link_quality_query = gevent.spawn(self._query_link_quality)
             if self.forward_sshagent:
                 if x2go._paramiko.PARAMIKO_FEATURE['forward-ssh-agent']:
                     self.agent_chan = ssh_transport.open_session()
@@ -1174,13 +1431,33 @@ class X2GoControlSession(paramiko.SSHClient):
             if self.sshproxy_session:
                 self.sshproxy_session.stop_thread()
 
-        self._remote_home = None
-        if not self.home_exists():
+        _home_exists = self.home_exists()
+        if not _home_exists and _capabilities_age is not None:
+            # the cached home directory may be outdated
+            self._capability_cache.drop(self._capability_key)
+            self._remote_home = None
+            _capabilities_age = None
+            _home_exists = self.home_exists()
+
+        if not _home_exists:
+            if _features_query is not None:
+                _features_query.kill()
+            if self._link_quality_query is not None:
+                self._link_quality_query.kill()
+                self._link_quality_query = None
             self.close()
             if self.sshproxy_session:
                 self.sshproxy_session.stop_thread()
             raise x2go_exceptions.X2GoRemoteHomeException('remote home directory does not exist')
 
+        if _features_query is not None:
+            _features_query.get()
+
+        if _capabilities_age is None:
+            self.store_capabilities()
+        elif _capabilities_age > defaults.X2GO_CAPCACHE_REVALIDATE_AGE:
+            gevent.spawn(self.revalidate_capabilities)
+
         return (self.get_transport() is not None)
 
     def dissociate(self, terminal_session):
@@ -1205,6 +1482,11 @@ class X2GoControlSession(paramiko.SSHClient):
         @rtype: C{bool}
 
         """
+        self.stop_liveness_monitor()
+        if self._link_quality_query is not None:
+            self._link_quality_query.kill()
+            self._link_quality_query = None
+
         if self.associated_terminals:
             t_names = self.associated_terminals.keys()
             for t_obj in self.associated_terminals.values():
@@ -1272,21 +1554,183 @@ class X2GoControlSession(paramiko.SSHClient):
             return True
         return False
 
+    def measure_link_quality(self, probe_size=defaults.X2GO_LINK_AUTO_PROBE_SIZE, probe_time=defaults.X2GO_LINK_AUTO_PROBE_TIME,
+                             rtt_samples=defaults.X2GO_LINK_AUTO_RTT_SAMPLES):
+        """\
+        Measure round trip time and throughput of the link to the remote X2Go server.
+
+        The round trip time is the median of the round trips the liveness monitor has timed. If
+        no liveness samples exist yet, the median of several SSH round trips gets used.
+        To measure the throughput, random (incompressible) data is transferred from the X2Go
+        server. The transfer stops after C{probe_size} bytes or after C{probe_time} seconds,
+        whichever comes first, so slow links do not delay the session start.
+
+        @param probe_size: maximum number of bytes to transfer
+        @type probe_size: C{int}
+        @param probe_time: maximum time (in seconds) to spend on the transfer
+        @type probe_time: C{float}
+        @param rtt_samples: number of SSH round trips to time if the liveness monitor has no samples
+        @type rtt_samples: C{int}
+
+        @return: tuple C{(rtt, throughput)} (in seconds and bytes per second), C{(None, None)} if the
+            link quality could not be measured
+        @rtype: C{tuple}
+
+        """
+        _rtt = None
+        if self.liveness_monitor is not None:
+            _summary = self.liveness_monitor.rtt.summary()
+            if _summary is not None:
+                _rtt = _summary['p50']
+        if _rtt is None:
+            _rtts = [ netmonitor.ssh_round_trip(self.get_transport(), timeout=defaults.X2GO_NETMONITOR_TIMEOUT) for i in range(max(rtt_samples, 1)) ]
+            _rtts = [ _rtt for _rtt in _rtts if _rtt is not None ]
+            if not _rtts:
+                return (None, None)
+            _rtt = sorted(_rtts)[len(_rtts) / 2]
+
+        (_stdin, _stdout, _stderr) = self._x2go_exec_command('head -c %s /dev/urandom' % probe_size, loglevel=log.loglevel_DEBUG, stream=True)
+        _total = 0
+        _first = None
+        _last = None
+        try:
+            # time the transfer from the first chunk on, this excludes the command's startup time
+            for _chunk in _stdout.iter_chunks():
+                _last = time.time()
+                if _first is None:
+                    _first = (_last, len(_chunk))
+                _total += len(_chunk)
+                if _last - _first[0] >= probe_time:
+                    break
+        finally:
+            # stop the transfer on the server if it has not completed in time
+            _stdout.abort()
+        if _first is None:
+            return (None, None)
+        if _total == _first[1]:
+            # everything arrived at once
+            _throughput = _total / 0.001
+        else:
+            _throughput = (_total - _first[1]) / max(_last - _first[0], 0.001)
+        self.logger('measured link quality to %s: round trip time %.1fms, throughput %.1fKiB/s' % (self.profile_name, _rtt * 1000, _throughput / 1024), loglevel=log.loglevel_INFO)
+        return (_rtt, _throughput)
+
+    def _query_link_quality(self):
+        """\
+        Greenlet: measure the link quality while connecting.
+
+        """
+        try:
+            self._link_quality = self.measure_link_quality()
+        except x2go_exceptions.X2GoControlSessionException, e:
+            self.logger('failed to measure the link quality: %s' % str(e), loglevel=log.loglevel_WARN)
+            self._link_quality = (None, None)
+
+    def get_link_quality(self, remeasure=False):
+        """\
+        Retrieve the quality of the link to the remote X2Go server. The link quality gets
+        measured while connecting (with C{auto_link} set) or on first use.
+
+        @param remeasure: measure the link quality again (e.g. when resuming a session)
+        @type remeasure: C{bool}
+
+        @return: see L{measure_link_quality()}
+        @rtype: C{tuple}
+
+        """
+        if self._link_quality_query is not None:
+            if remeasure:
+                self._link_quality_query.kill()
+            else:
+                self._link_quality_query.join()
+            self._link_quality_query = None
+        if remeasure or self._link_quality is None:
+            self._link_quality = self.measure_link_quality()
+        return self._link_quality
+
+    def start_liveness_monitor(self, interval=defaults.X2GO_LIVENESS_INTERVAL, timeout=defaults.X2GO_LIVENESS_TIMEOUT,
+                               max_missed=defaults.X2GO_LIVENESS_MAX_MISSED, on_death=None):
+        """\
+        Start probing the connection to the remote X2Go server with SSH keepalive requests
+        (see L{liveness.X2GoLivenessMonitor}). A monitor that is already running gets restarted.
+
+        @param interval: probing interval (in seconds), C{0} disables the liveness monitor
+            (Paramiko's own keepalive messages get sent instead)
+        @type interval: C{float}
+        @param timeout: maximum time (in seconds) to wait for the server's reply to a probe
+        @type timeout: C{float}
+        @param max_missed: number of consecutive missed probes after which the connection is considered dead
+        @type max_missed: C{int}
+        @param on_death: a function (without arguments) that gets called once the connection has died
+        @type on_death: C{func}
+
+        """
+        self.stop_liveness_monitor()
+        _transport = self.get_transport()
+        if _transport is None:
+            return
+        if not interval:
+            # keep NAT gateways and firewalls from dropping the idle connection at least
+            _transport.set_keepalive(30)
+            return
+        _transport.set_keepalive(0)
+
+        def _on_death():
+            self.session_died = True
+            if on_death is not None:
+                on_death()
+
+        self.liveness_monitor = liveness.X2GoLivenessMonitor(_transport,
+                                                             interval=interval,
+                                                             timeout=timeout,
+                                                             max_missed=max_missed,
+                                                             on_death=_on_death,
+                                                             logger=self.logger,
+                                                            )
+        self.liveness_monitor.start()
+
+    def stop_liveness_monitor(self):
+        """\
+        Stop probing the connection to the remote X2Go server.
+
+        """
+        if self.liveness_monitor is not None:
+            self.liveness_monitor.stop_thread()
+            self.liveness_monitor = None
+
+    def get_liveness_stats(self):
+        """\
+        Retrieve the liveness statistics of the connection to the remote X2Go server.
+
+        @return: see L{liveness.X2GoLivenessMonitor.get_stats()}, C{None} if the connection
+            is not being probed
+        @rtype: C{dict}
+
+        """
+        if self.liveness_monitor is not None:
+            return self.liveness_monitor.get_stats()
+        return None
 
     def is_alive(self):
         """\
         Test if the connection to the remote X2Go server is still alive.
 
+        While the connection is being probed by the liveness monitor (see L{start_liveness_monitor()}),
+        its verdict gets returned right away. Otherwise a single SSH keepalive request gets sent.
+        No command gets executed on the server either way.
+
         @return: C{True} if the connection is still alive, C{False} otherwise
         @rtype: C{bool}
 
         """
-        try:
-            if self._x2go_exec_command('echo', loglevel=log.loglevel_DEBUG):
-                return True
-        except x2go_exceptions.X2GoControlSessionException:
-            self.session_died = True
-            self.disconnect()
+        if self.liveness_monitor is not None:
+            _alive = self.liveness_monitor.is_link_alive()
+        else:
+            _alive = not self.session_died and netmonitor.ssh_round_trip(self.get_transport(), timeout=defaults.X2GO_LIVENESS_TIMEOUT) is not None
+        if _alive:
+            return True
+        self.session_died = True
+        self.disconnect()
         return False
 
     def has_session_died(self):
@@ -1299,6 +1743,144 @@ class X2GoControlSession(paramiko.SSHClient):
         """
         return self.session_died
 
+    def _published_applications_server_key(self):
+        return '%s@%s:%s' % (self.remote_username(), self.get_hostname(), self.get_port())
+
+    def _fetch_published_applications(self, revalidate=False):
+        """\
+        Retrieve the raw C{x2gogetapps} output of the remote X2Go server.
+
+        The output is kept in a persistent per-server cache, together with a fingerprint the server
+        reports for it (see L{defaults.X2GO_PUBAPP_FINGERPRINT_COMMAND}). A cached menu gets returned
+        right away and revalidated in the background (see L{_revalidate_published_applications()}).
+
+        @param revalidate: revalidate a cached menu before returning it
+        @type revalidate: C{bool}
+
+        @return: the raw output of C{x2gogetapps}
+        @rtype: C{str}
+
+        """
+        _server_key = self._published_applications_server_key()
+        (_cached_fingerprint, _cached_menu) = self._published_applications_cache.get(_server_key)
+        if _cached_menu is None:
+            return self._download_published_applications(_server_key)
+        if revalidate:
+            return self._revalidate_published_applications(_cached_fingerprint, _cached_menu)
+        self.logger('using cached published applications menu of %s, revalidating it in the background' % self.profile_name, loglevel=log.loglevel_NOTICE)
+        gevent.spawn(self._update_published_applications, _cached_fingerprint, _cached_menu)
+        return _cached_menu
+
+    def _download_published_applications(self, server_key):
+        """\
+        Transfer the raw C{x2gogetapps} output from the remote X2Go server and cache it.
+
+        The server's menu fingerprint gets taken by the same command, before C{x2gogetapps} runs.
+        If the menu changes in between, the cached fingerprint is outdated and the next revalidation
+        transfers the menu again.
+
+        @param server_key: identifies the server in the published applications cache
+        @type server_key: C{str}
+
+        @return: the raw output of C{x2gogetapps}
+        @rtype: C{str}
+
+        """
+        _menu_cmd = 'which x2gogetapps >/dev/null && { %s; x2gogetapps; }' % defaults.X2GO_PUBAPP_FINGERPRINT_COMMAND
+        (stdin, stdout, stderr) = self._x2go_exec_command(_menu_cmd, stream=True)
+        # the menu (with base64-encoded icons) can be several megabytes, it gets assembled
+        # from the received chunks in a single step
+        try:
+            _output = stdout.read()
+        finally:
+            stdout.close()
+        if '\n' in _output:
+            (_fingerprint, _raw_output) = _output.split('\n', 1)
+        else:
+            (_fingerprint, _raw_output) = ('', _output)
+        _fingerprint = _fingerprint.strip()
+        if _fingerprint and _raw_output:
+            self._published_applications_cache.put(server_key, _fingerprint, _raw_output)
+        else:
+            self._published_applications_cache.drop(server_key)
+        return _raw_output
+
+    def _revalidate_published_applications(self, cached_fingerprint, cached_menu):
+        """\
+        Compare the fingerprint of a cached menu with the server's current one, transfer
+        the menu again if they differ.
+
+        @param cached_fingerprint: the fingerprint of the cached menu
+        @type cached_fingerprint: C{str}
+        @param cached_menu: the cached raw C{x2gogetapps} output
+        @type cached_menu: C{str}
+
+        @return: the current raw output of C{x2gogetapps}
+        @rtype: C{str}
+
+        """
+        (stdin, stdout, stderr) = self._x2go_exec_command('which x2gogetapps >/dev/null && %s' % defaults.X2GO_PUBAPP_FINGERPRINT_COMMAND, loglevel=log.loglevel_DEBUG)
+        _fingerprint = stdout.read().strip()
+        if _fingerprint and _fingerprint == cached_fingerprint:
+            self.logger('published applications menu of %s is unchanged' % self.profile_name, loglevel=log.loglevel_DEBUG)
+            return cached_menu
+        self.logger('published applications menu of %s has changed, transferring it again' % self.profile_name, loglevel=log.loglevel_NOTICE)
+        return self._download_published_applications(self._published_applications_server_key())
+
+    def _update_published_applications(self, cached_fingerprint, cached_menu):
+        """\
+        Greenlet: revalidate a cached menu that has already been handed out. If the menu has changed,
+        the menu trees of all languages that have been requested so far get rebuilt.
+
+        @param cached_fingerprint: the fingerprint of the cached menu
+        @type cached_fingerprint: C{str}
+        @param cached_menu: the cached raw C{x2gogetapps} output
+        @type cached_menu: C{str}
+
+        """
+        try:
+            _raw_output = self._revalidate_published_applications(cached_fingerprint, cached_menu)
+        except x2go_exceptions.X2GoControlSessionException, e:
+            self.logger('revalidating the published applications menu of %s failed: %s' % (self.profile_name, str(e)), loglevel=log.loglevel_WARN)
+            return
+        # a new fingerprint does not necessarily mean a new menu (e.g. a touched .desktop file)
+        if hashlib.md5(_raw_output).digest() == hashlib.md5(cached_menu).digest():
+            return
+
+        self._already_querying_published_applications.acquire()
+        try:
+            _langs = self._published_applications_menu.keys()
+            if _langs:
+                self._published_applications_menu.update(self._build_published_applications_menus(_raw_output, _langs, self.published_applications_no_submenus))
+                self.logger('published applications menu of %s has been updated' % self.profile_name, loglevel=log.loglevel_NOTICE)
+        finally:
+            self._already_querying_published_applications.release()
+
+    def _build_published_applications_menus(self, raw_output, langs, max_no_submenus):
+        """\
+        Build the menu trees of published applications from the raw C{x2gogetapps} output.
+
+        @param raw_output: the raw output of C{x2gogetapps}
+        @type raw_output: C{str}
+        @param langs: the languages to build menu trees for
+        @type langs: C{list}
+        @param max_no_submenus: render submenus if there are more applications than this
+        @type max_no_submenus: C{int}
+
+        @return: the menu trees, language identifiers as keys
+        @rtype: C{dict}
+
+        """
+        _menu = pubappmenu.split_menu_items(raw_output)
+        if len(_menu) > max_no_submenus >= 0:
+            _render_submenus = True
+        else:
+            _render_submenus = False
+        #Apprime force submenus
+        #_render_submenus = True
+        _entries = pubappmenu.parse_menu_items(_menu)
+        return pubappmenu.build_menus(_entries, langs, render_submenus=_render_submenus)
+
     def get_published_applications(self, lang=None, refresh=False, raw=False, very_raw=False, max_no_submenus=defaults.PUBAPP_MAX_NO_SUBMENUS):
         """\
         Retrieve the menu tree of published applications from the remote X2Go server.
@@ -1340,8 +1922,7 @@ class X2GoControlSession(paramiko.SSHClient):
                 ### STAGE 1: retrieve menu from server
 
                 self.logger('querying server (%s) for list of published applications' % self.profile_name, loglevel=log.loglevel_NOTICE)
-                (stdin, stdout, stderr) = self._x2go_exec_command('which x2gogetapps >/dev/null && x2gogetapps')
-                _raw_output = stdout.read()
+                _raw_output = self._fetch_published_applications(revalidate=refresh)
                 #self.logger('====>>>>VG: published applications %s' % _raw_output, loglevel=log.loglevel_NOTICE)
                 
                 if very_raw:
@@ -1351,145 +1932,17 @@ class X2GoControlSession(paramiko.SSHClient):
 
                 ### STAGE 2: dissect the text file retrieved from server, cut into single menu elements
 
-                _raw_menu_items = _raw_output.split('</desktop>\n')
-                _raw_menu_items = [ i.replace('<desktop>\n', '') for i in _raw_menu_items ]
-                _menu = []
-                for _raw_menu_item in _raw_menu_items:
-                    if '<icon>\n' in _raw_menu_item and '</icon>' in _raw_menu_item:
-                        _menu_item = _raw_menu_item.split('<icon>\n')[0] + _raw_menu_item.split('</icon>\n')[1]
-                        _icon_base64 = _raw_menu_item.split('<icon>\n')[1].split('</icon>\n')[0]
-                    else:
-                        _menu_item = _raw_menu_item
-                        _icon_base64 = None
-                    if _menu_item:
-                        _menu.append({ 'desktop': _menu_item, 'icon': _icon_base64, })
-                        _menu_item = None
-                        _icon_base64 = None
-
                 if raw:
                     self.logger('published applications query for %s finished, returning raw output' % self.profile_name, loglevel=log.loglevel_NOTICE)
                     self._already_querying_published_applications.release()
-                    return _menu
-
-                if len(_menu) > max_no_submenus >= 0:
-                    _render_submenus = True
-                else:
-                    _render_submenus = False
-                #Apprime force submenus
-                #_render_submenus = True
-
-                # STAGE 3: create menu structure in a Python dictionary
-
-                _category_map = {
-                    lang: {
-                        'Multimedia': [],
-                        'Development': [],
-                        'Education': [],
-                        'Games': [],
-                        'Graphics': [],
-                        'Internet': [],
-                        'Office': [],
-                        'System': [],
-                        'Utilities': [],
-                        'Other Applications': [],
-                        'TOP': [],
-                    }
-                }
-                _empty_menus = _category_map[lang].keys()
-
-                for item in _menu:
-
-                    _menu_entry_name = ''
-                    _menu_entry_fallback_name = ''
-                    _menu_entry_comment = ''
-                    _menu_entry_fallback_comment = ''
-                    _menu_entry_exec = ''
-                    _menu_entry_cat = ''
-                    _menu_entry_shell = False
-
-                    lang_regio = lang
-                    lang_only = lang_regio.split('_')[0]
-
-                    for line in item['desktop'].split('\n'):
-                        if re.match('^Name\[%s\]=.*' % lang_regio, line) or re.match('Name\[%s\]=.*' % lang_only, line):
-                            _menu_entry_name = line.split("=")[1].strip()
-                        elif re.match('^Name=.*', line):
-                            _menu_entry_fallback_name = line.split("=")[1].strip()
-                        elif re.match('^Comment\[%s\]=.*' % lang_regio, line) or re.match('Comment\[%s\]=.*' % lang_only, line):
-                            _menu_entry_comment = line.split("=")[1].strip()
-                        elif re.match('^Comment=.*', line):
-                            _menu_entry_fallback_comment = line.split("=")[1].strip()
-                        elif re.match('^Exec=.*', line):
-                            _menu_entry_exec = line.split("=")[1].strip()
-                        elif re.match('^Terminal=.*(t|T)(r|R)(u|U)(e|E).*', line):
-                            _menu_entry_shell = True
-                        elif re.match('^Categories=.*', line):
-                            self.logger('====>>>> category line=%s' % line, loglevel=log.loglevel_NOTICE)
-                            if 'X2Go-Top' in line:
-                                _menu_entry_cat = 'TOP'
-                            elif 'Audio' in line or 'Video' in line:
-                                _menu_entry_cat = 'Multimedia'
-                            elif 'Development' in line:
-                                _menu_entry_cat = 'Development'
-                            elif 'Education' in line:
-                                _menu_entry_cat = 'Education'
-                            elif 'Game' in line:
-                                _menu_entry_cat = 'Games'
-                            elif 'Graphics' in line:
-                                _menu_entry_cat = 'Graphics'
-                            elif 'Network' in line:
-                                _menu_entry_cat = 'Internet'
-                            elif 'Office' in line:
-                                _menu_entry_cat = 'Office'
-                            elif 'Settings' in line:
-                                continue
-                            elif 'System' in line:
-                                _menu_entry_cat = 'System'
-                            elif 'Utility' in line:
-                                _menu_entry_cat = 'Utilities'
-                            else:
-                                _menu_entry_cat = 'Other Applications'
-                    if not _menu_entry_exec:
-                        continue
-                    else:
-                        # FIXME: strip off any noted options (%f, %F, %u, %U, ...), this can be more intelligent
-                        _menu_entry_exec = _menu_entry_exec.replace('%f', '').replace('%F','').replace('%u','').replace('%U','')
-                        if _menu_entry_shell:
-                            _menu_entry_exec = "x-terminal-emulator -e '%s'" % _menu_entry_exec
-
-                    if not _menu_entry_cat:
-                        _menu_entry_cat = 'Other Applications'
-
-                    if not _render_submenus:
-                        _menu_entry_cat = 'TOP'
-
-                    if _menu_entry_cat in _empty_menus:
-                        _empty_menus.remove(_menu_entry_cat)
-
-                    if not _menu_entry_name: _menu_entry_name = _menu_entry_fallback_name
-                    if not _menu_entry_comment: _menu_entry_comment = _menu_entry_fallback_comment
-                    if not _menu_entry_comment: _menu_entry_comment = _menu_entry_name
-
-                    _menu_entry_icon = item['icon']
-
-                    self.logger('====>>>> Pubapp name=%s, category=%s' % (_menu_entry_name, _menu_entry_cat), loglevel=log.loglevel_NOTICE)
-                    _category_map[lang][_menu_entry_cat].append(
-                        {
-                            'name': _menu_entry_name,
-                            'comment': _menu_entry_comment,
-                            'exec': _menu_entry_exec,
-                            'icon': _menu_entry_icon,
-                        }
-                    )
-
-                for _cat in _empty_menus:
-                    del _category_map[lang][_cat]
-
-                for _cat in _category_map[lang].keys():
-                    _sorted = sorted(_category_map[lang][_cat], key=lambda k: k['name'])
-                    _category_map[lang][_cat] = _sorted
-
-                self._published_applications_menu.update(_category_map)
+                    return pubappmenu.split_menu_items(_raw_output)
+
+                # STAGE 3: create menu structures in Python dictionaries, for the requested language and for
+                # all languages that already have a (now outdated) menu tree
+                _langs = self._published_applications_menu.keys()
+                if lang not in _langs:
+                    _langs.append(lang)
+                self._published_applications_menu.update(self._build_published_applications_menus(_raw_output, _langs, max_no_submenus))
                 self.logger('published applications query for %s finished, return menu tree' % self.profile_name, loglevel=log.loglevel_NOTICE)
 
         else:
@@ -1571,8 +2024,9 @@ class X2GoControlSession(paramiko.SSHClient):
                 _success = False
 
             if _success:
-                while not _terminal.ok():
-                    gevent.sleep(.2)
+                # the proxy normally is up already, otherwise give it until the deadline
+                if not utils.poll_until(_terminal.ok, timeout=defaults.X2GO_SESSION_STATE_TIMEOUT):
+                    self.logger('proxy of session %s did not come up within %ss' % (_terminal.get_session_name(), defaults.X2GO_SESSION_STATE_TIMEOUT), loglevel=log.loglevel_WARN)
 
                 if _terminal.ok():
                     self.associated_terminals[_terminal.get_session_name()] = _terminal
@@ -1747,6 +2201,7 @@ class X2GoControlSession(paramiko.SSHClient):
             _success = False
             _count = 0
             _maxwait = 20
+            _retry_interval = defaults.X2GO_POLL_INTERVAL_MIN
 
             # we will try this 20 times before giving up... we might simply catch the x2golistsessions
             # output in the middle of creating a session in the database...
@@ -1754,20 +2209,20 @@ class X2GoControlSession(paramiko.SSHClient):
                 _count += 1
                 try:
                     if 'X2GO_LIST_SHADOWSESSIONS' in self._x2go_server_features:
-                        (stdin, stdout, stderr) = self._x2go_exec_command("export HOSTNAME && { x2golistsessions; x2golistshadowsessions; }")
+                        (stdin, stdout, stderr) = self._x2go_exec_command("export HOSTNAME && { x2golistsessions; x2golistshadowsessions; }", stream=True)
                     else:
-                        (stdin, stdout, stderr) = self._x2go_exec_command("export HOSTNAME && x2golistsessions")
+                        (stdin, stdout, stderr) = self._x2go_exec_command("export HOSTNAME && x2golistsessions", stream=True)
                     self.logger('controlsession.list_session iteration = %d' % _count, loglevel=log.loglevel_INFO)
-                    _stdout_read = stdout.read()
-                    self.logger('====>>>>x2golistsessions output: %s' % _stdout_read, loglevel=log.loglevel_NOTICE)
-                    _listsessions = self._list_backend(_stdout_read, info_backend=self._info_backend).sessions
+                    # the session list backend parses the command's output line by line as it arrives
+                    try:
+                        _listsessions = self._list_backend(stdout, info_backend=self._info_backend).sessions
+                    finally:
+                        stdout.close()
+                    self.logger('====>>>>x2golistsessions output: %s' % ', '.join(_listsessions.keys()), loglevel=log.loglevel_NOTICE)
                     _success = True
-                except KeyError:
-                    gevent.sleep(1)
-                except IndexError:
-                    gevent.sleep(1)
-                except ValueError:
-                    gevent.sleep(1)
+                except (KeyError, IndexError, ValueError):
+                    gevent.sleep(_retry_interval)
+                    _retry_interval = min(_retry_interval * 2, defaults.X2GO_POLL_INTERVAL_MAX)
 
             if _count >= _maxwait:
                 self.session_died = True
@@ -1776,23 +2231,135 @@ class X2GoControlSession(paramiko.SSHClient):
 
             # update internal variables when list_sessions() is called
             if _success and not self.session_died:
-                for _session_name, _terminal in self.associated_terminals.items():
-                    if _session_name in _listsessions.keys():
-                        # update the whole session_info object within the terminal session
-                        if hasattr(self.associated_terminals[_session_name], 'session_info') and not self.associated_terminals[_session_name].is_session_info_protected():
-                            self.associated_terminals[_session_name].session_info.update(_listsessions[_session_name])
-                    else:
-                        self.associated_terminals[_session_name].__del__()
-                        try: del self.associated_terminals[_session_name]
-                        except KeyError: pass
-                        self.terminated_terminals.append(_session_name)
-                    if _terminal.is_suspended():
-                        self.associated_terminals[_session_name].__del__()
-                        try: del self.associated_terminals[_session_name]
-                        except KeyError: pass
+                self._update_associated_terminals(_listsessions)
 
             return _listsessions
 
+    def _update_associated_terminals(self, listsessions):
+        """\
+        Update the session information of associated terminal sessions from a recent session list
+        and drop terminal sessions that have been suspended or terminated.
+
+        @param listsessions: a session list as returned by L{X2GoControlSession.list_sessions()}
+        @type listsessions: C{dict}
+
+        """
+        for _session_name, _terminal in self.associated_terminals.items():
+            if _session_name in listsessions.keys():
+                # update the whole session_info object within the terminal session
+                if hasattr(self.associated_terminals[_session_name], 'session_info') and not self.associated_terminals[_session_name].is_session_info_protected():
+                    self.associated_terminals[_session_name].session_info.update(listsessions[_session_name])
+            else:
+                self.associated_terminals[_session_name].__del__()
+                try: del self.associated_terminals[_session_name]
+                except KeyError: pass
+                self.terminated_terminals.append(_session_name)
+            if _terminal.is_suspended():
+                self.associated_terminals[_session_name].__del__()
+                try: del self.associated_terminals[_session_name]
+                except KeyError: pass
+
+    def list_batch(self, sessions=True, desktops=False, mounts=None, features=False, maxwait=20):
+        """\
+        Query the session list, the desktop list, the client-side mounts of several sessions and the
+        server's feature list with one single server-side command execution.
+
+        The server-side commands are chained into one compound command whose output is split into
+        sections, the sections then get parsed like the output of L{X2GoControlSession.list_sessions()},
+        L{X2GoControlSession.list_desktops()}, L{X2GoControlSession.list_mounts()} and
+        L{X2GoControlSession.query_server_features()}.
+
+        @param sessions: query the server-side session list
+        @type sessions: C{bool}
+        @param desktops: query the list of desktops available for sharing
+        @type desktops: C{bool}
+        @param mounts: names of the sessions to query client-side mounts for
+        @type mounts: C{list}
+        @param features: query (and cache) the server's feature list
+        @type features: C{bool}
+        @param maxwait: stop processing the compound command after C{<maxwait>} seconds
+        @type maxwait: C{int}
+
+        @return: a dictionary that contains (depending on the query) the keys C{sessions} (see
+            L{X2GoControlSession.list_sessions()}), C{desktops} (see L{X2GoControlSession.list_desktops()}),
+            C{mounts} (all requested sessions' mounts merged, see L{X2GoControlSession.list_mounts()})
+            and C{features} (see L{X2GoControlSession.query_server_features()})
+        @rtype: C{dict}
+
+        @raise X2GoTimeOutException: if the compound command does not finish within C{<maxwait>} seconds
+        @raise X2GoControlSessionException: if the control session has lost its connection
+
+        """
+        if mounts is None:
+            mounts = []
+
+        _section_tag = 'X2GOSECTION:%s:' % uuid.uuid1().hex
+        _cmds = [ 'export HOSTNAME' ]
+        if sessions:
+            _cmds.append('echo %ssessions' % _section_tag)
+            if 'X2GO_LIST_SHADOWSESSIONS' in self._x2go_server_features:
+                _cmds.append('{ x2golistsessions; x2golistshadowsessions; }')
+            else:
+                _cmds.append('x2golistsessions')
+        if desktops:
+            _cmds.append('echo %sdesktops' % _section_tag)
+            _cmds.append('x2golistdesktops')
+        for session_name in mounts:
+            _cmds.append('echo %smounts:%s' % (_section_tag, session_name))
+            _cmds.append('x2golistmounts %s' % session_name)
+        if features:
+            _cmds.append('echo %sfeatures' % _section_tag)
+            _cmds.append('{ which x2gofeaturelist >/dev/null && x2gofeaturelist; }')
+
+        if self.low_latency:
+            maxwait = maxwait * 2
+
+        timeout = gevent.Timeout(maxwait)
+        timeout.start()
+        try:
+            (stdin, stdout, stderr) = self._x2go_exec_command('; '.join(_cmds))
+            _stdout_read = stdout.read()
+        except gevent.timeout.Timeout:
+            # if we do not get a reply here after <maxwait> seconds we will raise a time out, we have to
+            # make sure that we catch this at places where we want to ignore timeouts
+            raise x2go_exceptions.X2GoTimeOutException('batched server query timed out')
+        finally:
+            timeout.cancel()
+
+        # demultiplex the compound command's output
+        _sections = {}
+        _section = None
+        for line in _stdout_read.split('\n'):
+            if line.startswith(_section_tag):
+                _section = line[len(_section_tag):]
+                _sections[_section] = []
+            elif _section is not None:
+                _sections[_section].append(line)
+
+        _retval = {}
+        if sessions:
+            try:
+                _listsessions = self._list_backend(_sections.get('sessions', []), info_backend=self._info_backend).sessions
+                if not self.session_died:
+                    self._update_associated_terminals(_listsessions)
+            except (KeyError, IndexError, ValueError):
+                # we caught the session list in the middle of a session database update,
+                # list_sessions() knows how to retry...
+                _listsessions = self.list_sessions()
+            _retval['sessions'] = _listsessions
+        if desktops:
+            _retval['desktops'] = _sections.get('desktops', [''])
+        if mounts:
+            _retval['mounts'] = {}
+            for session_name in mounts:
+                _retval['mounts'][session_name] = [ line for line in _sections.get('mounts:%s' % session_name, []) if line ]
+        if features:
+            self._server_features = [ f for f in _sections.get('features', []) if f ]
+            self._server_features.sort()
+            _retval['features'] = self._server_features
+
+        return _retval
+
     def clean_sessions(self, destroy_terminals=True, published_applications=False):
         """\
         Find X2Go terminals that have previously been started by the
@@ -1902,7 +2469,7 @@ class X2GoControlSession(paramiko.SSHClient):
         if session_name in _session_names:
 
             self.logger('suspending associated terminal session: %s' % session_name, loglevel=log.loglevel_DEBUG)
-            (stdin, stdout, stderr) = self._x2go_exec_command("x2gosuspend-session %s" % session_name, loglevel=log.loglevel_DEBUG)
+            (stdin, stdout, stderr) = self._x2go_exec_command("x2gosuspend-session %s" % session_name, loglevel=log.loglevel_DEBUG, conflict_key=session_name)
             stdout.read()
             stderr.read()
             if self.associated_terminals.has_key(session_name):
@@ -1915,13 +2482,42 @@ class X2GoControlSession(paramiko.SSHClient):
         else:
 
             self.logger('suspending non-associated terminal session: %s' % session_name, loglevel=log.loglevel_DEBUG)
-            (stdin, stdout, stderr) = self._x2go_exec_command("x2gosuspend-session %s" % session_name, loglevel=log.loglevel_DEBUG)
+            (stdin, stdout, stderr) = self._x2go_exec_command("x2gosuspend-session %s" % session_name, loglevel=log.loglevel_DEBUG, conflict_key=session_name)
             stdout.read()
             stderr.read()
             _ret = True
 
         return _ret
 
+    def wait_for_session_state(self, session_name, states=('S', ), timeout=defaults.X2GO_SESSION_STATE_TIMEOUT):
+        """\
+        Wait for X2Go session with name C{<session_name>} to reach one of the given
+        states. The server-side session list is polled with an adaptive interval, the
+        method returns as soon as the state has been reached.
+
+        @param session_name: X2Go name of the session
+        @type session_name: C{str}
+        @param states: the awaited session states (C{R} for running, C{S} for suspended)
+        @type states: C{tuple}
+        @param timeout: deadline (in seconds)
+        @type timeout: C{float}
+
+        @return: C{True} if the session has reached one of the given states or has vanished from
+            the session list, C{False} if the deadline has been reached
+        @rtype: C{bool}
+
+        """
+        _start = time.time()
+        def _state_reached():
+            _session_info = self.list_sessions().get(session_name)
+            return _session_info is None or _session_info.status in states
+        _reached = bool(utils.poll_until(_state_reached, timeout=timeout))
+        if _reached:
+            self.logger('session %s reached state %s after %.2fs' % (session_name, '/'.join(states), time.time() - _start), loglevel=log.loglevel_DEBUG)
+        else:
+            self.logger('session %s did not reach state %s within %ss' % (session_name, '/'.join(states), timeout), loglevel=log.loglevel_WARN)
+        return _reached
+
     def terminate(self, session_name, destroy_terminals=True):
         """\
         Terminate X2Go session with name C{<session_name>} on the connected
@@ -1939,7 +2535,7 @@ class X2GoControlSession(paramiko.SSHClient):
         if session_name in self.associated_terminals.keys():
 
             self.logger('terminating associated session: %s' % session_name, loglevel=log.loglevel_DEBUG)
-            (stdin, stdout, stderr) = self._x2go_exec_command("x2goterminate-session %s" % session_name, loglevel=log.loglevel_DEBUG)
+            (stdin, stdout, stderr) = self._x2go_exec_command("x2goterminate-session %s" % session_name, loglevel=log.loglevel_DEBUG, conflict_key=session_name)
             stdout.read()
             stderr.read()
 
@@ -1955,7 +2551,7 @@ class X2GoControlSession(paramiko.SSHClient):
         else:
 
             self.logger('terminating non-associated session: %s' % session_name, loglevel=log.loglevel_DEBUG)
-            (stdin, stdout, stderr) = self._x2go_exec_command("x2goterminate-session %s" % session_name, loglevel=log.loglevel_DEBUG)
+            (stdin, stdout, stderr) = self._x2go_exec_command("x2goterminate-session %s" % session_name, loglevel=log.loglevel_DEBUG, conflict_key=session_name)
             stdout.read()
             stderr.read()
             _ret = True
@@ -39,13 +39,17 @@ class X2GoServerSessionInfo(object):
     C{X2GoTerminalSession.start()} resp. C{X2GoTerminalSession.resume()}.
 
     """
+    __slots__ = ('name', 'cookie', 'agent_pid', 'display', 'graphics_port', 'snd_port', 'sshfs_port',
+                 'tekictrl_port', 'tekidata_port', 'username', 'hostname', 'date_created', 'date_suspended',
+                 'status', 'local_container', 'remote_container', 'protected', )
+
     def __str__(self):
         return self.name
     def __repr__(self):
         result = 'X2GoServerSessionInfo('
-        for p in dir(self):
-            if '__' in p or not p in self.__dict__ or type(p) is types.InstanceType: continue
-            result += p + '=' + str(self.__dict__[p]) +','
+        for p in self.__slots__:
+            if not hasattr(self, p): continue
+            result += p + '=' + str(getattr(self, p)) +','
         return result.strip(',') + ')'
 
     def _parse_x2golistsessions_line(self, x2go_output):
@@ -57,7 +61,7 @@ class X2GoServerSessionInfo(object):
 
         """
         try:
-            l = x2go_output.split("|")
+            l = x2go_output.rstrip('\r\n').split("|")
             self.agent_pid = int(l[0])
             self.name = l[1]
             self.display = int(l[2])
@@ -305,6 +309,30 @@ class X2GoServerSessionInfo(object):
         self.clear()
 
 
+def parse_x2golistsessions(x2go_output, info_backend=X2GoServerSessionInfo):
+    """\
+    Parse X2Go's listsessions output line by line.
+
+    @param x2go_output: X2Go server's C{x2golistsessions} command output, either as a string
+        or as a file-like object (or any other iterable) that yields the output line by line
+    @type x2go_output: C{str} or C{file}
+    @param info_backend: the session info backend to use
+    @type info_backend: C{X2GoServerSessionInfo*}
+
+    @return: generator of session info objects, one per listed session
+    @rtype: C{generator}
+
+    """
+    if type(x2go_output) in types.StringTypes:
+        x2go_output = x2go_output.split("\n")
+    for line in x2go_output:
+        if not line.strip():
+            continue
+        s_info = info_backend()
+        s_info._parse_x2golistsessions_line(line)
+        yield s_info
+
+
 class X2GoServerSessionList(object):
     """\
     L{X2GoServerSessionList} is used to store all information
@@ -323,24 +351,50 @@ class X2GoServerSessionList(object):
 
         """
         self.sessions = {}
+        self._display_index = {}
+        self._hostname_index = {}
         if x2go_output is not None:
-            lines = x2go_output.split("\n")
-            for line in lines:
-                if not line:
-                    continue
-                s_info = info_backend()
-                s_info._parse_x2golistsessions_line(line)
-                self.sessions[s_info.name] = s_info
+            for s_info in parse_x2golistsessions(x2go_output, info_backend=info_backend):
+                self._add_session(s_info)
 
     def __call__(self):
         return self.sessions
 
+    def _add_session(self, s_info):
+        """\
+        Add a session info object to the session list and its lookup indexes.
+
+        @param s_info: session info object
+        @type s_info: C{X2GoServerSessionInfo*}
+
+        """
+        self.sessions[s_info.name] = s_info
+        self._display_index.setdefault(str(s_info.display), []).append(s_info)
+        self._hostname_index.setdefault(s_info.hostname, []).append(s_info)
+
     def set_sessions(self, sessions):
         """\
         Set the sessions property directly by parsing a complete data structure.
 
         """
-        self.sessions = sessions
+        self.sessions = {}
+        self._display_index = {}
+        self._hostname_index = {}
+        for s_info in sessions.values():
+            self._add_session(s_info)
+
+    def get_sessions_of_hostname(self, hostname):
+        """\
+        Retrieve the session information of all sessions running on a given host.
+
+        @param hostname: the queried hostname
+        @type hostname: C{str}
+
+        @return: list of session info objects
+        @rtype: C{list}
+
+        """
+        return list(self._hostname_index.get(hostname, []))
 
     def get_session_info(self, session_name):
         """\
@@ -373,8 +427,15 @@ class X2GoServerSessionList(object):
         if property_name == 'display':
             value = value.lstrip(':')
             if '.' in value: value = value.split('.')[0]
-
-        for session in self.sessions.values():
+            candidates = self._display_index.get(str(value), [])
+        elif property_name == 'name':
+            candidates = [ self.sessions[value] ] if self.sessions.has_key(value) else []
+        elif property_name == 'hostname':
+            candidates = self._hostname_index.get(value, [])
+        else:
+            candidates = self.sessions.values()
+
+        for session in candidates:
             try:
                 if str(getattr(session, property_name)) == str(value):
                     if hostname is None or session.hostname == hostname:
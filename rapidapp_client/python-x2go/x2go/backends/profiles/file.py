@@ -50,7 +50,7 @@ uniquehostkeyaliases = 0
 rdpserver = 
 directrdpsettings = 
 sshproxysamepass = 0
-speed = 2
+speed = 5
 setsessiontitle = 0
 sessiontitle = 
 layout = 
@@ -28,16 +28,24 @@ __NAME__ = 'x2gosessionprofiles-pylib'
 
 import re
 import requests
+import requests.adapters
 import urllib3.exceptions
 import copy
 import types
 import time
+import gevent
+import gevent.pool
+import gevent.lock
 try: import simplejson as json
 except ImportError: import json
 
 # Python X2Go modules
 from x2go.defaults import X2GO_SESSIONPROFILE_DEFAULTS as _X2GO_SESSIONPROFILE_DEFAULTS
 from x2go.defaults import CURRENT_LOCAL_USER as _CURRENT_LOCAL_USER
+from x2go.defaults import X2GO_BROKER_CONNECT_TIMEOUT as _X2GO_BROKER_CONNECT_TIMEOUT
+from x2go.defaults import X2GO_BROKER_READ_TIMEOUT as _X2GO_BROKER_READ_TIMEOUT
+from x2go.defaults import X2GO_BROKER_HTTP_POOL_SIZE as _X2GO_BROKER_HTTP_POOL_SIZE
+from x2go.defaults import X2GO_BROKER_PREFETCH_SESSIONS as _X2GO_BROKER_PREFETCH_SESSIONS
 import x2go.backends.profiles.base as base
 import x2go.log as log
 from x2go.utils import genkeypair
@@ -51,6 +59,8 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
                  broker_url="http://localhost:8080/json/",
                  broker_username=None,
                  broker_password=None,
+                 broker_timeout=(_X2GO_BROKER_CONNECT_TIMEOUT, _X2GO_BROKER_READ_TIMEOUT),
+                 broker_prefetch=_X2GO_BROKER_PREFETCH_SESSIONS,
                  logger=None, loglevel=log.loglevel_DEFAULT,
                  **kwargs):
         """\
@@ -63,6 +73,11 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
         @param broker_password: use this password for authentication against the X2Go Session Broker (avoid
             password string in the C{broker_URL} parameter is highly recommended)
         @type broker_password: C{str}
+        @param broker_timeout: connect and read timeout (in seconds) for requests to the X2Go Session Broker
+        @type broker_timeout: C{tuple}
+        @param broker_prefetch: request the session information of all session profiles right after
+            they have been listed (see L{broker_prefetch_sessions()})
+        @type broker_prefetch: C{bool}
         @param logger: you can pass an L{X2GoLogger} object to the
             L{x2go.backends.profiles.httpbroker.X2GoSessionProfiles} constructor
         @type logger: L{X2GoLogger} instance
@@ -105,13 +120,28 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
 
         self._broker_type = "http"
 
-        base.X2GoSessionProfiles.__init__(self, session_profile_defaults=session_profile_defaults, logger=logger, loglevel=loglevel)
-        if self.broker_url != "HTTP":
-            self.logger("Using session broker at URL: %s" % self.broker_url, log.loglevel_NOTICE)
+        self.broker_timeout = broker_timeout
+        self.broker_prefetch = broker_prefetch
+
+        # all broker requests share one HTTP session, connections to the broker are kept alive
+        # and reused (no new TCP/TLS handshake per request)
+        self._broker_http = requests.Session()
+        _adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=_X2GO_BROKER_HTTP_POOL_SIZE)
+        self._broker_http.mount('http://', _adapter)
+        self._broker_http.mount('https://', _adapter)
+        self._broker_http.headers.update({
+            'Connection': 'keep-alive',
+            'Accept-Encoding': 'gzip, deflate',
+        })
 
         # for broker based autologin, we have to be able to provide public/private key pair
+        # (needed before the session profiles get populated, they may get prefetched)
         self.broker_my_pubkey, self.broker_my_privkey = genkeypair(local_username=_CURRENT_LOCAL_USER, client_address='127.0.0.1')
 
+        base.X2GoSessionProfiles.__init__(self, session_profile_defaults=session_profile_defaults, logger=logger, loglevel=loglevel)
+        if self.broker_url != "HTTP":
+            self.logger("Using session broker at URL: %s" % self.broker_url, log.loglevel_NOTICE)
+
     def get_broker_noauth(self):
         """\
         Accessor for the class's C{broker_noauth} property.
@@ -167,6 +197,24 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
         """
         return self._broker_type
 
+    def _broker_post(self, request_data):
+        """\
+        Send a request to the instance's broker URL (via the instance's persistent HTTP session).
+
+        @param request_data: the request's form data
+        @type request_data: C{dict}
+
+        @return: the broker's response
+        @rtype: C{requests.Response}
+
+        @raise X2GoBrokerConnectionException: Raised if the broker cannot be reached.
+
+        """
+        try:
+            return self._broker_http.post(self.broker_url, data=request_data, timeout=self.broker_timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.MissingSchema, urllib3.exceptions.LocationParseError):
+            raise x2go.x2go_exceptions.X2GoBrokerConnectionException('Failed to connect to URL %s' % self.broker_url)
+
     def broker_simpleauth(self, broker_username, broker_password):
         """\
         Attempt a username / password authentication against the instance's
@@ -198,10 +246,7 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
                     request_data['password'] = "<EMPTY>"
                 self.logger("Sending request to broker: user: {user}, password: {password}".format(**request_data), log.loglevel_DEBUG)
                 request_data['password'] = broker_password or ''
-            try:
-                r = requests.post(self.broker_url, data=request_data)
-            except (requests.exceptions.ConnectionError, requests.exceptions.MissingSchema, urllib3.exceptions.LocationParseError):
-                raise x2go.x2go_exceptions.X2GoBrokerConnectionException('Failed to connect to URL %s' % self.broker_url)
+            r = self._broker_post(request_data)
             if r.status_code == 200:
                 payload = json.loads(r.text)
                 if not self.broker_authid and not self.broker_password:
@@ -244,6 +289,9 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
         self.broker_password = None
         self.broker_noauth = False
 
+        # drop the kept-alive broker connections
+        self._broker_http.close()
+
     def is_broker_authenticated(self):
         """\
         Detect if an authenticated broker session has already been
@@ -287,10 +335,7 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
                     request_data['password'] = "<EMPTY>"
                 self.logger("Sending request to broker: user: {user}, password: {password}, task: {task}".format(**request_data), log.loglevel_DEBUG)
                 request_data['password'] = self.broker_password or ''
-            try:
-                r = requests.post(self.broker_url, data=request_data)
-            except requests.exceptions.ConnectionError:
-                raise x2go.x2go_exceptions.X2GoBrokerConnectionException('Failed to connect to URL %s' % self.broker_url)
+            r = self._broker_post(request_data)
             if r.status_code == 200 and r.headers['content-type'].startswith("text/json"):
                 payload = json.loads(r.text)
                 if payload.has_key('next-authid'):
@@ -303,7 +348,7 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
         self.broker_authid = None
         return {}
 
-    def broker_selectsession(self, profile_id):
+    def broker_selectsession(self, profile_id, prefetch=False):
         """\
         Select a session from the list of available session profiles (presented by
         L{broker_listprofiles}). This method requests a session information dictionary
@@ -312,6 +357,9 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
 
         @param profile_id: profile ID of the selected session profile
         @type profile_id: C{str}
+        @param prefetch: the session information is only being prefetched (see L{broker_prefetch_sessions()}),
+            a rejected request does not drop the broker authentication state
+        @type prefetch: C{bool}
 
         @return: session information (server, port, SSH keys, etc.) for a selected
             session profile (i.e. C{profile_id})
@@ -336,23 +384,82 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
                         request_data['password'] = "<EMPTY>"
                     self.logger("Sending request to broker: user: {user}, password: {password}, task: {task}".format(**request_data), log.loglevel_DEBUG)
                     request_data['password'] = self.broker_password or ''
-                try:
-                    r = requests.post(self.broker_url, data=request_data)
-                except requests.exceptions.ConnectionError:
-                    raise x2go.x2go_exceptions.X2GoBrokerConnectionException('Failed to connect to URL %s' % self.broker_url)
+                r = self._broker_post(request_data)
                 if r.status_code == 200 and r.headers['content-type'].startswith("text/json"):
                     payload = json.loads(r.text)
                     if payload.has_key('next-authid'):
                         self.broker_authid = payload['next-authid']
                     self._broker_profile_cache[profile_id] = payload['selected_session'] if payload['task'] == 'selectsession' else {}
                     self._broker_auth_successful = True
-                else:
+                elif not prefetch:
                     self.broker_authid = None
                     self._broker_auth_successful = False
             self._broker_profile_cache[profile_id]
             return self._broker_profile_cache[profile_id]
         return {}
 
+    def broker_prefetch_sessions(self, profile_ids=None):
+        """\
+        Request the session information (see L{broker_selectsession()}) for several session
+        profiles at once and keep them in the instance's broker profile cache.
+
+        The first request is sent on its own. If the broker does not hand out an authentication ID
+        with its response, the remaining requests are sent concurrently (over up to
+        L{defaults.X2GO_BROKER_HTTP_POOL_SIZE} kept-alive connections). Authentication IDs are
+        valid for one request only, so once the broker has handed out one, the requests are
+        sent one after the other. Failing prefetch requests do not affect the broker
+        authentication state.
+
+        @param profile_ids: the session profiles to prefetch (default: all listed session profiles)
+        @type profile_ids: C{list}
+
+        @return: the profile IDs whose session information is cached now
+        @rtype: C{list}
+
+        """
+        if self.broker_url is None:
+            return []
+        if profile_ids is None:
+            profile_ids = self.session_profiles.keys()
+        profile_ids = [ p for p in profile_ids if not self._broker_profile_cache.get(p) ]
+
+        _authid_lock = gevent.lock.Semaphore()
+
+        def _prefetch(profile_id):
+            try:
+                if self.broker_authid is not None:
+                    # each authentication ID is valid for one request only
+                    _authid_lock.acquire()
+                    try:
+                        self.broker_selectsession(profile_id, prefetch=True)
+                    finally:
+                        _authid_lock.release()
+                else:
+                    self.broker_selectsession(profile_id, prefetch=True)
+                return True
+            except x2go.x2go_exceptions.X2GoBrokerConnectionException, e:
+                self.logger('prefetching session information for profile %s failed: %s' % (profile_id, str(e)), loglevel=log.loglevel_WARN)
+            except KeyError:
+                # the broker has rejected the request
+                self.logger('broker did not provide session information for profile %s' % profile_id, loglevel=log.loglevel_WARN)
+            return False
+
+        # the first response tells if the broker hands out authentication IDs
+        _pending = profile_ids[:]
+        if _pending:
+            _prefetch(_pending.pop(0))
+        while _pending and self.broker_authid is not None:
+            if not _prefetch(_pending.pop(0)):
+                # the authentication ID may have been used up, leave the rest for later
+                return [ p for p in profile_ids if self._broker_profile_cache.get(p) ]
+        if _pending:
+            _pool = gevent.pool.Pool(_X2GO_BROKER_HTTP_POOL_SIZE)
+            for profile_id in _pending:
+                _pool.spawn(_prefetch, profile_id)
+            _pool.join()
+
+        return [ p for p in profile_ids if self._broker_profile_cache.get(p) ]
+
     def _init_profile_cache(self, profile_id):
         if self._broker_profile_cache.has_key(unicode(profile_id)):
             del self._broker_profile_cache[unicode(profile_id)]
@@ -382,6 +489,9 @@ class X2GoSessionProfiles(base.X2GoSessionProfiles):
                     if not session_profiles[session_profile].has_key(key):
                         session_profiles[session_profile][key] = default_value
 
+            if self.broker_prefetch:
+                self.broker_prefetch_sessions(session_profiles.keys())
+
         else:
             session_profiles = {}
 
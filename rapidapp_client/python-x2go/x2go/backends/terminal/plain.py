@@ -54,6 +54,7 @@ from x2go.defaults import X2GO_CLIENT_ROOTDIR as _X2GO_CLIENT_ROOTDIR
 from x2go.defaults import X2GO_SESSIONS_ROOTDIR as _X2GO_SESSIONS_ROOTDIR
 from x2go.defaults import X2GO_GENERIC_APPLICATIONS as _X2GO_GENERIC_APPLICATIONS
 from x2go.defaults import X2GO_DESKTOPSESSIONS as _X2GO_DESKTOPSESSIONS
+from x2go.defaults import X2GO_LINK_AUTO_FALLBACK as _X2GO_LINK_AUTO_FALLBACK
 
 from x2go.defaults import BACKENDS as _BACKENDS
 
@@ -99,6 +100,25 @@ def _rewrite_cmd(cmd, params=None):
     return cmd
 
 
+_FASTSTART_MARKER = 'X2GOFASTSTART:'
+"""Prefix of the lines the fast-path session startup command reports its progress with."""
+
+def _escape_for_sh_c(script):
+    """\
+    Escape a shell script so that it survives being passed to the double-quoted
+    C{sh -c} invocation of the control session's command execution.
+
+    @param script: shell script
+    @type script: C{str}
+
+    @return: the escaped shell script
+    @rtype: C{str}
+
+    """
+    for _char in ('\\', '"', '$', '`'):
+        script = script.replace(_char, '\\%s' % _char)
+    return script
+
 def _rewrite_blanks(cmd):
     """\
     In command strings X2Go server scripts expect blanks being rewritten to ,,X2GO_SPACE_CHAR''.
@@ -234,7 +254,9 @@ class X2GoTerminalSession(object):
         @type geometry: C{str}
         @param depth: color depth in bits (common values: C{16}, C{24})
         @type depth: C{int}
-        @param link: network link quality (either one of C{modem}, C{isdn}, C{adsl}, C{wan} or C{lan})
+        @param link: network link quality (either one of C{modem}, C{isdn}, C{adsl}, C{wan} or C{lan}),
+            with C{auto} link quality and pack method get chosen from the link quality measured while
+            connecting, it gets measured again when the session is resumed (see L{X2GoTerminalSession.tune_link()})
         @type link: C{str}
         @param pack: compression method for NX based session proxying
         @type pack: C{str}
@@ -347,6 +369,9 @@ class X2GoTerminalSession(object):
         self.params.geometry = str(geometry)
         self.params.link = str(link)
         self.params.pack = str(pack)
+        self.params.auto_link = self.params.link == 'auto'
+        if self.params.auto_link:
+            self.params.link = _X2GO_LINK_AUTO_FALLBACK
         self.params.dpi = str(dpi)
         self.params.cache_type = str(cache_type)
         self.params.session_type = str(session_type)
@@ -403,6 +428,9 @@ class X2GoTerminalSession(object):
         self._share_local_folder_lock = threading.Lock()
         self._cleaned_up = False
 
+        # the PulseAudio client configuration has been set up by the fast-path session startup
+        self._pulse_configured = False
+
         self.telekinesis_subprocess = None
 
     def __del__(self):
@@ -521,6 +549,19 @@ class X2GoTerminalSession(object):
         """
         return self.params.session_type
 
+    def _pulse_cookie_filepath(self):
+        """\
+        Find the local PulseAudio cookie file.
+
+        @return: full path of the PulseAudio cookie file, C{None} if there is none
+        @rtype: C{str}
+
+        """
+        for _cookie_filepath in ('%s/.pulse-cookie' % _LOCAL_HOME, '%s/.config/pulse/cookie' % _LOCAL_HOME):
+            if os.path.exists(os.path.normpath(_cookie_filepath)):
+                return os.path.normpath(_cookie_filepath)
+        return None
+
     def start_sound(self):
         """\
         Initialize Paramiko/SSH reverse forwarding tunnel for X2Go sound.
@@ -540,18 +581,15 @@ class X2GoTerminalSession(object):
                 ###
                 ### PULSEAUDIO
                 ###
-                cookie_filepath = None
-                if os.path.exists(os.path.normpath('%s/.pulse-cookie' % _LOCAL_HOME)):
-                    cookie_filepath = os.path.normpath('%s/.pulse-cookie' % _LOCAL_HOME)
-                elif os.path.exists(os.path.normpath('%s/.config/pulse/cookie' % _LOCAL_HOME)):
-                    cookie_filepath = os.path.normpath('%s/.config/pulse/cookie' % _LOCAL_HOME)
+                cookie_filepath = self._pulse_cookie_filepath()
                 if cookie_filepath is not None:
-                    # setup pulse client config file on X2Go server
-                    cmd_line = "echo 'default-server=127.0.0.1:%s'>%s/.pulse-client.conf;" % (self.session_info.snd_port, self.session_info.remote_container) + \
-                               "echo 'cookie-file=%s/.pulse-cookie'>>%s/.pulse-client.conf" % (self.session_info.remote_container, self.session_info.remote_container)
-                    (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+                    if not self._pulse_configured:
+                        # setup pulse client config file on X2Go server
+                        cmd_line = "echo 'default-server=127.0.0.1:%s'>%s/.pulse-client.conf;" % (self.session_info.snd_port, self.session_info.remote_container) + \
+                                   "echo 'cookie-file=%s/.pulse-cookie'>>%s/.pulse-client.conf" % (self.session_info.remote_container, self.session_info.remote_container)
+                        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
 
-                    self.control_session._x2go_sftp_put(local_path=cookie_filepath, remote_path='%s/.pulse-cookie' % self.session_info.remote_container)
+                        self.control_session._x2go_sftp_put(local_path=cookie_filepath, remote_path='%s/.pulse-cookie' % self.session_info.remote_container)
 
                     # start reverse SSH tunnel for pulse stream
                     _tunnel = rforward.X2GoRevFwTunnel(server_port=self.session_info.snd_port, 
@@ -621,8 +659,8 @@ class X2GoTerminalSession(object):
                 self.reverse_tunnels[self.session_info.name]['sshfs'] = (self.session_info.sshfs_port, _tunnel)
                 _tunnel.start()
                 self.active_threads.append(_tunnel)
-                while not _tunnel.ready:
-                    gevent.sleep(.1)
+                if not _tunnel.wait_ready():
+                    raise x2go_exceptions.X2GoUserException('The reverse forwarding tunnel for folder sharing could not be set up.')
 
         else:
             # tunnel has already been started and might simply need a resume call
@@ -654,6 +692,26 @@ class X2GoTerminalSession(object):
         """
         self._x2go_pause_rev_fw_tunnel('sshfs')
 
+    def get_tunnel_byte_counters(self):
+        """\
+        Retrieve the number of bytes relayed by the tunnels of this session (graphics
+        forwarding tunnel and the reverse forwarding tunnels for sound, folder sharing, etc.).
+
+        @return: tuple C{(bytes_up, bytes_down)} of bytes sent to and received from the X2Go server
+        @rtype: C{tuple}
+
+        """
+        _stats = []
+        if self.proxy is not None and self.proxy.fw_tunnel is not None:
+            _fw_stats = self.proxy.fw_tunnel.get_relay_stats()
+            if _fw_stats:
+                _stats.append(_fw_stats)
+        if self.session_info is not None and self.reverse_tunnels.has_key(self.session_info.name):
+            for (_port, _tunnel) in self.reverse_tunnels[self.session_info.name].values():
+                if _tunnel is not None:
+                    _stats.extend(_tunnel.get_channel_stats().values())
+        return (sum([ s['bytes_up'] for s in _stats ]), sum([ s['bytes_down'] for s in _stats ]))
+
     def start_printing(self):
         """\
         Initialize X2Go print spooling.
@@ -872,7 +930,12 @@ class X2GoTerminalSession(object):
         self._share_local_folder_lock.acquire()
 
         try:
-            self.control_session._x2go_sftp_write(_x2go_key_fname, _x2go_key_bundle)
+            _stdin_data = None
+            if self.control_session.fast_start:
+                # hand over the key bundle via the mount command's stdin, this saves the sFTP round trips
+                _stdin_data = _x2go_key_bundle
+            else:
+                self.control_session._x2go_sftp_write(_x2go_key_fname, _x2go_key_bundle)
 
             _convert_encoding = self.params.convert_encoding
             _client_encoding = self.params.client_encoding
@@ -934,7 +997,10 @@ class X2GoTerminalSession(object):
                              'rm -f %s %s.ident' % (_x2go_key_fname, _x2go_key_fname), 
                            ]
 
-            (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+            if _stdin_data is not None:
+                cmd_line = [ '(umask 077 && head -c %s >%s) &&' % (len(_stdin_data), _x2go_key_fname) ] + cmd_line
+
+            (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line, conflict_key=self.session_info.name, stdin_data=_stdin_data)
             _stdout = stdout.read().split('\n')
             self.logger('x2gomountdirs output is: %s' % _stdout, log.loglevel_NOTICE)
 
@@ -962,7 +1028,7 @@ class X2GoTerminalSession(object):
                      self.session_info.name,
                    ]
 
-        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line, conflict_key=self.session_info.name)
         if not stderr.read():
             self.logger('x2goumount-session (all mounts) for session %s has been successful' % self.session_info, log.loglevel_NOTICE)
             return True
@@ -986,7 +1052,7 @@ class X2GoTerminalSession(object):
                      "'%s'" % local_path,
                    ]
 
-        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line, conflict_key=self.session_info.name)
         if not stderr.read():
             self.logger('x2goumount-session (%s) for session %s has been successful' % (local_path, self.session_info, ), log.loglevel_NOTICE)
             return True
@@ -1193,17 +1259,16 @@ class X2GoTerminalSession(object):
 
             gevent.sleep(1)
 
-    def has_command(self, cmd):
+    def _command_test(self, cmd):
         """\
-        ,,Guess'' if the command C{<cmd>} exists on the X2Go server and is executable.
-        The expected result is not 100% safe, however, it comes with a high probability to
-        be correct.
+        Build the server-side test for L{has_command()}.
 
         @param cmd: session command
         @type cmd: C{str}
 
-        @return: C{True} if this method reckons that the command is executable on the remote X2Go server
-        @rtype: C{bool}
+        @return: C{True} or C{False} if the result is known without asking the X2Go server, otherwise
+            a shell command that succeeds (and prints C{OK}) if C{cmd} is executable on the X2Go server
+        @rtype: C{bool} or C{str}
 
         """
         test_cmd = None;
@@ -1227,12 +1292,30 @@ class X2GoTerminalSession(object):
             # check if application is in server path only
             test_cmd = 'which %s && echo OK' % os.path.basename(cmd.split()[0])
 
-        if test_cmd:
+        return test_cmd or False
+
+    def has_command(self, cmd):
+        """\
+        ,,Guess'' if the command C{<cmd>} exists on the X2Go server and is executable.
+        The expected result is not 100% safe, however, it comes with a high probability to
+        be correct.
+
+        @param cmd: session command
+        @type cmd: C{str}
+
+        @return: C{True} if this method reckons that the command is executable on the remote X2Go server
+        @rtype: C{bool}
+
+        """
+        test_cmd = self._command_test(cmd)
+        if type(test_cmd) is types.BooleanType:
+            return test_cmd
+        if test_cmd not in self.control_session.available_commands:
             (stdin, stdout, stderr) = self.control_session._x2go_exec_command([test_cmd])
-            _stdout = stdout.read()
-            return _stdout.find('OK') != -1
-        else:
-            return False
+            if stdout.read().find('OK') == -1:
+                return False
+            self.control_session.add_available_command(test_cmd)
+        return True
 
     def run_command(self, cmd=None, env={}):
         """\
@@ -1296,13 +1379,26 @@ class X2GoTerminalSession(object):
             for env_var in env.keys():
                 cmd_line = [ '%s=%s' % (env_var, env[env_var]) ] + cmd_line
 
+        _set_keyboard = self.params.kbtype not in ('null/null', 'auto') and (self.params.kblayout not in ('null', '') or self.params.kbvariant not in ('null', ''))
+        if _set_keyboard and self.control_session.fast_start:
+            # set up the keyboard within the same round trip
+            cmd_line = self._setxkbmap_cmd_line(layout=self.params.kblayout, variant=self.params.kbvariant) + \
+                       [ '1>/dev/null 2>/dev/null || echo %sKEYBOARD_FAILED;' % _FASTSTART_MARKER ] + cmd_line
+
         (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+        _stdout = stdout.read()
 
-        if self.params.kbtype not in ('null/null', 'auto') and (self.params.kblayout not in ('null', '') or self.params.kbvariant not in ('null', '')):
+        if _set_keyboard and self.control_session.fast_start:
+            if '%sKEYBOARD_FAILED' % _FASTSTART_MARKER in _stdout:
+                self.logger('setting keyboard layout ,,%s\'\' and variant ,,%s\'\' for session %s failed' % (self.params.kblayout, self.params.kbvariant, self.session_info), log.loglevel_ERROR)
+                _stdout = _stdout.replace('%sKEYBOARD_FAILED\n' % _FASTSTART_MARKER, '')
+            else:
+                self.logger('setting keyboard layout ,,%s\'\' and variant ,,%s\'\' for session %s has been successful' % (self.params.kblayout, self.params.kbvariant, self.session_info), log.loglevel_NOTICE)
+        elif _set_keyboard:
             self.set_keyboard(layout=self.params.kblayout, variant=self.params.kbvariant)
 
         self.logger('====>Returning from run_command...', loglevel=log.loglevel_DEBUG)
-        return stdout.read(), stderr.read()
+        return _stdout, stderr.read()
 
     def is_desktop_session(self):
         """\
@@ -1328,22 +1424,19 @@ class X2GoTerminalSession(object):
             return self.session_info.is_published_applications_provider()
         return False
 
-    def set_keyboard(self, layout='null', variant='null'):
+    def _setxkbmap_cmd_line(self, layout='null', variant='null'):
         """\
-        Set the keyboard layout and variant for this (running) session.
+        Build the command line that sets the keyboard layout and variant for this session.
 
         @param layout: keyboard layout to be set
         @type layout: C{str}
         @param variant: keyboard variant to be set
         @type variant: C{str}
 
-        @return: returns C{True} if the {setxkbmap} command could be executed successfully.
-        @rtype: C{bool}
+        @return: the C{setxkbmap} command line
+        @rtype: C{list}
 
         """
-        if not self.is_running():
-            return False
-
         cmd_line = [ 'export DISPLAY=:%s && ' % str(self.session_info.display),
                      'setxkbmap '
                    ]
@@ -1355,6 +1448,26 @@ class X2GoTerminalSession(object):
             self.logger('setting keyboad variant ,,%s\'\' for session %s' % (variant, self.session_info), log.loglevel_INFO)
             cmd_line.append('-variant %s' % variant)
 
+        return cmd_line
+
+    def set_keyboard(self, layout='null', variant='null'):
+        """\
+        Set the keyboard layout and variant for this (running) session.
+
+        @param layout: keyboard layout to be set
+        @type layout: C{str}
+        @param variant: keyboard variant to be set
+        @type variant: C{str}
+
+        @return: returns C{True} if the {setxkbmap} command could be executed successfully.
+        @rtype: C{bool}
+
+        """
+        if not self.is_running():
+            return False
+
+        cmd_line = self._setxkbmap_cmd_line(layout=layout, variant=variant)
+
         (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
         _stderr = stderr.read()
         if not _stderr:
@@ -1443,6 +1556,104 @@ class X2GoTerminalSession(object):
         """
         return self.control_session.is_connected()
 
+    def tune_link(self, remeasure=False):
+        """\
+        In C{auto} link mode, choose link class and pack method from the quality of the link to
+        the X2Go server (see L{X2GoControlSession.get_link_quality()}). If the chosen pack method
+        is not a valid NX3 compression method, the pack method of the session profile is kept.
+
+        @param remeasure: measure the link quality again instead of using the one measured while connecting
+        @type remeasure: C{bool}
+
+        """
+        if not self.params.auto_link:
+            return
+        (_rtt, _throughput) = self.control_session.get_link_quality(remeasure=remeasure)
+        if _rtt is None:
+            self.logger('failed to measure the link quality, using link class %s' % _X2GO_LINK_AUTO_FALLBACK, loglevel=log.loglevel_WARN)
+            self.params.link = _X2GO_LINK_AUTO_FALLBACK
+            return
+        (_link, _pack) = utils.select_link_settings(_rtt, _throughput)
+        self.params.link = _link
+        if _pack is not None:
+            self.params.pack = _pack
+        else:
+            self.logger('link tier %s has no valid NX3 pack method, keeping pack method %s' % (_link, self.params.pack), loglevel=log.loglevel_WARN)
+        self.logger('auto link mode: using link class %s and pack method %s' % (self.params.link, self.params.pack), loglevel=log.loglevel_NOTICE)
+
+    def _fast_start(self, agent_cmd_line, cmd):
+        """\
+        Fast-path session startup: check the session command, start the X2Go agent and set up the
+        PulseAudio client configuration with one compound server-side command (i.e. in a single
+        round trip). The PulseAudio cookie is handed over via the command's stdin.
+
+        @param agent_cmd_line: the C{x2gostartagent} command line
+        @type agent_cmd_line: C{list}
+        @param cmd: the session command (see L{has_command()})
+        @type cmd: C{str}
+
+        @return: tuple C{(stdout, stderr)} of C{x2gostartagent}, C{False} if the session command is not
+            available on the X2Go server, C{None} if the X2Go server does not support the fast-path startup
+        @rtype: C{tuple}
+
+        """
+        test_cmd = self._command_test(cmd)
+        if test_cmd is False:
+            return False
+
+        _script = [ 'if' ]
+        if test_cmd is True:
+            _script.append('true;')
+        else:
+            _script.append('( %s ) >/dev/null 2>&1;' % test_cmd)
+        _script += [ 'then echo %sAGENT;' % _FASTSTART_MARKER,
+                     'x2go_agent=$(%s </dev/null);' % ' '.join(agent_cmd_line),
+                     'echo "$x2go_agent";',
+                   ]
+
+        _cookie = None
+        _cookie_filepath = self.params.snd_system == 'pulse' and self._pulse_cookie_filepath()
+        if _cookie_filepath:
+            try:
+                _cookie_file = open(_cookie_filepath, 'rb')
+                try:
+                    _cookie = _cookie_file.read()
+                finally:
+                    _cookie_file.close()
+            except IOError:
+                _cookie = None
+        if _cookie:
+            # remote path is always a UniX path...
+            _container = '%s/.x2go/C-$x2go_session' % self.control_session._x2go_remote_home
+            _script += [ 'x2go_session=$(echo "$x2go_agent" | sed -n 4p);',
+                         'x2go_snd_port=$(echo "$x2go_agent" | sed -n 6p);',
+                         '[ -n "$x2go_session" ] && [ -d "%s" ] &&' % _container,
+                         'echo "default-server=127.0.0.1:$x2go_snd_port" >"%s/.pulse-client.conf" &&' % _container,
+                         'echo "cookie-file=%s/.pulse-cookie" >>"%s/.pulse-client.conf" &&' % (_container, _container),
+                         'head -c %s >"%s/.pulse-cookie" &&' % (len(_cookie), _container),
+                         'echo %sPULSE;' % _FASTSTART_MARKER,
+                       ]
+        _script += [ 'else echo %sNO_COMMAND;' % _FASTSTART_MARKER, 'fi' ]
+
+        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(_escape_for_sh_c(' '.join(_script)), stdin_data=_cookie)
+        _stdout = stdout.read()
+        _stderr = stderr.read()
+
+        _lines = _stdout.split('\n')
+        if '%sNO_COMMAND' % _FASTSTART_MARKER in _lines:
+            return False
+        if '%sAGENT' % _FASTSTART_MARKER not in _lines:
+            self.logger('X2Go server does not support the fast-path session startup, falling back to step-by-step startup', loglevel=log.loglevel_NOTICE)
+            self.control_session.fast_start = False
+            return None
+
+        if test_cmd is not True:
+            self.control_session.add_available_command(test_cmd)
+        self._pulse_configured = '%sPULSE' % _FASTSTART_MARKER in _lines
+
+        _agent_output = [ l for l in _lines[_lines.index('%sAGENT' % _FASTSTART_MARKER)+1:] if not l.startswith(_FASTSTART_MARKER) ]
+        return ('\n'.join(_agent_output), _stderr)
+
     def start(self):
         """\
         Start a new X2Go session.
@@ -1456,10 +1667,9 @@ class X2GoTerminalSession(object):
         """
         self.params.rewrite_session_type()
 
-        if not self.has_command(_rewrite_cmd(self.params.cmd, params=self.params)):
-            if self.client_instance:
-                self.client_instance.HOOK_no_such_command(profile_name=self.profile_name, session_name=self.session_info.name, cmd=self.params.cmd)
-            return False
+        _cmd = _rewrite_cmd(self.params.cmd, params=self.params)
+
+        self.tune_link()
 
         setkbd = "0"
         if self.params.kbtype != "null/null":
@@ -1499,10 +1709,22 @@ class X2GoTerminalSession(object):
         if self.params.dpi:
             cmd_line = ['X2GODPI=%s' % self.params.dpi] + cmd_line
 
-        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+        _result = None
+        if self.control_session.fast_start:
+            _result = self._fast_start(cmd_line, _cmd)
+        if _result is None:
+            # step-by-step session startup
+            if self.has_command(_cmd):
+                (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+                _result = (stdout.read(), stderr.read())
+            else:
+                _result = False
+        if _result is False:
+            if self.client_instance:
+                self.client_instance.HOOK_no_such_command(profile_name=self.profile_name, session_name=self.session_info.name, cmd=self.params.cmd)
+            return False
 
-        _stdout = stdout.read()
-        _stderr = stderr.read()
+        (_stdout, _stderr) = _result
 
         # if the first line of stdout is a "DEN(Y)" string then we will presume that
         # we tried to use X2Go desktop sharing and the sharing was rejected
@@ -1561,6 +1783,8 @@ class X2GoTerminalSession(object):
         @raise X2GoTerminalSessionException: if the terminal session failed to update server-side reported port changes
 
         """
+        self.tune_link(remeasure=True)
+
         setkbd = "0"
         if self.params.kbtype != "null/null":
             setkbd = "1"
@@ -1585,7 +1809,7 @@ class X2GoTerminalSession(object):
                      self.params.clipboard,
                    ]
 
-        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line)
+        (stdin, stdout, stderr) = self.control_session._x2go_exec_command(cmd_line, conflict_key=self.session_info.name)
 
         # re-allocate (if needed) server-side ports for graphics, sound and sshfs
         for stdout_line in stdout.read():
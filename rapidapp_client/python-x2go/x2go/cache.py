@@ -25,12 +25,85 @@ __NAME__ = 'x2gocache-pylib'
 
 # modules
 import copy
-import gevent
+import threading
 
 # Python X2Go modules
 import log
 import x2go_exceptions
 
+_SESSION_INFO_PROPERTIES = ('status', 'graphics_port', 'snd_port', 'sshfs_port', 'tekictrl_port', 'tekidata_port', 'date_suspended', )
+
+def diff_session_lists(old_sessions, new_sessions):
+    """\
+    Compare two session lists (as returned by C{X2GoControlSession.list_sessions()}).
+
+    @param old_sessions: the previous session list
+    @type old_sessions: C{dict} (or C{None})
+    @param new_sessions: the recent session list
+    @type new_sessions: C{dict} (or C{None})
+
+    @return: a dictionary with the keys C{added}, C{removed} and C{changed}, each of them
+        holding a list of session names
+    @rtype: C{dict}
+
+    """
+    old_sessions = old_sessions or {}
+    new_sessions = new_sessions or {}
+    _changes = {
+        'added': [ s for s in new_sessions.keys() if s not in old_sessions ],
+        'removed': [ s for s in old_sessions.keys() if s not in new_sessions ],
+        'changed': [],
+    }
+    for session_name, new_info in new_sessions.items():
+        if session_name not in old_sessions:
+            continue
+        old_info = old_sessions[session_name]
+        for prop in _SESSION_INFO_PROPERTIES:
+            if getattr(old_info, prop, None) != getattr(new_info, prop, None):
+                _changes['changed'].append(session_name)
+                break
+    return _changes
+
+
+class X2GoListSessionsSnapshot(object):
+    """\
+    A read-only snapshot of the cached session information of one session profile.
+
+    Snapshots never get modified after they have been published by the L{X2GoListSessionsCache},
+    a cache update replaces the whole snapshot instead. Thus, snapshots can be handed out to
+    readers without locking or copying.
+
+    """
+    __slots__ = ('generation', 'sessions', 'desktops', 'mounts', 'changes', )
+
+    def __init__(self, generation=0, sessions=None, desktops=None, mounts=None, changes=None):
+        """\
+        @param generation: the cache generation this snapshot has been published with
+        @type generation: C{int}
+        @param sessions: session list, see C{X2GoControlSession.list_sessions()}
+        @type sessions: C{dict}
+        @param desktops: desktop list, see C{X2GoControlSession.list_desktops()}
+        @type desktops: C{list}
+        @param mounts: client-side mounts per session name, see C{X2GoControlSession.list_mounts()}
+        @type mounts: C{dict}
+        @param changes: changes of the session list against the previous snapshot, see L{diff_session_lists()}
+        @type changes: C{dict}
+
+        """
+        if mounts is None:
+            mounts = {}
+        if changes is None:
+            changes = {'added': [], 'removed': [], 'changed': [], }
+        object.__setattr__(self, 'generation', generation)
+        object.__setattr__(self, 'sessions', sessions)
+        object.__setattr__(self, 'desktops', desktops)
+        object.__setattr__(self, 'mounts', mounts)
+        object.__setattr__(self, 'changes', changes)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('session cache snapshots are read-only')
+
+
 class X2GoListSessionsCache(object):
     """\
     For non-blocking operations in client applications using Python X2Go, it is
@@ -47,9 +120,11 @@ class X2GoListSessionsCache(object):
     the server's session/desktop list is available without delay, even on slow internet
     connections.
 
-    """
-    x2go_listsessions_cache = {}
+    The cached information of each session profile is kept in an L{X2GoListSessionsSnapshot}.
+    Cache updates build a new snapshot and swap it in as a whole, each swap increments the
+    cache's C{generation} counter. Readers never block and never receive copies.
 
+    """
     def __init__(self, client_instance, logger=None, loglevel=log.loglevel_DEFAULT):
         """\
         @param client_instance: the L{X2GoClient} instance that uses this L{X2GoListSessionsCache}
@@ -61,9 +136,9 @@ class X2GoListSessionsCache(object):
         @type loglevel: C{int}
 
         """
-        self.x2go_listsessions_cache = {}
-        self.last_listsessions_cache = {}
-        self.protected = False
+        self.snapshots = {}
+        self.generation = 0
+        self._generation_lock = threading.Lock()
 
         if logger is None:
             self.logger = log.X2GoLogger(loglevel=loglevel)
@@ -81,10 +156,7 @@ class X2GoListSessionsCache(object):
         @type profile_name: C{str}
 
         """
-        while self.protected:
-            gevent.sleep(.1)
-        try: del self.x2go_listsessions_cache[profile_name]
-        except KeyError: pass
+        self.snapshots.pop(profile_name, None)
 
     def check_cache(self):
         """\
@@ -93,9 +165,10 @@ class X2GoListSessionsCache(object):
         the session list cache.
 
         """
-        for profile_name in self.x2go_listsessions_cache.keys():
-            if profile_name not in self.client_instance.client_connected_profiles(return_profile_names=True):
-                del self.x2go_listsessions_cache[profile_name]
+        _connected_profiles = self.client_instance.client_connected_profiles(return_profile_names=True)
+        for profile_name in self.snapshots.keys():
+            if profile_name not in _connected_profiles:
+                self.snapshots.pop(profile_name, None)
 
     def update_all(self, update_sessions=True, update_desktops=False):
         """\
@@ -126,89 +199,119 @@ class X2GoListSessionsCache(object):
         @type update_mounts: C{bool}
 
         """
-        self.protected = True
-        self.last_listsessions_cache = copy.deepcopy(self.x2go_listsessions_cache)
         control_session = self.client_instance.client_control_session_of_profile_name(profile_name)
-        if not self.x2go_listsessions_cache.has_key(profile_name):
-            self.x2go_listsessions_cache[profile_name] = {'sessions': None, 'desktops': None, 'mounts': {}, }
-        if update_sessions:
-            self._update_sessions(profile_name, control_session)
-        if update_desktops:
-            self._update_desktops(profile_name, control_session)
-        if update_mounts:
-            self._update_mounts(profile_name, control_session)
-        self.protected = False
-
-    def _update_mounts(self, profile_name, control_session):
+        if not self.snapshots.has_key(profile_name):
+            self._publish(profile_name, X2GoListSessionsSnapshot())
+        if update_sessions or update_desktops or update_mounts:
+            self._update_batched(profile_name, control_session, update_sessions=update_sessions, update_desktops=update_desktops, update_mounts=update_mounts)
+
+    def _publish(self, profile_name, snapshot):
         """\
-        Update mounts list of L{X2GoListSessionsCache} for session profile C{profile_name}.
+        Swap in a new snapshot for session profile C{profile_name}.
 
-        @param profile_name: name of profile to update
+        @param profile_name: name of profile to publish the snapshot for
         @type profile_name: C{str}
+        @param snapshot: the new snapshot, its generation gets assigned here
+        @type snapshot: L{X2GoListSessionsSnapshot}
 
-        @raise X2GoControlSessionException: if the control session's C{list_mounts} method fails
         """
+        self._generation_lock.acquire()
         try:
-            self.x2go_listsessions_cache[profile_name]['mounts'] = {}
-            if self.x2go_listsessions_cache[profile_name]['sessions']:
-                for session_name in self.x2go_listsessions_cache[profile_name]['sessions']:
-                    session = self.client_instance.get_session_of_session_name(session_name, return_object=True, match_profile_name=profile_name)
-                    if session is not None and session.is_running():
-                        if control_session is not None and not control_session.has_session_died():
-                            self.x2go_listsessions_cache[profile_name]['mounts'].update(control_session.list_mounts(session_name))
-        except (x2go_exceptions.X2GoControlSessionException, AttributeError), e:
-            if profile_name in self.x2go_listsessions_cache.keys():
-                del self.x2go_listsessions_cache[profile_name]
-            self.protected = False
-            raise x2go_exceptions.X2GoControlSessionException(str(e))
-        except x2go_exceptions.X2GoTimeOutException:
-            pass
-        except KeyError:
-            pass
+            self.generation += 1
+            object.__setattr__(snapshot, 'generation', self.generation)
+            self.snapshots[profile_name] = snapshot
+        finally:
+            self._generation_lock.release()
 
-    def _update_desktops(self, profile_name, control_session):
+    def _update_batched(self, profile_name, control_session, update_sessions=True, update_desktops=False, update_mounts=False):
         """\
-        Update session lists of L{X2GoListSessionsCache} for session profile C{profile_name}.
+        Update session list, desktop list and/or mounts list of L{X2GoListSessionsCache} for session profile
+        C{profile_name} with one single (batched) server query.
 
         @param profile_name: name of profile to update
         @type profile_name: C{str}
         @param control_session: X2Go control session instance
         @type control_session: C{obj}
+        @param update_sessions: cache recent session list from server
+        @type update_sessions: C{bool}
+        @param update_desktops: cache recent desktop list from server
+        @type update_desktops: C{bool}
+        @param update_mounts: cache list of client-side mounts on server
+        @type update_mounts: C{bool}
 
-        @raise X2GoControlSessionException: if the control session's C{list_desktop} method fails
+        @raise X2GoControlSessionException: if the control session's C{list_batch} method fails
         """
         try:
             if control_session is not None and not control_session.has_session_died():
-                self.x2go_listsessions_cache[profile_name]['desktops'] = control_session.list_desktops()
+
+                _mounts = []
+                if update_mounts:
+                    _mounts = self.client_instance.client_running_sessions_of_profile_name(profile_name, return_session_names=True) or []
+
+                _results = control_session.list_batch(sessions=update_sessions, desktops=update_desktops, mounts=_mounts)
+
+                _previous = self.snapshots.get(profile_name) or X2GoListSessionsSnapshot()
+                _sessions = _previous.sessions
+                _desktops = _previous.desktops
+                _session_mounts = _previous.mounts
+                _changes = None
+
+                if update_sessions:
+                    _sessions = _results['sessions']
+                    _changes = diff_session_lists(_previous.sessions, _sessions)
+                if update_desktops:
+                    _desktops = _results['desktops']
+                if update_mounts:
+                    # only keep mounts of sessions that are (still) in the session list
+                    _session_mounts = dict([ (session_name, mounts) for (session_name, mounts) in _results.get('mounts', {}).items() if session_name in (_sessions or {}) ])
+
+                self._publish(profile_name, X2GoListSessionsSnapshot(sessions=_sessions, desktops=_desktops, mounts=_session_mounts, changes=_changes))
+
         except (x2go_exceptions.X2GoControlSessionException, AttributeError), e:
-            if profile_name in self.x2go_listsessions_cache.keys():
-                del self.x2go_listsessions_cache[profile_name]
-            self.protected = False
+            self.snapshots.pop(profile_name, None)
             raise x2go_exceptions.X2GoControlSessionException(str(e))
         except x2go_exceptions.X2GoTimeOutException:
             pass
         except KeyError:
             pass
 
-    def _update_sessions(self, profile_name, control_session):
+    def get_snapshot(self, profile_name):
         """\
-        Update desktop list of L{X2GoListSessionsCache} for session profile C{profile_name}.
+        Retrieve the current (read-only) cache snapshot of a session profile.
 
-        @param profile_name: name of profile to update
+        @param profile_name: name of profile to query the cache for
         @type profile_name: C{str}
 
-        @raise X2GoControlSessionException: if the control session's C{list_sessions} method fails
+        @return: the profile's cache snapshot
+        @rtype: L{X2GoListSessionsSnapshot} (or C{None})
+
         """
-        try:
-            if control_session is not None and not control_session.has_session_died():
-                self.x2go_listsessions_cache[profile_name]['sessions'] = control_session.list_sessions()
-        except (x2go_exceptions.X2GoControlSessionException, AttributeError), e:
-            if profile_name in self.x2go_listsessions_cache.keys():
-                del self.x2go_listsessions_cache[profile_name]
-            self.protected = False
-            raise x2go_exceptions.X2GoControlSessionException(str(e))
-        except KeyError:
-            pass
+        return self.snapshots.get(profile_name)
+
+    def get_changes(self, profile_name):
+        """\
+        Retrieve the changes of the most recent session list update of a session profile.
+
+        @param profile_name: name of profile to query the cache for
+        @type profile_name: C{str}
+
+        @return: a dictionary with the keys C{added}, C{removed} and C{changed}, each of them
+            holding a list of session names (see L{diff_session_lists()})
+        @rtype: C{dict} (or C{None})
+
+        """
+        _snapshot = self.snapshots.get(profile_name)
+        if _snapshot is not None:
+            return _snapshot.changes
+
+    def _get_snapshot_of_session(self, session_uuid):
+        """\
+        Retrieve the cache snapshot of the session profile a given L{X2GoSession} instance belongs to.
+
+        """
+        profile_name = self.client_instance.get_session_profile_name(session_uuid)
+        if self.is_cached(session_uuid=session_uuid):
+            return self.snapshots.get(profile_name)
 
     def list_sessions(self, session_uuid):
         """\
@@ -222,9 +325,9 @@ class X2GoListSessionsCache(object):
         @rtype: C{X2GoServerSessionList*} instance (or C{None})
 
         """
-        profile_name = self.client_instance.get_session_profile_name(session_uuid)
-        if self.is_cached(session_uuid=session_uuid):
-            return self.x2go_listsessions_cache[profile_name]['sessions']
+        _snapshot = self._get_snapshot_of_session(session_uuid)
+        if _snapshot is not None:
+            return _snapshot.sessions
         else:
             return None
 
@@ -241,9 +344,9 @@ class X2GoListSessionsCache(object):
         @rtype: C{list} (or C{None})
 
         """
-        profile_name = self.client_instance.get_session_profile_name(session_uuid)
-        if self.is_cached(session_uuid=session_uuid):
-            return self.x2go_listsessions_cache[profile_name]['desktops']
+        _snapshot = self._get_snapshot_of_session(session_uuid)
+        if _snapshot is not None:
+            return _snapshot.desktops
         else:
             return None
 
@@ -260,9 +363,9 @@ class X2GoListSessionsCache(object):
         @rtype: C{list} (or C{None})
 
         """
-        profile_name = self.client_instance.get_session_profile_name(session_uuid)
-        if self.is_cached(session_uuid=session_uuid):
-            return self.x2go_listsessions_cache[profile_name]['mounts']
+        _snapshot = self._get_snapshot_of_session(session_uuid)
+        if _snapshot is not None:
+            return _snapshot.mounts
         else:
             return None
 
@@ -284,8 +387,8 @@ class X2GoListSessionsCache(object):
                 profile_name = self.client_instance.get_session_profile_name(session_uuid)
             except x2go_exceptions.X2GoSessionRegistryException:
                 raise x2go_exceptions.X2GoSessionCacheException("requested session UUID is not valid anymore")
-        _is_profile_cached = self.x2go_listsessions_cache.has_key(profile_name)
-        _is_cache_type_cached = _is_profile_cached and self.x2go_listsessions_cache[profile_name].has_key(cache_type)
+        _is_profile_cached = self.snapshots.has_key(profile_name)
+        _is_cache_type_cached = _is_profile_cached and cache_type in ('sessions', 'desktops', 'mounts', )
         if cache_type is None:
             return _is_profile_cached
         else:
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+X2GoServerCapabilityCache class - persistent caching of X2Go server capabilities.
+
+"""
+__NAME__ = 'x2gocapcache-pylib'
+
+# modules
+import os
+import copy
+import time
+import json
+import hashlib
+import threading
+
+# Python X2Go modules
+import log
+import utils
+
+from defaults import X2GO_CAPCACHE_TTL as _X2GO_CAPCACHE_TTL
+
+
+def server_key(transport, username):
+    """\
+    Identify an X2Go server (image) and remote user by the SSH host key fingerprint
+    and the SSH server's version banner of an authenticated transport.
+
+    @param transport: an SSH transport
+    @type transport: C{paramiko.Transport} instance
+    @param username: the remote user name
+    @type username: C{str}
+
+    @return: the capability cache key, C{None} if the server's host key is not known (yet)
+    @rtype: C{str}
+
+    """
+    _host_key = transport.get_remote_server_key()
+    if _host_key is None:
+        return None
+    return '%s %s %s %s' % (_host_key.get_name(), _host_key.get_fingerprint().encode('hex'), transport.remote_version, username)
+
+
+class X2GoServerCapabilityCache(object):
+    """\
+    On-disk cache for the capabilities of X2Go servers (features, component versions,
+    available commands, the remote user's home directory and group memberships).
+
+    Each server (identified by L{server_key()}) has one cache file. Server nodes that are
+    deployed from the same image share their host key and thus their cache entry.
+
+    """
+    def __init__(self, cache_dir, ttl=_X2GO_CAPCACHE_TTL, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param cache_dir: directory to store the cache files in
+        @type cache_dir: C{str}
+        @param ttl: time (in seconds) a cache entry stays valid
+        @type ttl: C{int}
+        @param logger: you can pass an L{X2GoLogger} object to the L{X2GoServerCapabilityCache} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _cache_file(self, server_key):
+        return os.path.join(self.cache_dir, '%s.caps' % hashlib.md5(server_key).hexdigest())
+
+    def get(self, server_key):
+        """\
+        Retrieve the cached capabilities of a server.
+
+        @param server_key: identifies the server (see L{server_key()})
+        @type server_key: C{str}
+
+        @return: tuple C{(capabilities, age)} (age in seconds), C{(None, None)} if nothing (valid)
+            has been cached for this server
+        @rtype: C{tuple}
+
+        """
+        _cache_file = self._cache_file(server_key)
+        self._lock.acquire()
+        try:
+            try:
+                f = open(_cache_file, 'rb')
+                try:
+                    _entry = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError):
+                return (None, None)
+        finally:
+            self._lock.release()
+
+        try:
+            _age = time.time() - float(_entry['timestamp'])
+            capabilities = _entry['capabilities']
+        except (KeyError, TypeError, ValueError):
+            return (None, None)
+        if _age < 0 or _age > self.ttl:
+            return (None, None)
+        return (capabilities, _age)
+
+    def put(self, server_key, capabilities):
+        """\
+        Store the capabilities of a server. The cache file gets replaced in a single step
+        (see L{utils.replace_file_contents()}).
+
+        @param server_key: identifies the server (see L{server_key()})
+        @type server_key: C{str}
+        @param capabilities: the server's capabilities (must be JSON-serializable)
+        @type capabilities: C{dict}
+
+        """
+        _cache_file = self._cache_file(server_key)
+        self._lock.acquire()
+        try:
+            try:
+                utils.replace_file_contents(_cache_file, json.dumps({'timestamp': time.time(), 'capabilities': capabilities, }))
+            except (IOError, OSError), e:
+                self.logger('failed to write server capability cache file %s: %s' % (_cache_file, str(e)), loglevel=log.loglevel_WARN)
+        finally:
+            self._lock.release()
+
+    def drop(self, server_key):
+        """\
+        Remove the cached capabilities of a server.
+
+        @param server_key: identifies the server (see L{server_key()})
+        @type server_key: C{str}
+
+        """
+        self._lock.acquire()
+        try:
+            try:
+                os.remove(self._cache_file(server_key))
+            except OSError:
+                pass
+        finally:
+            self._lock.release()
@@ -123,8 +123,8 @@ import sys
 import types
 import os
 import socket
-import urllib2
 import datetime
+import time
 
 # Python X2Go modules
 from registry import X2GoSessionRegistry
@@ -133,6 +133,8 @@ from cache import X2GoListSessionsCache
 import x2go_exceptions
 import log
 import utils
+import portprobe
+import loadbalancer
 
 # we hide the default values from epydoc (that's why we transform them to _UNDERSCORE variables)
 from defaults import X2GOCLIENT_OS as _X2GOCLIENT_OS
@@ -146,6 +148,9 @@ from defaults import X2GO_SETTINGS_FILENAME as _X2GO_SETTINGS_FILENAME
 from defaults import X2GO_PRINTING_FILENAME as _X2GO_PRINTING_FILENAME
 from defaults import X2GO_XCONFIG_FILENAME as _X2GO_XCONFIG_FILENAME
 from defaults import PUBAPP_MAX_NO_SUBMENUS as _PUBAPP_MAX_NO_SUBMENUS
+from defaults import X2GO_PORTPROBE_PORTS as _X2GO_PORTPROBE_PORTS
+from defaults import X2GO_PORTPROBE_CACHE_FILENAME as _X2GO_PORTPROBE_CACHE_FILENAME
+from defaults import X2GO_PORTPROBE_RTT_MAX_AGE as _X2GO_PORTPROBE_RTT_MAX_AGE
 
 from defaults import BACKENDS as _BACKENDS
 
@@ -169,6 +174,8 @@ class X2GoClient(object):
     lang = 'en'
     apprime_server = None
     apprime_port = 22
+    apprime_rtt = None
+    apprime_rtt_time = None
 
     def __init__(self,
                  control_backend=_BACKENDS['X2GoControlSession']['default'],
@@ -291,6 +298,9 @@ class X2GoClient(object):
         self.sessions_rootdir = os.path.normpath(self.sessions_rootdir)
         self.ssh_rootdir = os.path.normpath(self.ssh_rootdir)
 
+        self._port_cache = portprobe.X2GoPortCache(os.path.join(self.client_rootdir, _X2GO_PORTPROBE_CACHE_FILENAME), logger=self.logger)
+        self._load_balancer = loadbalancer.X2GoLoadBalancerClient(logger=self.logger)
+
         self.pulseaudio_installdir = os.path.normpath(pulseaudio_installdir)
 
         if self.client_rootdir is not None:
@@ -732,6 +742,20 @@ class X2GoClient(object):
         """
         self.logger('HOOK_on_session_has_terminated (session_uuid: %s, profile_name: %s): session %s has terminated' % (session_uuid, profile_name, session_name), loglevel=log.loglevel_NOTICE)
 
+    def HOOK_network_quality_update(self, profile_name='UNKNOWN', session_name='UNKNOWN', stats=None):
+        """\
+        HOOK method: called each time the network quality monitor of a session has taken a sample.
+
+        @param profile_name: profile name of session that called this hook method
+        @type profile_name: C{str}
+        @param session_name: X2Go session name
+        @type session_name: C{str}
+        @param stats: the network quality statistics (see L{X2GoClient.get_session_network_quality()})
+        @type stats: C{dict}
+
+        """
+        self.logger('HOOK_network_quality_update: network quality of session %s (%s): round trip time %s' % (session_name, profile_name, stats and stats['rtt']), loglevel=log.loglevel_DEBUG)
+
     def HOOK_printing_not_available(self, profile_name='UNKNOWN', session_name='UNKNOWN'):
         """\
         HOOK method: called if X2Go client-side printing is not available.
@@ -1178,6 +1202,53 @@ class X2GoClient(object):
         return self.session_registry(session_uuid).get_session_info()
     __get_session_info = get_session_info
 
+    def get_session_network_quality(self, session_uuid):
+        """\
+        Retrieve the network quality statistics (SSH round trip times and tunnel throughput)
+        of the session that has been registered under C{session_uuid}.
+
+        @param session_uuid: the X2Go session's UUID registry hash
+        @type session_uuid: C{str}
+
+        @return: network quality statistics (see L{X2GoSession.get_network_quality()}), C{None} if
+            the session's network quality is not being monitored
+        @rtype: C{dict}
+
+        """
+        return self.session_registry(session_uuid).get_network_quality()
+    __get_session_network_quality = get_session_network_quality
+
+    def get_session_liveness_stats(self, session_uuid):
+        """\
+        Retrieve the liveness statistics (keepalive probes and SSH round trip times) of the
+        server connection of the session that has been registered under C{session_uuid}.
+
+        @param session_uuid: the X2Go session's UUID registry hash
+        @type session_uuid: C{str}
+
+        @return: liveness statistics (see L{X2GoSession.get_liveness_stats()}), C{None} if
+            the session's server connection is not being probed
+        @rtype: C{dict}
+
+        """
+        return self.session_registry(session_uuid).get_liveness_stats()
+    __get_session_liveness_stats = get_session_liveness_stats
+
+    def get_session_subsystem_status(self, session_uuid):
+        """\
+        Retrieve readiness and start-up time of the subsystems (sound, folder sharing,
+        printing, etc.) of the session that has been registered under C{session_uuid}.
+
+        @param session_uuid: the X2Go session's UUID registry hash
+        @type session_uuid: C{str}
+
+        @return: subsystem status (see L{X2GoSession.get_subsystem_status()})
+        @rtype: C{dict}
+
+        """
+        return self.session_registry(session_uuid).get_subsystem_status()
+    __get_session_subsystem_status = get_session_subsystem_status
+
     def get_published_applications(self, session_uuid=None, profile_name=None, lang=None, refresh=False, raw=False, very_raw=False, max_no_submenus=_PUBAPP_MAX_NO_SUBMENUS):
         """\
         Retrieve the server-side X2Go published applications menu for the session
@@ -1312,44 +1383,61 @@ class X2GoClient(object):
     __session_auto_connect = session_auto_connect
 
     #apprime code begin
+    def prefetch_load_balancer_node(self, username):
+        """\
+        Start querying the load balancer for the user's server node in the background (e.g. while
+        the user is still typing the password). L{apprimeLoadBalancer()} picks up the result.
+
+        @param username: the user to query the server node for
+        @type username: C{str}
+
+        """
+        self._load_balancer.prefetch(username)
+    __prefetch_load_balancer_node = prefetch_load_balancer_node
+
     def apprimeLoadBalancer(self, username):
-        response = None
-        try:
-            response = urllib2.urlopen("http://lb.rapidapp.online/lb/loadbalancer.php?uid=%s" % username)
-            self.vglbip = response.read().strip();
-            self.logger('====>>>>>RapidApp: LB gave node %s' % self.vglbip, loglevel=log.loglevel_INFO)
-        except:
-            raise ValueError('Unable to connect to loadbalancer. Is your network connection working?')
-        if(self.vglbip == '-1'):
-            raise ValueError('Your session is being optimized. Please try after a few seconds')
-        if(self.vglbip == '-99'):
-            raise ValueError('All servers are overloaded. Please try after a few minutes')
-        if(self.vglbip == '-1000'):
-            raise ValueError('Unknown loadbalancer error (-1000). Please try after a few minutes')
-        if(response.getcode() != 200):
-            raise ValueError('Unknown loadbalancer error (HTTP %d). Please try after a few minutes' % response.getcode())
-        
+        # errors are raised as ValueErrors with a user-presentable message
+        self.vglbip = self._load_balancer.get_node(username)
+        self.logger('====>>>>>RapidApp: LB gave node %s' % self.vglbip, loglevel=log.loglevel_INFO)
+
         #If we reach here, we've got a node IP. Lets check port reachability to it
         X2GoClient.apprime_server = self.vglbip.strip() #set the server node
         
-        #try port reachability
+        #try port reachability, the port that worked last time on this network is tried first
         X2GoClient.apprime_port = 22 #default
-        portoptions = [22, 80, 443, 25, 110, 21, 20, 995, 2525, 465, 143, 993] #most commonly used ports
-        for vgport in portoptions:
-            try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(2)
-                s.connect((X2GoClient.apprime_server, vgport))
-                s.close()
-                X2GoClient.apprime_port = vgport
-                break
-            except:
-                self.logger('====>>>>>VG: Port %d NOT open on node %s' % (vgport, X2GoClient.apprime_server), loglevel=log.loglevel_INFO,)
-            
+        _network = portprobe.network_id(X2GoClient.apprime_server)
+        _cached_port = self._port_cache.get(_network, X2GoClient.apprime_server)
+        (vgport, connect_time) = (None, None)
+        if _cached_port is not None:
+            (vgport, connect_time) = portprobe.probe_ports(X2GoClient.apprime_server, [_cached_port], logger=self.logger)
+            if vgport is None:
+                self.logger('====>>>>>VG: cached port %d NOT open on node %s anymore' % (_cached_port, X2GoClient.apprime_server), loglevel=log.loglevel_INFO,)
+        if vgport is None:
+            (vgport, connect_time) = portprobe.probe_ports(X2GoClient.apprime_server, _X2GO_PORTPROBE_PORTS, logger=self.logger)
+        if vgport is not None:
+            self.logger('====>>>>>VG: Port %d open on node %s (connect time: %d ms)' % (vgport, X2GoClient.apprime_server, connect_time * 1000), loglevel=log.loglevel_INFO,)
+            X2GoClient.apprime_port = vgport
+            # the connect time is a first estimate of the server node's latency
+            X2GoClient.apprime_rtt = connect_time
+            X2GoClient.apprime_rtt_time = time.time()
+            # storing the port again keeps a working port cached for another TTL
+            self._port_cache.put(_network, X2GoClient.apprime_server, vgport)
+        else:
+            self.logger('====>>>>>VG: none of the ports %s open on node %s' % (', '.join([ str(p) for p in _X2GO_PORTPROBE_PORTS ]), X2GoClient.apprime_server), loglevel=log.loglevel_INFO,)
+            self._port_cache.drop(_network, X2GoClient.apprime_server)
+
     #apprime code end 
     
 
     def getServerLatency(self):
+        for _session in self.session_registry.running_sessions(return_objects=True):
+            _quality = _session.get_network_quality()
+            if _quality and _quality['rtt']:
+                # median SSH round trip time sampled by the session's network quality monitor
+                return int(_quality['rtt']['p50'] * 1000)
+        if X2GoClient.apprime_rtt is not None and time.time() - X2GoClient.apprime_rtt_time < _X2GO_PORTPROBE_RTT_MAX_AGE:
+            # reuse the connect time measured by apprimeLoadBalancer()
+            return int(X2GoClient.apprime_rtt * 1000)
         latency = -1
         try:
             starttime = datetime.datetime.now()
@@ -432,3 +432,183 @@ X2GO_SHARE_FULLACCESS=1
 
 PUBAPP_MAX_NO_SUBMENUS=10
 """Less than ten applications will not get rendered into submenus."""
+
+##
+## X2Go control session defaults
+##
+
+X2GO_CONTROLSESSION_MAX_EXEC_CHANNELS = 8
+"""Maximum number of SSH exec channels a control session keeps open concurrently."""
+
+##
+## X2Go session guardian defaults
+##
+
+X2GO_GUARDIAN_FAST_REFRESH_INTERVAL = 5
+"""Refresh interval (in seconds) for session profiles with sessions in transition (starting, resuming, suspending, etc.)."""
+X2GO_GUARDIAN_WARMUP_REFRESH_INTERVAL = 15
+"""Refresh interval (in seconds) for recently connected session profiles."""
+X2GO_GUARDIAN_WARMUP_PERIOD = 60
+"""Time span (in seconds) after connecting a session profile that uses the warm-up refresh interval."""
+X2GO_GUARDIAN_TRANSITION_PERIOD = 30
+"""Time span (in seconds) after a session state change that uses the fast refresh interval."""
+X2GO_GUARDIAN_JITTER = 0.1
+"""Random jitter (fraction of the refresh interval) that spreads session profile refreshes over time."""
+X2GO_GUARDIAN_HOUSEKEEPING_INTERVAL = 15
+"""Maximum time (in seconds) the session guardian sleeps before checking for newly connected session profiles."""
+
+##
+## X2Go tunnel relay defaults
+##
+
+X2GO_RELAY_BUFSIZE = 65536
+"""Size (in bytes) of the preallocated buffers used for relaying tunnel traffic."""
+X2GO_RELAY_BUFFER_POOL_SIZE = 32
+"""Maximum number of relay buffers shared by all reverse forwarding tunnels."""
+X2GO_FWTUNNEL_RELAY_ENGINE = 'select'
+"""Default relay engine for forwarding tunnels (see L{relay.X2GO_RELAY_ENGINES})."""
+
+##
+## X2Go published applications cache defaults
+##
+
+X2GO_PUBAPP_CACHE_DIRNAME = os.path.join('cache', 'pubapps')
+"""Directory (relative to the client root directory) for the on-disk cache of published applications menus."""
+X2GO_PUBAPP_FINGERPRINT_COMMAND = 'find -L /etc/x2go/applications \\$(which x2gogetapps) -printf \'%p %T@ %s\\n\' 2>/dev/null | md5sum | cut -d\' \' -f1'
+"""Server-side command that cheaply fingerprints the published applications menu (paths, modification times and sizes of the .desktop files and of C{x2gogetapps} itself, no file contents get read)."""
+
+##
+## X2Go server capability cache defaults
+##
+
+X2GO_CAPCACHE_DIRNAME = os.path.join('cache', 'capabilities')
+"""Directory (relative to the client root directory) for the on-disk cache of X2Go server capabilities."""
+X2GO_CAPCACHE_TTL = 7 * 24 * 3600
+"""Time (in seconds) cached X2Go server capabilities stay valid."""
+X2GO_CAPCACHE_REVALIDATE_AGE = 3600
+"""Cached X2Go server capabilities older than this (in seconds) get revalidated in the background after connecting."""
+
+##
+## X2Go spool directory defaults
+##
+
+X2GO_SPOOL_USE_INOTIFY = True
+"""Watch print spool and MIME box directories via inotify (on Linux) instead of polling them."""
+X2GO_SPOOL_POLL_INTERVAL = 3
+"""Interval (in seconds) for polling print spool and MIME box directories if inotify is not used."""
+
+##
+## X2Go print/MIME box job defaults
+##
+
+X2GO_JOB_EXECUTOR_MAX_WORKERS = 4
+"""Maximum number of print and MIME box jobs that get processed concurrently."""
+X2GO_JOB_PROCESS_POLL_INTERVAL = 0.5
+"""Interval (in seconds) for checking if a viewer/print process started by a print or MIME box action has terminated."""
+
+##
+## X2Go session broker (HTTP) defaults
+##
+
+X2GO_BROKER_CONNECT_TIMEOUT = 10
+"""Timeout (in seconds) for connecting to an HTTP(S) session broker."""
+X2GO_BROKER_READ_TIMEOUT = 30
+"""Timeout (in seconds) for waiting for an HTTP(S) session broker's response."""
+X2GO_BROKER_HTTP_POOL_SIZE = 8
+"""Maximum number of kept-alive connections to an HTTP(S) session broker (also limits concurrent C{selectsession} requests)."""
+X2GO_BROKER_PREFETCH_SESSIONS = False
+"""Request the session information (C{selectsession}) of all session profiles right after they have been listed by an HTTP(S) session broker."""
+
+##
+## X2Go network quality monitor defaults
+##
+
+X2GO_NETMONITOR_INTERVAL = 5
+"""Interval (in seconds) for sampling the SSH round trip time and tunnel throughput of running sessions, C{0} disables the network quality monitor."""
+X2GO_NETMONITOR_WINDOW = 120
+"""Number of samples the network quality monitor computes its percentiles from."""
+X2GO_NETMONITOR_TIMEOUT = 5
+"""Maximum time (in seconds) to wait for the server's reply when sampling the SSH round trip time."""
+
+##
+## X2Go control session liveness defaults
+##
+
+X2GO_LIVENESS_INTERVAL = 10
+"""Interval (in seconds) for probing the SSH connection of a control session with keepalive requests, C{0} disables the liveness monitor (Paramiko's own keepalive messages get sent instead)."""
+X2GO_LIVENESS_TIMEOUT = 10
+"""Maximum time (in seconds) to wait for the server's reply to a liveness probe."""
+X2GO_LIVENESS_MAX_MISSED = 3
+"""Number of consecutive unanswered liveness probes after which the server connection is considered dead."""
+X2GO_LIVENESS_WINDOW = 60
+"""Number of round trip times of answered liveness probes that get kept."""
+
+##
+## X2Go session startup defaults
+##
+
+X2GO_FASTSTART = True
+"""Start sessions with a single compound server-side command (command check, agent startup and sound setup), servers that do not support it get the step-by-step startup."""
+X2GO_SUBSYSTEM_WAIT_TIMEOUT = 60
+"""Maximum time (in seconds) folder sharing requests wait for the session's folder sharing subsystem to come up."""
+X2GO_SESSION_STATE_TIMEOUT = 15
+"""Maximum time (in seconds) to wait for a server-side session to change its state (e.g. to get suspended before it is resumed)."""
+X2GO_POLL_INTERVAL_MIN = 0.1
+"""Initial interval (in seconds) between polls for state changes, it doubles after each unsuccessful poll."""
+X2GO_POLL_INTERVAL_MAX = 1.0
+"""Maximum interval (in seconds) between polls for state changes."""
+
+##
+## X2Go link auto-tuning defaults
+##
+
+X2GO_LINK_AUTO_TIERS = (
+    # (link class, minimum throughput in bytes/s, maximum round trip time in s, NX pack method)
+    ('lan', 4 * 1024 * 1024, 0.010, '16m-rgb-0'),
+    ('wan', 1024 * 1024, 0.050, '16m-png-jpeg-9'),
+    ('adsl', 256 * 1024, 0.150, '16m-jpeg-7'),
+    ('isdn', 64 * 1024, 0.400, '4k-tight'),
+    ('modem', 0, None, '32k-jpeg'),
+)
+"""Link classes and NX pack methods the C{auto} link mode chooses from, the first tier the measured link quality satisfies wins."""
+X2GO_LINK_AUTO_FALLBACK = 'adsl'
+"""Link class that is used by the C{auto} link mode if the link quality cannot be measured."""
+X2GO_LINK_AUTO_PROBE_SIZE = 256 * 1024
+"""Maximum number of bytes transferred from the X2Go server for measuring the link throughput."""
+X2GO_LINK_AUTO_PROBE_TIME = 0.5
+"""Maximum time (in seconds) spent on transferring data from the X2Go server for measuring the link throughput."""
+X2GO_LINK_AUTO_RTT_SAMPLES = 3
+"""Number of SSH round trips timed for measuring the link's round trip time (if the liveness monitor has not timed any yet)."""
+
+##
+## RapidApp load balancer defaults
+##
+
+X2GO_PORTPROBE_PORTS = (22, 80, 443, 25, 110, 21, 20, 995, 2525, 465, 143, 993, )
+"""Candidate ports for reaching the SSH daemon of a server node (most commonly used ports), in order of preference."""
+X2GO_PORTPROBE_TIMEOUT = 2
+"""Time (in seconds) for connecting to a candidate port of a server node and receiving the SSH daemon's greeting."""
+X2GO_PORTPROBE_GRACE = 0.3
+"""Once a candidate port works, time (in seconds) that preferred candidate ports get to work, too."""
+X2GO_PORTPROBE_CACHE_FILENAME = os.path.join('cache', 'ports')
+"""File (relative to the client root directory) that caches the last working port per server node and local network."""
+X2GO_PORTPROBE_CACHE_TTL = 7 * 24 * 3600
+"""Time (in seconds) a cached port of a server node stays valid."""
+X2GO_PORTPROBE_RTT_MAX_AGE = 60
+"""Time (in seconds) the connect time measured while probing ports is used as the server node's latency."""
+X2GO_LB_URL = 'http://lb.rapidapp.online/lb/loadbalancer.php'
+"""URL of the RapidApp load balancer script."""
+X2GO_LB_CONNECT_TIMEOUT = 5
+"""Timeout (in seconds) for connecting to the RapidApp load balancer."""
+X2GO_LB_READ_TIMEOUT = 10
+"""Timeout (in seconds) for waiting for the RapidApp load balancer's answer."""
+X2GO_LB_HEDGE_DELAY = 1.5
+"""Send a second (hedged) request if the RapidApp load balancer has not answered after this many seconds."""
+X2GO_LB_MIGRATION_MAX_WAIT = 60
+"""Maximum time (in seconds) to wait for the RapidApp load balancer to finish migrating a user's session."""
+X2GO_LB_BACKOFF_INITIAL = 1
+"""Initial delay (in seconds) before asking the RapidApp load balancer again while a session is being migrated."""
+X2GO_LB_BACKOFF_MAX = 8
+"""Maximum delay (in seconds) between two queries of the RapidApp load balancer while a session is being migrated."""
+X2GO_LB_PREFETCH_MAX_AGE = 30
+"""Time (in seconds) a server node assigned by a background query of the RapidApp load balancer stays valid."""
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoExecOutputReader} extracts the output of an X2Go server-side command from
+the stdout stream of an SSH exec channel.
+
+The control session frames each command's output with C{X2GODATABEGIN:<uuid>} and
+C{X2GODATAEND:<uuid>} markers (this protects against data injected via the user's
+shell startup files). The reader scans the stream for these markers incrementally
+and hands out the framed payload as it arrives.
+
+A streaming reader holds one of the control session's exec channels until its payload
+has been consumed completely or it gets closed. Always close it when done::
+
+    (stdin, stdout, stderr) = control_session._x2go_exec_command(cmd, stream=True)
+    try:
+        for line in stdout:
+            ...
+    finally:
+        stdout.close()
+
+The reader can also be used as a context manager (C{with stdout: ...}).
+
+"""
+__NAME__ = 'x2goexecoutput-pylib'
+
+# modules
+import gevent
+
+# Python X2Go modules
+import x2go_exceptions
+
+# number of bytes requested from the stream per read
+_CHUNK_SIZE = 32768
+
+
+class X2GoExecOutputReader(object):
+    """\
+    File-like reader for the framed output of an X2Go server-side command.
+
+    The payload can be consumed chunk-wise (L{iter_chunks()}), line-wise (L{iter_lines()},
+    iterating over the reader) or at once (L{read()}). The payload can be consumed only once.
+    Close the reader (L{close()}) if its payload does not get consumed completely.
+
+    """
+    def __init__(self, stream, cmd_uuid, on_close=None, chunk_size=_CHUNK_SIZE, timeout=None, on_timeout=None):
+        """\
+        @param stream: stdout of the SSH exec channel (a C{paramiko.ChannelFile}) or any other file-like object
+        @type stream: C{obj}
+        @param cmd_uuid: the UUID used in the command's framing markers
+        @type cmd_uuid: C{str}
+        @param on_close: function that gets called once the payload has been consumed (or the reader
+            has been closed)
+        @type on_close: C{func}
+        @param chunk_size: number of bytes to read from the stream at a time
+        @type chunk_size: C{int}
+        @param timeout: give up if the stream does not deliver any data for C{<timeout>} seconds
+            (C{None} waits forever)
+        @type timeout: C{float}
+        @param on_timeout: function that gets called when the reader gives up because of C{timeout}
+        @type on_timeout: C{func}
+
+        """
+        self._stream = stream
+        self._begin_marker = 'X2GODATABEGIN:%s' % cmd_uuid
+        self._end_marker = 'X2GODATAEND:%s' % cmd_uuid
+        self.on_close = on_close
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.on_timeout = on_timeout
+        self._consumed = False
+        self._complete = False
+        self._closed = False
+
+    def __del__(self):
+        self.close()
+
+    def __iter__(self):
+        return self.iter_lines()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """\
+        Stop reading from the stream. Unread payload is discarded, if the payload has not
+        been consumed completely, the SSH channel gets closed.
+
+        """
+        if not self._complete and not self._closed:
+            _channel = getattr(self._stream, 'channel', None)
+            if _channel is not None:
+                _channel.close()
+        self._consumed = True
+        if not self._closed:
+            self._closed = True
+            if self.on_close is not None:
+                self.on_close()
+
+    def abort(self):
+        """\
+        Close the reader and the SSH channel the command is running on.
+
+        """
+        self._complete = False
+        self.close()
+
+    def _recv_data(self):
+        # read whatever has arrived on an SSH channel, file-like objects are read chunk by chunk
+        _channel = getattr(self._stream, 'channel', None)
+        if _channel is not None:
+            return _channel.recv(self.chunk_size)
+        return self._stream.read(self.chunk_size)
+
+    def _recv(self):
+        if self.timeout is None:
+            return self._recv_data()
+        timer = gevent.Timeout(self.timeout)
+        timer.start()
+        try:
+            return self._recv_data()
+        except gevent.timeout.Timeout, t:
+            if t is not timer:
+                raise
+            self.abort()
+            if self.on_timeout is not None:
+                self.on_timeout()
+            raise x2go_exceptions.X2GoControlSessionException('the X2Go server-side command did not send any output for %ss' % self.timeout)
+        finally:
+            timer.cancel()
+
+    def iter_chunks(self):
+        """\
+        Yield the command's payload in chunks as it arrives on the stream.
+
+        The payload is terminated by a newline character, even if the command's output
+        has not been.
+
+        @return: generator of payload chunks
+        @rtype: C{generator}
+
+        """
+        if self._consumed:
+            return
+        self._consumed = True
+
+        try:
+            _begin = self._begin_marker
+            _end = self._end_marker
+            _buf = ''
+
+            # discard everything up to (and including) the line with the begin marker
+            while True:
+                _i = _buf.find(_begin)
+                if _i >= 0:
+                    _j = _buf.find('\n', _i)
+                    if _j >= 0:
+                        _buf = _buf[_j+1:]
+                        break
+                else:
+                    _buf = _buf[-len(_begin):]
+                _data = self._recv()
+                if not _data:
+                    self._complete = True
+                    return
+                _buf += _data
+
+            # hand out the payload, hold back enough bytes to detect an end marker spanning two reads
+            _keep = len(_end)
+            _last = '\n'
+            while True:
+                _i = _buf.find(_end)
+                if _i >= 0:
+                    self._complete = True
+                    if _i > 0:
+                        _last = _buf[_i-1]
+                        yield _buf[:_i]
+                    break
+                if len(_buf) > _keep:
+                    _last = _buf[-_keep-1]
+                    yield _buf[:-_keep]
+                    _buf = _buf[-_keep:]
+                _data = self._recv()
+                if not _data:
+                    # the stream ended without an end marker
+                    self._complete = True
+                    if _buf:
+                        _last = _buf[-1]
+                        yield _buf
+                    break
+                _buf += _data
+
+            if _last != '\n':
+                yield '\n'
+
+        finally:
+            self.close()
+
+    def iter_lines(self):
+        """\
+        Yield the command's payload line by line as it arrives on the stream.
+
+        @return: generator of payload lines (including the newline character)
+        @rtype: C{generator}
+
+        """
+        _partial = []
+        for _chunk in self.iter_chunks():
+            _start = 0
+            while True:
+                _j = _chunk.find('\n', _start)
+                if _j < 0:
+                    if _start < len(_chunk):
+                        _partial.append(_chunk[_start:])
+                    break
+                if _partial:
+                    _partial.append(_chunk[_start:_j+1])
+                    yield ''.join(_partial)
+                    _partial = []
+                else:
+                    yield _chunk[_start:_j+1]
+                _start = _j + 1
+        if _partial:
+            yield ''.join(_partial)
+
+    def read(self):
+        """\
+        Read the complete payload.
+
+        @return: the command's payload
+        @rtype: C{str}
+
+        """
+        return ''.join(self.iter_chunks())
+
+    def readlines(self):
+        """\
+        Read the complete payload as a list of lines.
+
+        @return: the command's payload lines (including the newline characters)
+        @rtype: C{list}
+
+        """
+        return list(self.iter_lines())
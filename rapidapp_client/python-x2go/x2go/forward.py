@@ -32,7 +32,9 @@ from gevent.server import StreamServer
 
 # Python X2Go modules
 import log
+import relay
 from defaults import X2GOCLIENT_OS as _X2GOCLIENT_OS
+from defaults import X2GO_RELAY_BUFSIZE as _X2GO_RELAY_BUFSIZE
 
 class X2GoFwServer(StreamServer):
     """\
@@ -46,7 +48,8 @@ class X2GoFwServer(StreamServer):
     def __init__ (self, listener,
                   remote_host, remote_port,
                   ssh_transport, session_instance=None, session_name=None,
-                  subsystem=None, logger=None, loglevel=log.loglevel_DEFAULT,):
+                  subsystem=None, relay_engine=None, relay_bufsize=_X2GO_RELAY_BUFSIZE,
+                  logger=None, loglevel=log.loglevel_DEFAULT,):
         """\
         @param listener: listen on TCP/IP socket C{(<IP>, <Port>)}
         @type listener: C{tuple}
@@ -61,6 +64,11 @@ class X2GoFwServer(StreamServer):
         @type session_instance: C{obj}
         @param session_name: the session name of the X2Go session this port forwarding server belongs to
         @type session_name: C{str}
+        @param relay_engine: name of the relay engine (see L{relay.X2GO_RELAY_ENGINES}) that moves
+            data through the tunnel, C{None} selects the default relay engine
+        @type relay_engine: C{str}
+        @param relay_bufsize: size of the relay buffers (per direction)
+        @type relay_bufsize: C{int}
         @param logger: you can pass an L{X2GoLogger} object to the
             L{X2GoFwServer} constructor
         @type logger: C{obj}
@@ -86,6 +94,9 @@ class X2GoFwServer(StreamServer):
         self.session_name = session_name
         self.session_instance = session_instance
         self.subsystem = subsystem
+        self.relay_engine_name = relay_engine
+        self.relay_bufsize = relay_bufsize
+        self.relay_engine = None
 
         self.fw_socket = None
 
@@ -152,19 +163,9 @@ class X2GoFwServer(StreamServer):
             # once we are here, we can presume the tunnel to be active...
             self.is_active = True
 
+            self.relay_engine = relay.get_relay_engine(self.relay_engine_name, bufsize=self.relay_bufsize, logger=self.logger)
             try:
-                while self.keepalive:
-                    r, w, x = select.select([self.fw_socket, self.chan], [], [])
-                    if fw_socket in r:
-                        data = fw_socket.recv(1024)
-                        if len(data) == 0:
-                            break
-                        self.chan.send(data)
-                    if self.chan in r:
-                        data = self.chan.recv(1024)
-                        if len(data) == 0:
-                            break
-                        fw_socket.send(data)
+                self.relay_engine.relay(self.fw_socket, self.chan, keepalive=lambda: self.keepalive)
                 self.close_channel()
                 self.close_socket()
             except socket.error:
@@ -173,6 +174,18 @@ class X2GoFwServer(StreamServer):
             self.logger('Tunnel closed from %r' % (chan_peername,),
                         loglevel=log.loglevel_INFO)
 
+    def get_relay_stats(self):
+        """\
+        Retrieve byte and iteration counters of the tunnel's relay engine.
+
+        @return: relay counters (see L{relay.X2GoRelayStats.get_stats()}) or C{None} if
+            no tunnel connection has been established, yet
+        @rtype: C{dict}
+
+        """
+        if self.relay_engine is not None:
+            return self.relay_engine.get_stats()
+
     def close_channel(self):
         """\
         Close an open channel again.
@@ -227,6 +240,8 @@ def start_forward_tunnel(local_host='127.0.0.1', local_port=22022,
                          session_instance=None,
                          session_name=None,
                          subsystem=None,
+                         relay_engine=None,
+                         relay_bufsize=_X2GO_RELAY_BUFSIZE,
                          logger=None, ):
     """\
     Setup up a Paramiko/SSH port forwarding tunnel (like openssh -L option).
@@ -249,6 +264,10 @@ def start_forward_tunnel(local_host='127.0.0.1', local_port=22022,
     @type session_name: C{str}
     @param subsystem: a custom string with a component name that tries to evoke a new tunnel setup
     @type subsystem: C{str}
+    @param relay_engine: name of the relay engine that moves data through the tunnel
+    @type relay_engine: C{str}
+    @param relay_bufsize: size of the relay buffers (per direction)
+    @type relay_bufsize: C{int}
     @param logger: an X2GoLogger object
     @type logger: C{obj}
 
@@ -261,6 +280,8 @@ def start_forward_tunnel(local_host='127.0.0.1', local_port=22022,
                              ssh_transport=ssh_transport,
                              session_instance=session_instance, session_name=session_name,
                              subsystem=subsystem,
+                             relay_engine=relay_engine,
+                             relay_bufsize=relay_bufsize,
                              logger=logger,
                             )
     try:
@@ -26,13 +26,22 @@ etc.).
 __NAME__ = 'x2goguardian-pylib'
 
 # modules
-import gevent
 import threading
 import copy
+import heapq
+import random
+import time
 
 # Python X2Go modules
 from cleanup import x2go_cleanup
 import log
+import x2go_exceptions
+from defaults import X2GO_GUARDIAN_FAST_REFRESH_INTERVAL as _X2GO_GUARDIAN_FAST_REFRESH_INTERVAL
+from defaults import X2GO_GUARDIAN_WARMUP_REFRESH_INTERVAL as _X2GO_GUARDIAN_WARMUP_REFRESH_INTERVAL
+from defaults import X2GO_GUARDIAN_WARMUP_PERIOD as _X2GO_GUARDIAN_WARMUP_PERIOD
+from defaults import X2GO_GUARDIAN_TRANSITION_PERIOD as _X2GO_GUARDIAN_TRANSITION_PERIOD
+from defaults import X2GO_GUARDIAN_JITTER as _X2GO_GUARDIAN_JITTER
+from defaults import X2GO_GUARDIAN_HOUSEKEEPING_INTERVAL as _X2GO_GUARDIAN_HOUSEKEEPING_INTERVAL
 
 class X2GoSessionGuardian(threading.Thread):
     """\
@@ -43,9 +52,13 @@ class X2GoSessionGuardian(threading.Thread):
     There is one L{X2GoSessionGuardian} for each L{X2GoClient} instance (thus: for normal
     setups there should be _one_ L{X2GoClient} and _one_ L{X2GoSessionGuardian} in use).
 
+    Session list cache and session registry refreshes are scheduled per connected session
+    profile. Each profile's refresh interval adapts to its state: short while sessions are in
+    transition (see L{X2GoSessionGuardian.trigger_refresh()}), medium right after the profile
+    has been connected and C{refresh_interval} when idle. A random jitter spreads the refreshes
+    of several profiles over time.
+
     """
-    seconds = 0
-    
     def __init__(self, client_instance, 
                  auto_update_listsessions_cache=False, 
                  auto_update_listdesktops_cache=False, 
@@ -93,43 +106,211 @@ class X2GoSessionGuardian(threading.Thread):
         self.no_auto_reg_pubapp_sessions = no_auto_reg_pubapp_sessions
         self.refresh_interval = refresh_interval
 
+        self._jobs = []
+        self._due = {}
+        self._connected_since = {}
+        self._transition_until = {}
+        self._jobs_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = time.time()
+
         threading.Thread.__init__(self, target=self.guardian)
         self.daemon = True
         self.start()
 
+    def _schedule(self, profile_name, due):
+        """\
+        Schedule the refresh job of a session profile. If the profile already has a pending
+        refresh job that is due earlier, the pending job is kept.
+
+        @param profile_name: the session profile to refresh
+        @type profile_name: C{str}
+        @param due: time (as returned by C{time.time()}) the refresh is due at
+        @type due: C{float}
+
+        """
+        self._jobs_lock.acquire()
+        try:
+            if self._due.has_key(profile_name) and self._due[profile_name] <= due:
+                return
+            self._due[profile_name] = due
+            heapq.heappush(self._jobs, (due, profile_name))
+        finally:
+            self._jobs_lock.release()
+
+    def _pop_due_jobs(self, now):
+        """\
+        Take all refresh jobs that are due from the job queue.
+
+        @param now: the current time
+        @type now: C{float}
+
+        @return: names of the session profiles to refresh
+        @rtype: C{list}
+
+        """
+        _profile_names = []
+        self._jobs_lock.acquire()
+        try:
+            while self._jobs and self._jobs[0][0] <= now:
+                (due, profile_name) = heapq.heappop(self._jobs)
+                # skip jobs that have been superseded by an earlier one
+                if self._due.get(profile_name) == due:
+                    del self._due[profile_name]
+                    _profile_names.append(profile_name)
+        finally:
+            self._jobs_lock.release()
+        return _profile_names
+
+    def _next_due(self):
+        """\
+        Retrieve the time the next refresh job is due at.
+
+        @return: time of the next refresh job, C{None} if there is none
+        @rtype: C{float}
+
+        """
+        self._jobs_lock.acquire()
+        try:
+            while self._jobs and self._due.get(self._jobs[0][1]) != self._jobs[0][0]:
+                heapq.heappop(self._jobs)
+            if self._jobs:
+                return self._jobs[0][0]
+        finally:
+            self._jobs_lock.release()
+
+    def _has_session_changes(self, profile_name):
+        """\
+        Check if the most recent session list update of a session profile has detected changes.
+
+        """
+        _cache = getattr(self.client_instance, 'listsessions_cache', None)
+        if _cache is not None:
+            _changes = _cache.get_changes(profile_name)
+            if _changes:
+                return bool(_changes['added'] or _changes['removed'] or _changes['changed'])
+        return False
+
+    def _next_interval(self, profile_name, now):
+        """\
+        Calculate the (jittered) refresh interval of a session profile.
+
+        @param profile_name: the session profile name
+        @type profile_name: C{str}
+        @param now: the current time
+        @type now: C{float}
+
+        @return: seconds till the session profile's next refresh
+        @rtype: C{float}
+
+        """
+        if now < self._transition_until.get(profile_name, 0) or self._has_session_changes(profile_name):
+            _interval = _X2GO_GUARDIAN_FAST_REFRESH_INTERVAL
+        elif now - self._connected_since.get(profile_name, now) < _X2GO_GUARDIAN_WARMUP_PERIOD:
+            _interval = _X2GO_GUARDIAN_WARMUP_REFRESH_INTERVAL
+        else:
+            _interval = self.refresh_interval
+        return _interval * (1 + random.uniform(-_X2GO_GUARDIAN_JITTER, _X2GO_GUARDIAN_JITTER))
+
+    def _sync_profiles(self, now):
+        """\
+        Schedule refresh jobs for newly connected session profiles and forget
+        about disconnected session profiles.
+
+        @param now: the current time
+        @type now: C{float}
+
+        """
+        _connected_profiles = self.client_instance.client_connected_profiles(return_profile_names=True)
+        for profile_name in _connected_profiles:
+            if not self._connected_since.has_key(profile_name):
+                self._connected_since[profile_name] = now
+                self._schedule(profile_name, now + _X2GO_GUARDIAN_WARMUP_REFRESH_INTERVAL)
+
+        _disconnected_profiles = [ p for p in self._connected_since.keys() if p not in _connected_profiles ]
+        for profile_name in _disconnected_profiles:
+            del self._connected_since[profile_name]
+            self._transition_until.pop(profile_name, None)
+            self._jobs_lock.acquire()
+            self._due.pop(profile_name, None)
+            self._jobs_lock.release()
+
+        _cache = getattr(self.client_instance, 'listsessions_cache', None)
+        if _disconnected_profiles and _cache is not None:
+            _cache.check_cache()
+
+    def _refresh_profile(self, profile_name):
+        """\
+        Refresh session list cache and session registry of a session profile.
+
+        @param profile_name: the session profile name
+        @type profile_name: C{str}
+
+        """
+        self.logger('refreshing session profile %s' % profile_name, loglevel=log.loglevel_DEBUG)
+        try:
+            if self.auto_update_listsessions_cache:
+                self.client_instance.update_cache_by_profile_name(profile_name,
+                                                                  update_sessions=self.auto_update_listsessions_cache, 
+                                                                  update_desktops=self.auto_update_listdesktops_cache,
+                                                                  update_mounts=self.auto_update_listmounts_cache,
+                                                                 )
+
+            if self.auto_update_sessionregistry and not self.auto_register_sessions:
+                self.client_instance.update_sessionregistry_status_by_profile_name(profile_name)
+
+            # session auto-registration will automatically trigger an update of the session registry status
+            if self.auto_register_sessions:
+                self.client_instance.register_available_server_sessions_by_profile_name(profile_name, skip_pubapp_sessions=self.no_auto_reg_pubapp_sessions)
+
+        except x2go_exceptions.X2GoSessionRegistryException:
+            pass
+        except x2go_exceptions.X2GoControlSessionException, e:
+            # the client has already disconnected the session profile
+            self.logger('refreshing session profile %s failed: %s' % (profile_name, str(e)), loglevel=log.loglevel_WARN)
+
+    def trigger_refresh(self, profile_name):
+        """\
+        Request an immediate refresh of a session profile, e.g. after a session
+        has been started, resumed, suspended or terminated. For a while after the trigger,
+        the session profile is refreshed with the fast refresh interval.
+
+        @param profile_name: the session profile name
+        @type profile_name: C{str}
+
+        """
+        now = time.time()
+        self._transition_until[profile_name] = now + _X2GO_GUARDIAN_TRANSITION_PERIOD
+        self._schedule(profile_name, now)
+        self._wakeup.set()
+
     def guardian(self):
         """\
         The handler of this L{X2GoSessionGuardian} thread.
 
         """
-        #seconds = 0
         self._keepalive = True
         while self._keepalive:
-            gevent.sleep(1)
-            X2GoSessionGuardian.seconds += 1
-            small_refresh   = X2GoSessionGuardian.seconds<61 and X2GoSessionGuardian.seconds % 15 == 0
-            big_refresh     = X2GoSessionGuardian.seconds>60 and X2GoSessionGuardian.seconds % self.refresh_interval == 0
-            #if seconds % self.refresh_interval == 0:
-            if small_refresh or big_refresh:
-                self.logger('Entering X2Go Guardian client management loop...', loglevel=log.loglevel_DEBUG)
-
-                if self.auto_update_listsessions_cache:
-                    self.logger('====>>>update_cache_all_profiles', loglevel=log.loglevel_DEBUG)
-                    self.client_instance.update_cache_all_profiles(update_sessions=self.auto_update_listsessions_cache, 
-                                                                   update_desktops=self.auto_update_listdesktops_cache,
-                                                                   update_mounts=self.auto_update_listmounts_cache,
-                                                                  )
-
-                if self.auto_update_sessionregistry and not self.auto_register_sessions:
-                    self.logger('====>>>update_sessionregistry_status_all_profiles', loglevel=log.loglevel_DEBUG)
-                    self.client_instance.update_sessionregistry_status_all_profiles()
-
-                # session auto-registration will automatically trigger an update of the session registry status
-                if self.auto_register_sessions:
-                    self.logger('====>>>register_available_server_sessions_all_profiles', loglevel=log.loglevel_DEBUG)
-                    self.client_instance.register_available_server_sessions_all_profiles(skip_pubapp_sessions=self.no_auto_reg_pubapp_sessions)
-
-        self.logger('X2Go session guardian thread waking up after %s seconds' % X2GoSessionGuardian.seconds, loglevel=log.loglevel_DEBUG)
+
+            now = time.time()
+            self._sync_profiles(now)
+
+            for profile_name in self._pop_due_jobs(now):
+                if not self._keepalive:
+                    break
+                self._refresh_profile(profile_name)
+                if self._connected_since.has_key(profile_name):
+                    now = time.time()
+                    self._schedule(profile_name, now + self._next_interval(profile_name, now))
+
+            _next_due = self._next_due()
+            _timeout = _X2GO_GUARDIAN_HOUSEKEEPING_INTERVAL
+            if _next_due is not None:
+                _timeout = min(max(_next_due - time.time(), 0), _timeout)
+            self._wakeup.wait(_timeout)
+            self._wakeup.clear()
+
+        self.logger('X2Go session guardian thread waking up after %s seconds' % int(time.time() - self._started), loglevel=log.loglevel_DEBUG)
 
         for session_uuid in self.client_instance.session_registry.keys():
             session_summary = self.client_instance.get_session_summary(session_uuid)
@@ -142,5 +323,6 @@ class X2GoSessionGuardian(threading.Thread):
 
         """
         self._keepalive = False
+        self._wakeup.set()
 
 
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoJobExecutor} processes incoming print and MIME box jobs with a bounded
+number of worker threads.
+
+Print and MIME box actions hand over files to external applications (PDF viewers,
+C{lpr}, C{xdg-open}, etc.). Such files get removed in the background once the
+external application has terminated (see L{remove_when_done()}), so no worker is
+blocked while an external application is running.
+
+"""
+__NAME__ = 'x2gojobexecutor-pylib'
+
+# modules
+import os
+import copy
+import time
+import threading
+import Queue
+import gevent
+
+# Python X2Go modules
+import log
+
+from defaults import X2GO_JOB_EXECUTOR_MAX_WORKERS as _X2GO_JOB_EXECUTOR_MAX_WORKERS
+from defaults import X2GO_JOB_PROCESS_POLL_INTERVAL as _X2GO_JOB_PROCESS_POLL_INTERVAL
+
+# number of attempts for removing a file that is still locked by another application (Windows)
+_FILE_REMOVAL_ATTEMPTS = 12
+_FILE_REMOVAL_RETRY_DELAY = 5
+
+
+class X2GoJob(object):
+    """\
+    A job that has been submitted to an L{X2GoJobExecutor}.
+
+    """
+    def __init__(self, name, target, kwargs):
+        """\
+        @param name: job name (used for logging)
+        @type name: C{str}
+        @param target: the function that processes the job
+        @type target: C{func}
+        @param kwargs: keyword arguments for the C{target} function
+        @type kwargs: C{dict}
+
+        """
+        self.name = name
+        self.target = target
+        self.kwargs = kwargs
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.exception = None
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return '<X2GoJob %s>' % self.name
+
+    @property
+    def wait_time(self):
+        """\
+        Time (in seconds) the job has been (or still is) waiting in the executor's queue.
+
+        """
+        return (self.started or time.time()) - self.submitted
+
+    @property
+    def run_time(self):
+        """\
+        Time (in seconds) the job has been (or still is) processed, C{None} if the job has not been started yet.
+
+        """
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def is_alive(self):
+        """\
+        Check if the job is still queued or being processed.
+
+        @return: C{True} if the job has not finished yet
+        @rtype: C{bool}
+
+        """
+        return not self._done.is_set()
+
+    def join(self, timeout=None):
+        """\
+        Wait for the job to finish.
+
+        @param timeout: maximum time (in seconds) to wait
+        @type timeout: C{float}
+
+        """
+        self._done.wait(timeout)
+
+
+class X2GoJobExecutor(object):
+    """\
+    Run submitted jobs in a bounded number of worker threads. Worker threads are
+    started on demand, jobs that exceed the worker limit wait in a FIFO queue.
+
+    """
+    def __init__(self, max_workers=_X2GO_JOB_EXECUTOR_MAX_WORKERS, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param max_workers: maximum number of concurrently processed jobs
+        @type max_workers: C{int}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoJobExecutor} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.max_workers = max(1, max_workers)
+
+        self._queue = Queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._idle_workers = 0
+        self._active_jobs = 0
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait_time = 0.0
+        self._total_run_time = 0.0
+        self._max_queue_depth = 0
+
+    @property
+    def queue_depth(self):
+        """\
+        Number of jobs that wait for a free worker.
+
+        """
+        return self._queue.qsize()
+
+    def submit(self, target, name=None, **kwargs):
+        """\
+        Queue a job for processing.
+
+        @param target: the function that processes the job
+        @type target: C{func}
+        @param name: job name (used for logging)
+        @type name: C{str}
+        @param kwargs: keyword arguments for the C{target} function
+        @type kwargs: C{dict}
+
+        @return: the queued job
+        @rtype: L{X2GoJob}
+
+        """
+        job = X2GoJob(name or target.__name__, target, kwargs)
+        self._lock.acquire()
+        try:
+            self._submitted += 1
+            self._queue.put(job)
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+            if self._queue.qsize() > self._idle_workers and len(self._workers) < self.max_workers:
+                _worker = threading.Thread(target=self._worker, name='X2GoJobExecutor-%s' % len(self._workers))
+                _worker.daemon = True
+                self._workers.append(_worker)
+                self._idle_workers += 1
+                _worker.start()
+        finally:
+            self._lock.release()
+        self.logger('queued job %s (queue depth: %s)' % (job.name, self.queue_depth), loglevel=log.loglevel_DEBUG)
+        return job
+
+    def _worker(self):
+        """\
+        Worker thread: process queued jobs forever.
+
+        """
+        while True:
+            job = self._queue.get()
+            self._lock.acquire()
+            self._idle_workers -= 1
+            self._active_jobs += 1
+            self._lock.release()
+
+            job.started = time.time()
+            try:
+                job.target(**job.kwargs)
+            except Exception, e:
+                job.exception = e
+                self.logger('job %s failed: %s' % (job.name, str(e)), loglevel=log.loglevel_ERROR)
+            job.finished = time.time()
+
+            self._lock.acquire()
+            self._idle_workers += 1
+            self._active_jobs -= 1
+            if job.exception is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._total_wait_time += job.wait_time
+            self._total_run_time += job.run_time
+            self._lock.release()
+
+            job._done.set()
+            self.logger('job %s finished after %.2fs (waited %.2fs in queue)' % (job.name, job.run_time, job.wait_time), loglevel=log.loglevel_DEBUG)
+
+    def get_stats(self):
+        """\
+        Retrieve job processing statistics.
+
+        @return: dictionary with the keys C{submitted}, C{completed}, C{failed}, C{active},
+            C{queue_depth}, C{max_queue_depth}, C{workers}, C{avg_wait_time} and C{avg_run_time}
+        @rtype: C{dict}
+
+        """
+        self._lock.acquire()
+        try:
+            _finished = self._completed + self._failed
+            return {
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'active': self._active_jobs,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'workers': len(self._workers),
+                'avg_wait_time': _finished and self._total_wait_time / _finished or 0.0,
+                'avg_run_time': _finished and self._total_run_time / _finished or 0.0,
+            }
+        finally:
+            self._lock.release()
+
+
+_job_executor = None
+
+def get_job_executor():
+    """\
+    Retrieve the job executor that is shared by all print and MIME box queues.
+
+    @return: the shared job executor
+    @rtype: L{X2GoJobExecutor}
+
+    """
+    global _job_executor
+    if _job_executor is None:
+        _job_executor = X2GoJobExecutor()
+    return _job_executor
+
+
+def start_process(popen, cmd_line, **kwargs):
+    """\
+    Start an external application whose output is discarded.
+
+    The application's output must not go to a pipe: nobody reads from it while
+    L{remove_when_done()} waits for the application, so a chatty application (e.g. a
+    PDF viewer that logs toolkit warnings) would block once the pipe is full.
+
+    @param popen: the C{Popen} class to use (C{subprocess.Popen} or its gevent counterpart)
+    @type popen: C{class}
+    @param cmd_line: the command line
+    @type cmd_line: C{list}
+    @param kwargs: further keyword arguments for C{popen}
+    @type kwargs: C{dict}
+
+    @return: the started process
+    @rtype: C{subprocess.Popen}
+
+    """
+    _devnull = open(os.devnull, 'w')
+    try:
+        return popen(cmd_line, stdout=_devnull, stderr=_devnull, **kwargs)
+    finally:
+        # the application has its own copy of the file descriptor
+        _devnull.close()
+
+
+def wait_for_process(process, min_lifetime=0, timeout=None, poll_interval=_X2GO_JOB_PROCESS_POLL_INTERVAL):
+    """\
+    Wait (cooperatively) for a subprocess to terminate.
+
+    Launcher commands (like C{xdg-open}) may hand over a file to another application
+    and exit immediately. With C{min_lifetime} the caller can make sure that such an
+    application gets some time to open the file.
+
+    @param process: a C{subprocess.Popen} instance, or C{None} if there is no process to wait for
+    @type process: C{obj}
+    @param min_lifetime: minimum time (in seconds, counted from now) to wait, even if the process
+        terminates earlier
+    @type min_lifetime: C{float}
+    @param timeout: maximum time (in seconds) to wait for the process, C{None} means: wait forever
+    @type timeout: C{float}
+    @param poll_interval: interval (in seconds) for checking the process state
+    @type poll_interval: C{float}
+
+    @return: the process's exit code or C{None} if the process is still running (or there is no process)
+    @rtype: C{int}
+
+    """
+    _start = time.time()
+    _returncode = None
+    if process is not None:
+        _returncode = process.poll()
+        while _returncode is None and (timeout is None or time.time() - _start < timeout):
+            gevent.sleep(poll_interval)
+            _returncode = process.poll()
+    _remaining = min_lifetime - (time.time() - _start)
+    if _remaining > 0:
+        gevent.sleep(_remaining)
+    return _returncode
+
+
+def _remove_file(filename, logger):
+    for _attempt in range(_FILE_REMOVAL_ATTEMPTS):
+        try:
+            os.remove(filename)
+            logger('removed file %s' % filename, loglevel=log.loglevel_DEBUG)
+            return
+        except OSError:
+            if not os.path.exists(filename):
+                return
+        # the file is still locked by another application
+        gevent.sleep(_FILE_REMOVAL_RETRY_DELAY)
+    logger('giving up on removing file %s' % filename, loglevel=log.loglevel_WARN)
+
+
+def remove_when_done(filename, process=None, min_lifetime=0, logger=None):
+    """\
+    Remove a file in the background once the given process has terminated.
+
+    @param filename: full path of the file to remove
+    @type filename: C{str}
+    @param process: a C{subprocess.Popen} instance that uses the file (or C{None})
+    @type process: C{obj}
+    @param min_lifetime: minimum time (in seconds) to keep the file (see L{wait_for_process()})
+    @type min_lifetime: C{float}
+    @param logger: an L{X2GoLogger} instance
+    @type logger: C{obj}
+
+    @return: the greenlet that removes the file
+    @rtype: C{gevent.Greenlet}
+
+    """
+    if logger is None:
+        logger = log.X2GoLogger()
+
+    def _remove():
+        wait_for_process(process, min_lifetime=min_lifetime)
+        _remove_file(filename, logger)
+
+    return gevent.spawn(_remove)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoLivenessMonitor} watches the SSH connection of a control session.
+
+The connection gets probed at a fixed interval with C{keepalive@openssh.com}
+global requests (see L{netmonitor.ssh_round_trip()}), no exec channels are opened
+on the server. A probe that is not answered within a timeout counts as missed.
+After a number of consecutive missed probes (or once the SSH transport has gone
+inactive) the connection is considered dead and a callback gets notified. The
+round trip times of answered probes are kept in an L{netmonitor.X2GoRingBuffer}.
+
+"""
+__NAME__ = 'x2goliveness-pylib'
+
+# modules
+import copy
+import time
+import threading
+
+# Python X2Go modules
+import log
+import netmonitor
+
+from defaults import X2GO_LIVENESS_INTERVAL as _X2GO_LIVENESS_INTERVAL
+from defaults import X2GO_LIVENESS_TIMEOUT as _X2GO_LIVENESS_TIMEOUT
+from defaults import X2GO_LIVENESS_MAX_MISSED as _X2GO_LIVENESS_MAX_MISSED
+from defaults import X2GO_LIVENESS_WINDOW as _X2GO_LIVENESS_WINDOW
+
+
+class X2GoLivenessMonitor(threading.Thread):
+    """\
+    Probe an SSH connection at a fixed interval and detect dead links.
+
+    """
+    def __init__(self, transport, interval=_X2GO_LIVENESS_INTERVAL, timeout=_X2GO_LIVENESS_TIMEOUT,
+                 max_missed=_X2GO_LIVENESS_MAX_MISSED, window=_X2GO_LIVENESS_WINDOW,
+                 on_death=None, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param transport: the SSH transport to watch
+        @type transport: C{paramiko.Transport} instance
+        @param interval: probing interval (in seconds)
+        @type interval: C{float}
+        @param timeout: maximum time (in seconds) to wait for the server's reply to a probe
+        @type timeout: C{float}
+        @param max_missed: number of consecutive missed probes after which the connection is considered dead
+        @type max_missed: C{int}
+        @param window: number of round trip times that get kept
+        @type window: C{int}
+        @param on_death: a function (without arguments) that gets called once the connection is considered dead
+        @type on_death: C{func}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoLivenessMonitor} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.transport = transport
+        self.interval = interval
+        self.timeout = timeout
+        self.max_missed = max(1, max_missed)
+        self.on_death = on_death
+
+        self.rtt = netmonitor.X2GoRingBuffer(window)
+        self.probes = 0
+        self.missed = 0
+        self.total_missed = 0
+        self.last_reply = None
+        self.dead = False
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def stop_thread(self):
+        """\
+        Stop probing. The C{on_death} callback does not get called anymore.
+
+        """
+        self._stopped.set()
+
+    def probe(self):
+        """\
+        Send one probe and account for its outcome.
+
+        @return: the round trip time (in seconds), C{None} if the probe has been missed
+        @rtype: C{float}
+
+        """
+        try:
+            _rtt = netmonitor.ssh_round_trip(self.transport, timeout=self.timeout)
+        except Exception, e:
+            self.logger('liveness probe failed: %s' % str(e), loglevel=log.loglevel_DEBUG)
+            _rtt = None
+
+        self._lock.acquire()
+        try:
+            self.probes += 1
+            if _rtt is None:
+                self.missed += 1
+                self.total_missed += 1
+                if self.missed >= self.max_missed or self.transport is None or not self.transport.is_active():
+                    self.dead = True
+            else:
+                self.missed = 0
+                self.last_reply = time.time()
+                self.rtt.append(_rtt)
+        finally:
+            self._lock.release()
+
+        if _rtt is None and not self.dead:
+            self.logger('liveness probe not answered within %ss (%s of %s)' % (self.timeout, self.missed, self.max_missed), loglevel=log.loglevel_NOTICE)
+        return _rtt
+
+    def is_link_alive(self):
+        """\
+        Check if the SSH connection is considered alive. This does not send a probe.
+
+        @return: C{False} if too many consecutive probes have been missed or the SSH transport is not active
+        @rtype: C{bool}
+
+        """
+        return not self.dead and self.transport is not None and self.transport.is_active()
+
+    def get_stats(self):
+        """\
+        Retrieve the liveness statistics.
+
+        @return: dictionary with the keys C{alive}, C{probes}, C{missed} (consecutive), C{total_missed},
+            C{interval}, C{last_reply} (seconds since the last answered probe, C{None} if none has been
+            answered) and C{rtt} (in seconds, see L{netmonitor.X2GoRingBuffer.summary()})
+        @rtype: C{dict}
+
+        """
+        self._lock.acquire()
+        try:
+            return {
+                'alive': self.is_link_alive(),
+                'probes': self.probes,
+                'missed': self.missed,
+                'total_missed': self.total_missed,
+                'interval': self.interval,
+                'last_reply': self.last_reply is not None and time.time() - self.last_reply or None,
+                'rtt': self.rtt.summary(),
+            }
+        finally:
+            self._lock.release()
+
+    def run(self):
+        """\
+        The probing loop. It gets run once the L{X2GoLivenessMonitor} has been started
+        with its C{start()} method.
+
+        """
+        self.logger('probing SSH connection every %ss (timeout %ss, %s missed probes are fatal)' % (self.interval, self.timeout, self.max_missed), loglevel=log.loglevel_DEBUG)
+        while not self._stopped.is_set():
+            _start = time.time()
+            self.probe()
+            if self._stopped.is_set():
+                break
+            if not self.is_link_alive():
+                self.dead = True
+                self.logger('SSH connection is dead (%s consecutive probes missed)' % self.missed, loglevel=log.loglevel_WARN)
+                if self.on_death is not None:
+                    self.on_death()
+                break
+            self._stopped.wait(max(self.interval - (time.time() - _start), 0))
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoLoadBalancerClient} queries the RapidApp load balancer for the server node
+a user's session has to be started on.
+
+Requests have explicit connect and read timeouts. A request that is slow to answer
+gets hedged by a second request (the first answer wins). While the load balancer
+reports that the user's session is being migrated, it is polled again with
+exponential backoff. Queries can be started in the background (e.g. while the user
+is still typing the password), see L{X2GoLoadBalancerClient.prefetch()}.
+
+"""
+__NAME__ = 'x2goloadbalancer-pylib'
+
+# modules
+import copy
+import time
+import urllib
+import urlparse
+import httplib
+import gevent
+import gevent.event
+from gevent import socket
+
+# Python X2Go modules
+import log
+
+from defaults import X2GO_LB_URL as _X2GO_LB_URL
+from defaults import X2GO_LB_CONNECT_TIMEOUT as _X2GO_LB_CONNECT_TIMEOUT
+from defaults import X2GO_LB_READ_TIMEOUT as _X2GO_LB_READ_TIMEOUT
+from defaults import X2GO_LB_HEDGE_DELAY as _X2GO_LB_HEDGE_DELAY
+from defaults import X2GO_LB_MIGRATION_MAX_WAIT as _X2GO_LB_MIGRATION_MAX_WAIT
+from defaults import X2GO_LB_BACKOFF_INITIAL as _X2GO_LB_BACKOFF_INITIAL
+from defaults import X2GO_LB_BACKOFF_MAX as _X2GO_LB_BACKOFF_MAX
+from defaults import X2GO_LB_PREFETCH_MAX_AGE as _X2GO_LB_PREFETCH_MAX_AGE
+
+# load balancer answers that are no server node
+LB_MIGRATING = '-1'
+LB_OVERLOADED = '-99'
+LB_UNKNOWN_ERROR = '-1000'
+
+
+class X2GoLoadBalancerClient(object):
+    """\
+    Client for the RapidApp load balancer.
+
+    Errors are reported as C{ValueError}s with a message that can be presented to the user.
+
+    """
+    def __init__(self, url=_X2GO_LB_URL,
+                 connect_timeout=_X2GO_LB_CONNECT_TIMEOUT,
+                 read_timeout=_X2GO_LB_READ_TIMEOUT,
+                 hedge_delay=_X2GO_LB_HEDGE_DELAY,
+                 migration_max_wait=_X2GO_LB_MIGRATION_MAX_WAIT,
+                 logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param url: URL of the load balancer script
+        @type url: C{str}
+        @param connect_timeout: timeout (in seconds) for connecting to the load balancer
+        @type connect_timeout: C{float}
+        @param read_timeout: timeout (in seconds) for waiting for the load balancer's answer
+        @type read_timeout: C{float}
+        @param hedge_delay: send a second request if the first one has not been answered
+            after this many seconds, C{None} disables hedged requests
+        @type hedge_delay: C{float}
+        @param migration_max_wait: maximum time (in seconds) to wait for a session migration to finish
+        @type migration_max_wait: C{float}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoLoadBalancerClient} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.hedge_delay = hedge_delay
+        self.migration_max_wait = migration_max_wait
+
+        # (username, greenlet, time of completion) of the latest background query
+        self._prefetched = None
+
+    def _request(self, username):
+        """\
+        Send a single request to the load balancer.
+
+        @param username: the user to query the server node for
+        @type username: C{str}
+
+        @return: the load balancer's answer
+        @rtype: C{str}
+
+        @raise ValueError: if the load balancer cannot be reached or answers with an HTTP error
+
+        """
+        _url = urlparse.urlsplit(self.url)
+        _query = _url.query and '%s&' % _url.query or ''
+        _path = '%s?%suid=%s' % (_url.path or '/', _query, urllib.quote(username or ''))
+        if _url.scheme == 'https':
+            conn = httplib.HTTPSConnection(_url.hostname, _url.port, timeout=self.connect_timeout)
+        else:
+            conn = httplib.HTTPConnection(_url.hostname, _url.port, timeout=self.connect_timeout)
+        try:
+            try:
+                conn.connect()
+                conn.sock.settimeout(self.read_timeout)
+                conn.request('GET', _path)
+                response = conn.getresponse()
+                answer = response.read().strip()
+            except (socket.error, socket.timeout, socket.gaierror, httplib.HTTPException), e:
+                self.logger('load balancer request failed: %s' % str(e), loglevel=log.loglevel_WARN)
+                raise ValueError('Unable to connect to loadbalancer. Is your network connection working?')
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise ValueError('Unknown loadbalancer error (HTTP %d). Please try after a few minutes' % response.status)
+        return answer
+
+    def _hedged_request(self, username):
+        """\
+        Send a request to the load balancer, hedge it with a second request if the
+        first one is slow to answer. The first successful answer wins.
+
+        @param username: the user to query the server node for
+        @type username: C{str}
+
+        @return: the load balancer's answer
+        @rtype: C{str}
+
+        @raise ValueError: if none of the requests succeeded
+
+        """
+        _answer = gevent.event.AsyncResult()
+        _requests = []
+
+        def _send():
+            try:
+                _result = self._request(username)
+            except ValueError, e:
+                # only the last failing request reports its error
+                if len([ r for r in _requests if not r.ready() ]) <= 1 and not _answer.ready():
+                    _answer.set_exception(e)
+                return
+            if not _answer.ready():
+                _answer.set(_result)
+
+        _requests.append(gevent.spawn(_send))
+        try:
+            if self.hedge_delay is not None:
+                try:
+                    return _answer.get(timeout=self.hedge_delay)
+                except gevent.Timeout:
+                    self.logger('load balancer is slow to answer, sending a hedged request', loglevel=log.loglevel_INFO)
+                    _requests.append(gevent.spawn(_send))
+            return _answer.get()
+        finally:
+            gevent.killall(_requests, block=False)
+
+    def query(self, username):
+        """\
+        Query the load balancer for the server node of a user. While the user's session
+        is being migrated, the load balancer gets polled with exponential backoff.
+
+        @param username: the user to query the server node for
+        @type username: C{str}
+
+        @return: the server node (IP address or host name)
+        @rtype: C{str}
+
+        @raise ValueError: with a user-presentable message if no server node can be assigned
+
+        """
+        _start = time.time()
+        _backoff = _X2GO_LB_BACKOFF_INITIAL
+        while True:
+            node = self._hedged_request(username)
+            if node != LB_MIGRATING:
+                break
+            _waited = time.time() - _start
+            if _waited + _backoff > self.migration_max_wait:
+                raise ValueError('Your session is being optimized. Please try after a few seconds')
+            self.logger('session of user %s is being migrated, asking the load balancer again in %ss' % (username, _backoff), loglevel=log.loglevel_NOTICE)
+            gevent.sleep(_backoff)
+            _backoff = min(_backoff * 2, _X2GO_LB_BACKOFF_MAX)
+
+        if node == LB_OVERLOADED:
+            raise ValueError('All servers are overloaded. Please try after a few minutes')
+        if node == LB_UNKNOWN_ERROR:
+            raise ValueError('Unknown loadbalancer error (-1000). Please try after a few minutes')
+        self.logger('load balancer assigned node %s to user %s (after %.2fs)' % (node, username, time.time() - _start), loglevel=log.loglevel_INFO)
+        return node
+
+    def prefetch(self, username):
+        """\
+        Start querying the load balancer for the server node of a user in the background.
+        A later call of L{get_node()} for the same user picks up the result.
+
+        @param username: the user to query the server node for
+        @type username: C{str}
+
+        """
+        if not username:
+            return
+        if self._prefetched is not None and self._prefetched[0] == username and self._is_fresh(self._prefetched):
+            return
+        self.logger('querying load balancer for user %s in the background' % username, loglevel=log.loglevel_DEBUG)
+        _prefetched = [username, None, None]
+        def _query():
+            try:
+                node = self.query(username)
+            except ValueError, e:
+                self.logger('background query of the load balancer failed: %s' % str(e), loglevel=log.loglevel_INFO)
+                node = None
+            _prefetched[2] = time.time()
+            return node
+        _prefetched[1] = gevent.spawn(_query)
+        self._prefetched = _prefetched
+
+    def _is_fresh(self, prefetched):
+        (username, greenlet, finished) = prefetched
+        if finished is None:
+            return True
+        return greenlet.value is not None and time.time() - finished <= _X2GO_LB_PREFETCH_MAX_AGE
+
+    def get_node(self, username):
+        """\
+        Retrieve the server node of a user, reusing a fresh background query
+        (see L{prefetch()}) if there is one.
+
+        @param username: the user to query the server node for
+        @type username: C{str}
+
+        @return: the server node (IP address or host name)
+        @rtype: C{str}
+
+        @raise ValueError: with a user-presentable message if no server node can be assigned
+
+        """
+        _prefetched = self._prefetched
+        self._prefetched = None
+        if _prefetched is not None and _prefetched[0] == username and self._is_fresh(_prefetched):
+            node = _prefetched[1].get()
+            if node is not None:
+                return node
+            # the background query failed, ask again
+        return self.query(username)
@@ -21,9 +21,9 @@
 L{X2GoMIMEboxQueue} sets up a thread that listens for incoming files that
 shall be opened locally on the client.
 
-For each file that gets dropped in the MIME box an individual 
-thread is started (L{X2GoMIMEboxJob}) that handles the processing 
-of the incoming file.
+Each file that gets dropped in the MIME box is handed over to the shared
+L{X2GoJobExecutor} that processes the incoming file with a bounded number
+of worker threads.
 
 """
 __NAME__ = 'x2gomimeboxqueue-pylib'
@@ -40,6 +40,8 @@ import defaults
 import utils
 import log
 import mimeboxactions
+import spoolwatch
+import jobexecutor
 
 
 class X2GoMIMEboxQueue(threading.Thread):
@@ -101,6 +103,9 @@ class X2GoMIMEboxQueue(threading.Thread):
             # hope it's already an instance...
             self.mimebox_action = mimebox_action
 
+        self._spool_watcher = spoolwatch.X2GoSpoolWatcher(self.mimebox_dir, logger=self.logger)
+        self._job_executor = jobexecutor.get_job_executor()
+
         threading.Thread.__init__(self)
         self.daemon = True
         self._accept_jobs = True
@@ -142,18 +147,19 @@ class X2GoMIMEboxQueue(threading.Thread):
         self._keepalive = False
         self.logger('stopping thread: %s' % repr(self), loglevel=log.loglevel_DEBUG)
 
-    @property
-    def _incoming_mimebox_jobs(self):
-        if os.path.exists(self.mimebox_dir):
-            l = os.listdir(self.mimebox_dir)
-            mimebox_jobs = []
-            for _ext in self.mimebox_extensions:
-                mimebox_jobs.extend([ dj for dj in l if dj.upper().endswith(_ext.upper()) ])
-            else:
-                mimebox_jobs = l
-            return [ dj for dj in mimebox_jobs if dj not in self.active_jobs.keys() ]
-        else:
-            return []
+    def _wait_for_mimebox_jobs(self, timeout=None):
+        """\
+        Wait for new files in the MIME box directory. File extensions get checked by the
+        MIME box job handler.
+
+        @param timeout: maximum time (in seconds) to wait for new files
+        @type timeout: C{float}
+
+        @return: list of new file names
+        @rtype: C{list}
+
+        """
+        return [ dj for dj in self._spool_watcher.wait(timeout=timeout) if dj not in self.active_jobs ]
 
     def set_mimebox_action(self, mimebox_action, **kwargs):
         """\
@@ -185,26 +191,21 @@ class X2GoMIMEboxQueue(threading.Thread):
 
             while self._accept_jobs:
 
-                if self._incoming_mimebox_jobs:
-
-                    for _job in self._incoming_mimebox_jobs:
-                        self.logger('processing incoming X2Go MIME box job: %s' % _job, loglevel=log.loglevel_NOTICE)
-                        _new_mimeboxjob_thread = X2GoMIMEboxJob(target=x2go_mimeboxjob_handler,
-                                                                kwargs={ 
-                                                                  'mimebox_file': _job,
-                                                                  'mimebox_extensions': self.mimebox_extensions,
-                                                                  'mimebox_action': self.mimebox_action,
-                                                                  'parent_thread': self,
-                                                                  'logger': self.logger, 
-                                                                }
-                                                               )
-                        self.active_jobs['%s' % _job] = _new_mimeboxjob_thread
-                        _new_mimeboxjob_thread.start()
-
-                gevent.sleep(3)
+                for _job in self._wait_for_mimebox_jobs(timeout=1):
+                    self.logger('processing incoming X2Go MIME box job: %s' % _job, loglevel=log.loglevel_NOTICE)
+                    self.active_jobs['%s' % _job] = self._job_executor.submit(x2go_mimeboxjob_handler,
+                                                                               name='MIME box job %s' % _job,
+                                                                               mimebox_file=_job,
+                                                                               mimebox_extensions=self.mimebox_extensions,
+                                                                               mimebox_action=self.mimebox_action,
+                                                                               parent_thread=self,
+                                                                               logger=self.logger,
+                                                                              )
 
             gevent.sleep(1)
 
+        self._spool_watcher.close()
+
 
 def x2go_mimeboxjob_handler(mimebox_file=None, 
                             mimebox_extensions=[],
@@ -212,13 +213,17 @@ def x2go_mimeboxjob_handler(mimebox_file=None,
                             parent_thread=None, logger=None, ):
     """\
     This function is called as a handler function for each incoming X2Go MIME box file
-    represented by the class L{X2GoMIMEboxJob}.
+    (processed by the shared L{X2GoJobExecutor}).
+
+    Processed files get removed by the MIME box action (once the application that has
+    been launched for the file does not need it anymore), rejected files get removed
+    immediately.
 
     @param mimebox_file: MIME box file name as placed in to the X2Go MIME box spool directory
     @type mimebox_file: C{str}
     @param mimebox_action: an instance of either of the possible C{X2GoMIMEboxActionXXX} classes
     @type mimebox_action: C{X2GoMIMEboxActionXXX} nstance
-    @param parent_thread: the L{X2GoMIMEboxQueue} thread that actually created this handler's L{X2GoMIMEboxJob} instance
+    @param parent_thread: the L{X2GoMIMEboxQueue} thread that actually submitted this MIME box job
     @type parent_thread: C{obj}
     @param logger: the L{X2GoMIMEboxQueue}'s logging instance
     @type logger: C{obj}
@@ -232,46 +237,27 @@ def x2go_mimeboxjob_handler(mimebox_file=None,
     _dotfile = mimebox_file.startswith('.')
     _blacklisted = mimebox_file.upper().split('.')[-1] in defaults.X2GO_MIMEBOX_EXTENSIONS_BLACKLIST
     _really_process = bool(not _blacklisted  and ((not mimebox_extensions) or [ ext for ext in mimebox_extensions if mimebox_file.upper().endswith('%s' % ext.upper()) ]))
-    if _really_process and not _blacklisted and not _dotfile:
-        mimebox_action.do_process(mimebox_file=mimebox_file,
-                                  mimebox_dir=parent_thread.mimebox_dir,
-                                 )
-    elif not _blacklisted and not _dotfile:
-        logger('file extension of MIME box file %s is prohibited by session profile configuration' % mimebox_file, loglevel=log.loglevel_NOTICE)
-    elif _dotfile:
-        logger('placing files starting with a dot (.<file>) into the X2Go MIME box is prohibited, ignoring the file ,,%s\'\'' % mimebox_file, loglevel=log.loglevel_WARN)
-    else:
-        logger('file extension of MIME box file %s has been found in Python X2Go\' hardcoded MIME box extenstions blacklist' % mimebox_file, loglevel=log.loglevel_WARN)
-
-    logger('removing MIME box file %s' % mimebox_file, loglevel=log.loglevel_DEBUG)
-
-    utils.patiently_remove_file(parent_thread.mimebox_dir, mimebox_file)
-    logger('removed print job file %s' % mimebox_file, loglevel=log.loglevel_DEBUG)
-
-    del parent_thread.active_jobs['%s' % mimebox_file]
+    try:
+        if _really_process and not _blacklisted and not _dotfile:
+            mimebox_action.do_process(mimebox_file=mimebox_file,
+                                      mimebox_dir=parent_thread.mimebox_dir,
+                                     )
+        else:
+            if not _blacklisted and not _dotfile:
+                logger('file extension of MIME box file %s is prohibited by session profile configuration' % mimebox_file, loglevel=log.loglevel_NOTICE)
+            elif _dotfile:
+                logger('placing files starting with a dot (.<file>) into the X2Go MIME box is prohibited, ignoring the file ,,%s\'\'' % mimebox_file, loglevel=log.loglevel_WARN)
+            else:
+                logger('file extension of MIME box file %s has been found in Python X2Go\' hardcoded MIME box extenstions blacklist' % mimebox_file, loglevel=log.loglevel_WARN)
+
+            logger('removing MIME box file %s' % mimebox_file, loglevel=log.loglevel_DEBUG)
+
+            utils.patiently_remove_file(parent_thread.mimebox_dir, mimebox_file)
+            logger('removed MIME box file %s' % mimebox_file, loglevel=log.loglevel_DEBUG)
+    finally:
+        del parent_thread.active_jobs['%s' % mimebox_file]
     parent_thread.mimebox_history.append(mimebox_file)
     # in case we do a lot of mimebox file exports we do not want to risk an
     # endlessly growing mimebox job history
     if len(parent_thread.mimebox_history) > 100:
         parent_thread.mimebox_history = parent_thread.mimebox_history[-100:]
-
-
-class X2GoMIMEboxJob(threading.Thread):
-    """\
-    For each X2Go MIME box job we create a sub-thread that let's 
-    the MIME box job be processed in the background.
-
-    As a handler for this class the function L{x2go_mimeboxjob_handler()} 
-    is used.
-
-    """
-    def __init__(self, **kwargs):
-        """\
-        Construct the X2Go MIME box job thread...
-
-        All parameters (**kwargs) are passed through to the constructor
-        of C{threading.Thread()}.
-
-        """
-        threading.Thread.__init__(self, **kwargs)
-        self.daemon = True
@@ -27,7 +27,6 @@ __NAME__ = 'x2gomimeboxactions-pylib'
 # modules
 import os
 import copy
-import time
 
 from defaults import X2GOCLIENT_OS as _X2GOCLIENT_OS
 if _X2GOCLIENT_OS in ("Windows"):
@@ -41,6 +40,7 @@ else:
 # Python X2Go modules
 import log
 import x2go_exceptions
+import jobexecutor
 
 _MIMEBOX_ENV = os.environ.copy()
 
@@ -50,6 +50,9 @@ class X2GoMIMEboxAction(object):
     __name__ = 'NAME'
     __description__ = 'DESCRIPTION'
 
+    min_file_lifetime = 20
+    """Minimum time (in seconds) a processed MIME box file is kept before it gets removed."""
+
     def __init__(self, client_instance=None, logger=None, loglevel=log.loglevel_DEFAULT):
         """\
         This is a meta class and has no functionality as such. It is used as parent
@@ -102,13 +105,18 @@ class X2GoMIMEboxAction(object):
         @param mimebox_dir: location of the X2Go session's MIME box directory
         @type mimebox_dir: C{str}
 
+        @return: the process that has been launched for the MIME box file (or C{None})
+        @rtype: C{obj}
+
         """
-        pass
+        return None
 
     def do_process(self, mimebox_file, mimebox_dir, ):
         """\
         Wrapper method for the actual processing of MIME
-        box actions.
+        box actions. The MIME box file gets removed in the background once the
+        process launched for it has terminated (but not before C{min_file_lifetime}
+        seconds have passed).
 
         @param mimebox_file: file name as placed in to the X2Go MIME box directory
         @type mimebox_file: C{str}
@@ -119,7 +127,12 @@ class X2GoMIMEboxAction(object):
         mimebox_file = os.path.normpath(mimebox_file)
         mimebox_dir = os.path.normpath(mimebox_dir)
 
-        self._do_process(mimebox_file, mimebox_dir)
+        _process = self._do_process(mimebox_file, mimebox_dir)
+        jobexecutor.remove_when_done(os.path.join(mimebox_dir, mimebox_file),
+                                     process=_process,
+                                     min_lifetime=self.min_file_lifetime,
+                                     logger=self.logger,
+                                    )
 
 
 class X2GoMIMEboxActionOPEN(X2GoMIMEboxAction):
@@ -171,12 +184,10 @@ class X2GoMIMEboxActionOPEN(X2GoMIMEboxAction):
                                                                  )
                 else:
                     self.logger('Encountered WindowsError: %s' % str(win_err), loglevel=log.loglevel_ERROR)
-            time.sleep(20)
         else:
             cmd_line = [ 'xdg-open', os.path.join(mimebox_dir, mimebox_file), ]
             self.logger('opening MIME box file with command: %s' % ' '.join(cmd_line), loglevel=log.loglevel_DEBUG)
-            subprocess.Popen(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_MIMEBOX_ENV)
-            time.sleep(20)
+            return jobexecutor.start_process(subprocess.Popen, cmd_line, env=_MIMEBOX_ENV)
 
 
 class X2GoMIMEboxActionOPENWITH(X2GoMIMEboxAction):
@@ -226,13 +237,11 @@ class X2GoMIMEboxActionOPENWITH(X2GoMIMEboxAction):
                   None,
                   0,
             )
-            time.sleep(20)
         else:
             self.logger('the evocation of the Open-with dialog box is currently not available on Linux, falling back to MIME box action OPEN', loglevel=log.loglevel_WARN)
             cmd_line = [ 'xdg-open', os.path.join(mimebox_dir, mimebox_file), ]
             self.logger('opening MIME box file with command: %s' % ' '.join(cmd_line), loglevel=log.loglevel_DEBUG)
-            subprocess.Popen(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_MIMEBOX_ENV)
-            time.sleep(20)
+            return jobexecutor.start_process(subprocess.Popen, cmd_line, env=_MIMEBOX_ENV)
 
 
 class X2GoMIMEboxActionSAVEAS(X2GoMIMEboxAction):
@@ -246,6 +255,9 @@ class X2GoMIMEboxActionSAVEAS(X2GoMIMEboxAction):
     __name__ = 'SAVEAS'
     __decription__= 'Save incoming file as...'
 
+    # give the user some time to choose a location in the ,,Save as...'' dialog
+    min_file_lifetime = 60
+
     def __init__(self, client_instance=None, logger=None, loglevel=log.loglevel_DEFAULT):
         """\
         @param client_instance: an L{X2GoClient} instance, within your customized L{X2GoClient} make sure 
@@ -283,5 +295,4 @@ class X2GoMIMEboxActionSAVEAS(X2GoMIMEboxAction):
 
         self.logger('Session %s (%s) is calling X2GoClient class hook method <client_instance>.HOOK_open_mimebox_saveas_dialog(%s)' % (self.session_name, self.profile_name, mimebox_file), loglevel=log.loglevel_NOTICE)
         self.client_instance.HOOK_open_mimebox_saveas_dialog(os.path.join(mimebox_dir, mimebox_file), profile_name=self.profile_name, session_name=self.session_name)
-        time.sleep(60)
 
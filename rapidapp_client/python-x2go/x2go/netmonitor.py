@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoNetworkMonitor} continuously samples the network quality of a connected
+X2Go session.
+
+The round trip time is measured on the session's existing SSH transport with
+C{keepalive@openssh.com} global requests (the server answers them with a success
+or failure message, either way one full round trip), no extra connections are
+opened. Concurrent round trips on the same transport get serialized (Paramiko
+tracks only one pending global request per transport); after a round trip has
+timed out, the next one waits until the server's late reply has been discarded.
+If the control session's liveness monitor probes the transport anyway, the network
+quality monitor reports the liveness monitor's round trip times instead of sending
+probes of its own. Tunnel throughput is derived from the byte counters of the session's
+tunnel relays. The latest samples are kept in fixed-size ring buffers
+(L{X2GoRingBuffer}) that rolling percentiles get computed from.
+
+"""
+__NAME__ = 'x2gonetmonitor-pylib'
+
+# modules
+import copy
+import math
+import time
+import threading
+import weakref
+import gevent
+
+# Python X2Go modules
+import log
+
+from defaults import X2GO_NETMONITOR_INTERVAL as _X2GO_NETMONITOR_INTERVAL
+from defaults import X2GO_NETMONITOR_WINDOW as _X2GO_NETMONITOR_WINDOW
+from defaults import X2GO_NETMONITOR_TIMEOUT as _X2GO_NETMONITOR_TIMEOUT
+
+# percentiles reported by the network quality monitor
+_PERCENTILES = (50, 90, 99, )
+
+# one lock per SSH transport, serializes global requests
+_global_request_locks = weakref.WeakKeyDictionary()
+
+
+def _nearest_rank(sorted_samples, percent):
+    _rank = int(math.ceil(percent / 100.0 * len(sorted_samples)))
+    return sorted_samples[min(max(_rank, 1), len(sorted_samples)) - 1]
+
+
+def _discard_late_reply(transport, completion_event, lock):
+    # a reply that arrives after its round trip has timed out would complete the next global
+    # request on this transport, keep the transport locked until the reply is in
+    try:
+        while transport.is_active() and not completion_event.is_set():
+            completion_event.wait(1.0)
+    finally:
+        lock.release()
+
+
+def ssh_round_trip(transport, timeout=None):
+    """\
+    Time one round trip on an SSH transport.
+
+    @param transport: an SSH transport
+    @type transport: C{paramiko.Transport} instance
+    @param timeout: maximum time (in seconds) to wait for the server's reply, C{None} means: wait
+        as long as the transport is active
+    @type timeout: C{float}
+
+    @return: the round trip time (in seconds), C{None} if the transport is not active or the
+        server has not replied in time (this includes a reply to a previous round trip that is
+        still outstanding)
+    @rtype: C{float}
+
+    """
+    if transport is None or not transport.is_active():
+        return None
+    _lock = _global_request_locks.setdefault(transport, threading.Lock())
+    _timer = None
+    if timeout is not None:
+        _timer = gevent.Timeout(timeout)
+        _timer.start()
+    try:
+        try:
+            _lock.acquire()
+        except gevent.Timeout, t:
+            if t is not _timer:
+                raise
+            return None
+        _start = time.time()
+        _pending = transport.completion_event
+        try:
+            # a failure reply (C{None}) completes the round trip just as well
+            transport.global_request('keepalive@openssh.com', wait=True)
+        except gevent.Timeout, t:
+            if t is not _timer:
+                _lock.release()
+                raise
+            if transport.completion_event is not _pending and transport.completion_event is not None:
+                gevent.spawn(_discard_late_reply, transport, transport.completion_event, _lock)
+            else:
+                _lock.release()
+            return None
+        except:
+            _lock.release()
+            raise
+        _lock.release()
+    finally:
+        if _timer is not None:
+            _timer.cancel()
+    if not transport.is_active():
+        return None
+    return time.time() - _start
+
+
+class X2GoRingBuffer(object):
+    """\
+    Fixed-size buffer of numeric samples, the oldest sample gets overwritten once
+    the buffer is full.
+
+    """
+    def __init__(self, size):
+        """\
+        @param size: maximum number of samples
+        @type size: C{int}
+
+        """
+        self.size = max(1, size)
+        self._samples = []
+        self._next = 0
+        self.last = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def append(self, value):
+        """\
+        Add a sample.
+
+        @param value: the sample
+        @type value: C{float}
+
+        """
+        if len(self._samples) < self.size:
+            self._samples.append(value)
+        else:
+            self._samples[self._next] = value
+        self._next = (self._next + 1) % self.size
+        self.last = value
+
+    def values(self):
+        """\
+        Retrieve the buffered samples, oldest first.
+
+        @return: the buffered samples
+        @rtype: C{list}
+
+        """
+        if len(self._samples) < self.size:
+            return self._samples[:]
+        return self._samples[self._next:] + self._samples[:self._next]
+
+    def percentile(self, percent):
+        """\
+        Compute a percentile (nearest-rank method) of the buffered samples.
+
+        @param percent: the percentile (0-100)
+        @type percent: C{float}
+
+        @return: the percentile, C{None} if the buffer is empty
+        @rtype: C{float}
+
+        """
+        if not self._samples:
+            return None
+        return _nearest_rank(sorted(self._samples), percent)
+
+    def summary(self):
+        """\
+        Summarize the buffered samples.
+
+        @return: dictionary with the keys C{last}, C{min}, C{max} and C{p50}, C{p90}, C{p99},
+            C{None} if the buffer is empty
+        @rtype: C{dict}
+
+        """
+        if not self._samples:
+            return None
+        _sorted = sorted(self._samples)
+        _summary = {
+            'last': self.last,
+            'min': _sorted[0],
+            'max': _sorted[-1],
+        }
+        for _percent in _PERCENTILES:
+            _summary['p%s' % _percent] = _nearest_rank(_sorted, _percent)
+        return _summary
+
+
+class X2GoNetworkMonitor(threading.Thread):
+    """\
+    Sample the SSH round trip time and the tunnel throughput of a session at a
+    fixed interval.
+
+    """
+    def __init__(self, transport, byte_counters=None, interval=_X2GO_NETMONITOR_INTERVAL, window=_X2GO_NETMONITOR_WINDOW,
+                 timeout=_X2GO_NETMONITOR_TIMEOUT, rtt_buffer=None, on_sample=None, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param transport: the session's SSH transport
+        @type transport: C{paramiko.Transport} instance
+        @param byte_counters: a function that returns the total number of bytes relayed by the session's
+            tunnels as tuple C{(bytes_up, bytes_down)}, C{None} disables throughput sampling
+        @type byte_counters: C{func}
+        @param interval: sampling interval (in seconds)
+        @type interval: C{float}
+        @param window: number of samples percentiles get computed from
+        @type window: C{int}
+        @param timeout: maximum time (in seconds) to wait for the server's reply to a round trip
+        @type timeout: C{float}
+        @param rtt_buffer: round trip times timed by someone else (the liveness monitor of the
+            session's control session), if given, the network quality monitor does not time round
+            trips itself
+        @type rtt_buffer: L{X2GoRingBuffer}
+        @param on_sample: a function that gets passed the current statistics (see L{get_stats()})
+            after each sample
+        @type on_sample: C{func}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoNetworkMonitor} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.transport = transport
+        self.byte_counters = byte_counters
+        self.interval = interval
+        self.timeout = timeout
+        self.on_sample = on_sample
+
+        self._own_rtt = rtt_buffer is None
+        if rtt_buffer is None:
+            rtt_buffer = X2GoRingBuffer(window)
+        self.rtt = rtt_buffer
+        self.throughput_up = X2GoRingBuffer(window)
+        self.throughput_down = X2GoRingBuffer(window)
+        self.failures = 0
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._last_counters = None
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def stop_thread(self):
+        """\
+        Stop sampling.
+
+        """
+        self._stopped.set()
+
+    def sample_rtt(self):
+        """\
+        Measure one round trip on the SSH transport.
+
+        @return: the round trip time (in seconds), C{None} if the transport is not active or the
+            server has not replied in time
+        @rtype: C{float}
+
+        """
+        return ssh_round_trip(self.transport, timeout=self.timeout)
+
+    def sample_throughput(self):
+        """\
+        Compute the tunnel throughput since the previous call.
+
+        @return: tuple C{(bytes_up, bytes_down)} per second, C{(None, None)} on the first call
+        @rtype: C{tuple}
+
+        """
+        if self.byte_counters is None:
+            return (None, None)
+        _now = time.time()
+        (_up, _down) = self.byte_counters()
+        _last = self._last_counters
+        self._last_counters = (_now, _up, _down)
+        if _last is None or _now <= _last[0]:
+            return (None, None)
+        _elapsed = _now - _last[0]
+        # counters of closed tunnel channels vanish, never report negative throughput
+        return (max(_up - _last[1], 0) / _elapsed, max(_down - _last[2], 0) / _elapsed)
+
+    def sample(self):
+        """\
+        Take one sample of the tunnel throughput and (unless round trip times are timed by
+        someone else) of the round trip time.
+
+        @return: C{False} if the SSH transport is not active anymore
+        @rtype: C{bool}
+
+        """
+        _rtt = None
+        if self._own_rtt:
+            try:
+                _rtt = self.sample_rtt()
+            except Exception, e:
+                self.logger('round trip time sample failed: %s' % str(e), loglevel=log.loglevel_DEBUG)
+        (_up, _down) = self.sample_throughput()
+
+        self._lock.acquire()
+        try:
+            if _rtt is not None:
+                self.rtt.append(_rtt)
+            elif self._own_rtt:
+                self.failures += 1
+            if _up is not None:
+                self.throughput_up.append(_up)
+                self.throughput_down.append(_down)
+        finally:
+            self._lock.release()
+
+        if self.on_sample is not None:
+            self.on_sample(self.get_stats())
+
+        return self.transport is not None and self.transport.is_active()
+
+    def get_stats(self):
+        """\
+        Retrieve the network quality statistics.
+
+        @return: dictionary with the keys C{samples}, C{failures}, C{interval} and C{rtt} (in seconds),
+            C{throughput_up}, C{throughput_down} (in bytes per second); the latter are summaries
+            (see L{X2GoRingBuffer.summary()}) of the latest samples
+        @rtype: C{dict}
+
+        """
+        self._lock.acquire()
+        try:
+            return {
+                'samples': len(self.rtt),
+                'failures': self.failures,
+                'interval': self.interval,
+                'rtt': self.rtt.summary(),
+                'throughput_up': self.throughput_up.summary(),
+                'throughput_down': self.throughput_down.summary(),
+            }
+        finally:
+            self._lock.release()
+
+    def run(self):
+        """\
+        The sampling loop. It gets run once the L{X2GoNetworkMonitor} has been started
+        with its C{start()} method.
+
+        """
+        self.logger('sampling network quality every %ss' % self.interval, loglevel=log.loglevel_DEBUG)
+        while not self._stopped.is_set():
+            _start = time.time()
+            if not self.sample():
+                self.logger('SSH transport is gone, network quality monitor stops', loglevel=log.loglevel_DEBUG)
+                break
+            self._stopped.wait(max(self.interval - (time.time() - _start), 0))
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+Port reachability probing for the RapidApp load balancer.
+
+Candidate ports of a server node get probed concurrently. A port only counts as working
+if an SSH daemon greets on it (middleboxes like transparent HTTP proxies accept TCP
+connections on ports 80/443 on behalf of any host). Candidate ports are listed in order
+of preference: once a port works, ports listed before it get a short grace period to
+come up as well. The working port of a server node is cached on disk per local network
+(identified by the local address that is used to reach the server node).
+
+"""
+__NAME__ = 'x2goportprobe-pylib'
+
+# modules
+import os
+import copy
+import time
+import threading
+import gevent
+import gevent.event
+from gevent import socket
+
+# Python X2Go modules
+import log
+import utils
+
+from defaults import X2GO_PORTPROBE_TIMEOUT as _X2GO_PORTPROBE_TIMEOUT
+from defaults import X2GO_PORTPROBE_GRACE as _X2GO_PORTPROBE_GRACE
+from defaults import X2GO_PORTPROBE_CACHE_TTL as _X2GO_PORTPROBE_CACHE_TTL
+
+
+def network_id(host):
+    """\
+    Identify the local network that is used to reach a host: the local address of
+    the interface that routes to the host. No packets are sent.
+
+    @param host: host name or IP address
+    @type host: C{str}
+
+    @return: the local address, C{unknown} if it cannot be determined
+    @rtype: C{str}
+
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        try:
+            s.connect((host, 9))
+            return s.getsockname()[0]
+        except (socket.error, socket.gaierror):
+            return 'unknown'
+    finally:
+        s.close()
+
+
+# maximum number of bytes an SSH daemon may send before its identification string (RFC 4253)
+_MAX_BANNER_SIZE = 8192
+
+
+def _ssh_connect_time(host, port, timeout):
+    _start = time.time()
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        s.settimeout(timeout)
+        s.connect((host, port))
+        _connect_time = time.time() - _start
+        _data = ''
+        while len(_data) < _MAX_BANNER_SIZE:
+            s.settimeout(max(timeout - (time.time() - _start), 0.001))
+            _chunk = s.recv(_MAX_BANNER_SIZE)
+            if not _chunk:
+                break
+            _data += _chunk
+            for _line in _data.split('\n')[:-1]:
+                if _line.startswith('SSH-'):
+                    return _connect_time
+        raise socket.error('no SSH daemon is listening on port %s' % port)
+    finally:
+        s.close()
+
+
+def probe_ports(host, ports, timeout=_X2GO_PORTPROBE_TIMEOUT, grace=_X2GO_PORTPROBE_GRACE, logger=None):
+    """\
+    Probe several TCP ports of a host concurrently for an SSH daemon.
+
+    @param host: host name or IP address
+    @type host: C{str}
+    @param ports: candidate ports in order of preference
+    @type ports: C{list}
+    @param timeout: time (in seconds) per port for connecting and receiving the SSH daemon's greeting
+    @type timeout: C{float}
+    @param grace: once a port works, time (in seconds) that probes of preferred ports get to succeed, too
+    @type grace: C{float}
+    @param logger: an L{X2GoLogger} instance
+    @type logger: C{obj}
+
+    @return: tuple C{(port, connect_time)} of the most preferred working port (connect time in
+        seconds), C{(None, None)} if no SSH daemon could be reached
+    @rtype: C{tuple}
+
+    """
+    if logger is None:
+        logger = log.X2GoLogger()
+
+    _results = {}
+    _first = gevent.event.Event()
+
+    def _probe(port):
+        try:
+            _results[port] = _ssh_connect_time(host, port, timeout)
+            _first.set()
+        except (socket.error, socket.timeout, socket.gaierror), e:
+            logger('port %s is not reachable on %s: %s' % (port, host, str(e)), loglevel=log.loglevel_DEBUG)
+
+    _probes = [ gevent.spawn(_probe, port) for port in ports ]
+    _all_done = gevent.spawn(gevent.joinall, _probes)
+    _all_done.link(lambda g: _first.set())
+    try:
+        _first.wait()
+        if _results:
+            # give the probes of preferred ports a moment before a less preferred port wins
+            _best = min([ list(ports).index(_port) for _port in _results.keys() ])
+            gevent.joinall(_probes[:_best], timeout=grace)
+    finally:
+        _all_done.unlink_all()
+        gevent.killall(_probes, block=False)
+        _all_done.kill(block=False)
+    for port in ports:
+        if _results.has_key(port):
+            return (port, _results[port])
+    return (None, None)
+
+
+class X2GoPortCache(object):
+    """\
+    On-disk cache of the last working port per server node and local network.
+
+    """
+    def __init__(self, cache_file, ttl=_X2GO_PORTPROBE_CACHE_TTL, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param cache_file: file to store the cache in
+        @type cache_file: C{str}
+        @param ttl: time (in seconds) a cached port stays valid
+        @type ttl: C{int}
+        @param logger: you can pass an L{X2GoLogger} object to the L{X2GoPortCache} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _load(self):
+        _entries = {}
+        try:
+            f = open(self.cache_file, 'r')
+            try:
+                for line in f:
+                    try:
+                        (key, port, timestamp) = line.split()
+                        _entries[key] = (int(port), float(timestamp))
+                    except ValueError:
+                        continue
+            finally:
+                f.close()
+        except IOError:
+            pass
+        return _entries
+
+    def _save(self, entries):
+        try:
+            utils.replace_file_contents(self.cache_file, ''.join([ '%s %s %s\n' % (key, port, timestamp) for (key, (port, timestamp)) in entries.items() ]), mode='w')
+        except (IOError, OSError), e:
+            self.logger('failed to write port cache file %s: %s' % (self.cache_file, str(e)), loglevel=log.loglevel_WARN)
+
+    def get(self, network, host):
+        """\
+        Retrieve the cached port of a server node.
+
+        @param network: the local network (see L{network_id()})
+        @type network: C{str}
+        @param host: the server node
+        @type host: C{str}
+
+        @return: the cached port, C{None} if nothing (valid) has been cached
+        @rtype: C{int}
+
+        """
+        self._lock.acquire()
+        try:
+            _entry = self._load().get('%s>%s' % (network, host))
+        finally:
+            self._lock.release()
+        if _entry is None or time.time() - _entry[1] > self.ttl:
+            return None
+        return _entry[0]
+
+    def put(self, network, host, port):
+        """\
+        Store the working port of a server node. Expired entries get dropped.
+
+        @param network: the local network (see L{network_id()})
+        @type network: C{str}
+        @param host: the server node
+        @type host: C{str}
+        @param port: the working port
+        @type port: C{int}
+
+        """
+        self._lock.acquire()
+        try:
+            _now = time.time()
+            _entries = dict([ (k, v) for (k, v) in self._load().items() if _now - v[1] <= self.ttl ])
+            _entries['%s>%s' % (network, host)] = (port, _now)
+            self._save(_entries)
+        finally:
+            self._lock.release()
+
+    def drop(self, network, host):
+        """\
+        Remove the cached port of a server node.
+
+        @param network: the local network (see L{network_id()})
+        @type network: C{str}
+        @param host: the server node
+        @type host: C{str}
+
+        """
+        self._lock.acquire()
+        try:
+            _entries = self._load()
+            if _entries.pop('%s>%s' % (network, host), None) is not None:
+                self._save(_entries)
+        finally:
+            self._lock.release()
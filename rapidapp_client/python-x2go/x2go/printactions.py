@@ -31,7 +31,6 @@ __NAME__ = 'x2goprintactions-pylib'
 import os
 import shutil
 import copy
-import time
 import gevent
 
 from defaults import X2GOCLIENT_OS as _X2GOCLIENT_OS
@@ -50,6 +49,7 @@ import defaults
 # we hide the default values from epydoc (that's why we transform them to _UNDERSCORE variables)
 import utils
 import x2go_exceptions
+import jobexecutor
 
 _PRINT_ENV = os.environ.copy()
 
@@ -59,6 +59,9 @@ class X2GoPrintAction(object):
     __name__ = 'NAME'
     __description__ = 'DESCRIPTION'
 
+    min_file_lifetime = 0
+    """Minimum time (in seconds) a PDF file handed over to an external application is kept before it gets removed."""
+
     def __init__(self, client_instance=None, logger=None, loglevel=log.loglevel_DEFAULT):
         """\
         This is a meta class and has no functionality as such. It is used as parent 
@@ -157,6 +160,24 @@ class X2GoPrintAction(object):
 
         return _hr_path
 
+    def _remove_when_done(self, filename, process=None, min_lifetime=None):
+        """\
+        Remove a PDF file that has been handed over to an external application in the background,
+        once the application's process has terminated.
+
+        @param filename: full path of the file to remove
+        @type filename: C{str}
+        @param process: the process that uses the file (or C{None})
+        @type process: C{obj}
+        @param min_lifetime: minimum time (in seconds) to keep the file, defaults to C{min_file_lifetime}
+        @type min_lifetime: C{float}
+
+        """
+        if min_lifetime is None:
+            min_lifetime = self.min_file_lifetime
+        self.logger('removing PDF file ,,%s\'\' once it is not needed anymore' % filename, loglevel=log.loglevel_DEBUG)
+        jobexecutor.remove_when_done(filename, process=process, min_lifetime=min_lifetime, logger=self.logger)
+
 
 class X2GoPrintActionPDFVIEW(X2GoPrintAction):
     """\
@@ -168,6 +189,9 @@ class X2GoPrintActionPDFVIEW(X2GoPrintAction):
 
     pdfview_cmd = None
 
+    # PDF viewers may be launchers that hand over the file and exit immediately
+    min_file_lifetime = 20
+
     def __init__(self, client_instance=None, pdfview_cmd=None, logger=None, loglevel=log.loglevel_DEFAULT):
         """\
         @param client_instance: the underlying L{X2GoClient} instance
@@ -204,10 +228,12 @@ class X2GoPrintActionPDFVIEW(X2GoPrintAction):
         pdf_file = os.path.normpath(pdf_file)
         spool_dir = os.path.normpath(spool_dir)
 
+        _hr_filename = self._humanreadable_filename(pdf_file, job_title, spool_dir, )
+        shutil.copy2(pdf_file, _hr_filename)
         if _X2GOCLIENT_OS == "Windows":
-            self.logger('viewing incoming job in PDF viewer with Python\'s os.startfile(command): %s' % pdf_file, loglevel=log.loglevel_DEBUG)
+            self.logger('viewing incoming job in PDF viewer with Python\'s os.startfile(command): %s' % _hr_filename, loglevel=log.loglevel_DEBUG)
             try:
-                gevent.spawn(os.startfile, pdf_file)
+                gevent.spawn(os.startfile, _hr_filename)
             except WindowsError, win_err:
                 if self.client_instance:
                     self.client_instance.HOOK_printaction_error(pdf_file,
@@ -217,23 +243,21 @@ class X2GoPrintActionPDFVIEW(X2GoPrintAction):
                                                                )
                 else:
                     self.logger('Encountered WindowsError: %s' % str(win_err), loglevel=log.loglevel_ERROR)
-            time.sleep(20)
+            # os.startfile() does not give us a process handle
+            self._remove_when_done(_hr_filename)
         else:
-            _hr_filename = self._humanreadable_filename(pdf_file, job_title, spool_dir, )
-            shutil.copy2(pdf_file, _hr_filename)
             cmd_line = [ self.pdfview_cmd, _hr_filename, ]
             self.logger('viewing incoming PDF with command: %s' % ' '.join(cmd_line), loglevel=log.loglevel_DEBUG)
             try:
-                subprocess.Popen(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_PRINT_ENV)
+                _process = jobexecutor.start_process(subprocess.Popen, cmd_line, env=_PRINT_ENV)
             except OSError, e:
                 if e.errno == 2:
                     cmd_line = [ defaults.DEFAULT_PDFVIEW_CMD, _hr_filename ]
-                    subprocess.Popen(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_PRINT_ENV)
+                    _process = jobexecutor.start_process(subprocess.Popen, cmd_line, env=_PRINT_ENV)
                 else:
+                    os.remove(_hr_filename)
                     raise(e)
-            self.logger('waiting 20s longer before deleting the PDF file ,,%s\'\'' % _hr_filename, loglevel=log.loglevel_DEBUG)
-            time.sleep(20)
-            os.remove(_hr_filename)
+            self._remove_when_done(_hr_filename, _process)
 
 
 class X2GoPrintActionPDFSAVE(X2GoPrintAction):
@@ -335,6 +359,8 @@ class X2GoPrintActionPRINT(X2GoPrintAction):
 
         _hr_filename = self._humanreadable_filename(pdf_file, job_title, spool_dir)
         if _X2GOCLIENT_OS == 'Windows':
+            shutil.copy2(pdf_file, _hr_filename)
+            _process = None
             _default_printer = win32print.GetDefaultPrinter()
             if self.printer:
                 _printer = self.printer
@@ -354,14 +380,12 @@ class X2GoPrintActionPRINT(X2GoPrintAction):
                     _gsprint_bin = os.path.normpath(os.path.join(_program_files, 'ghostgum', 'gsview', 'gsprint.exe',))
                     self.logger('Using hard-coded gsprint.exe path: %s' % _gsprint_bin, loglevel=log.loglevel_DEBUG)
                 self.logger('Trying Ghostgum tool ,,gsprint.exe'' for printing first (full path: %s)' % _gsprint_bin, loglevel=log.loglevel_DEBUG)
-                subprocess.Popen([_gsprint_bin, pdf_file, ],
-                                  stdin=_stdin,
-                                  stdout=subprocess.PIPE,
-                                  stderr=subprocess.STDOUT,
-                                  shell=_shell,
-                                 )
+                _process = jobexecutor.start_process(subprocess.Popen, [_gsprint_bin, _hr_filename, ],
+                                                     stdin=_stdin,
+                                                     shell=_shell,
+                                                    )
                 # give gsprint.exe a little time to find our printer
-                time.sleep(10)
+                jobexecutor.wait_for_process(_process, timeout=10)
 
             except:
                 self.logger('Falling back to win32api printing...', loglevel=log.loglevel_DEBUG)
@@ -369,13 +393,13 @@ class X2GoPrintActionPRINT(X2GoPrintAction):
                     win32api.ShellExecute (
                           0,
                           "print",
-                          pdf_file,
+                          _hr_filename,
                           None,
                           ".",
                           0
                     )
                     # give the win32api some time to find our printer...
-                    time.sleep(10)
+                    gevent.sleep(10)
                 except win32api.error, e:
                     if self.client_instance:
                         self.client_instance.HOOK_printaction_error(filename=_hr_filename, printer=_printer, err_msg=e.message, profile_name=self.profile_name, session_name=self.session_name)
@@ -384,7 +408,11 @@ class X2GoPrintActionPRINT(X2GoPrintAction):
 
             if self.printer:
                 win32print.SetDefaultPrinter(_default_printer)
-            time.sleep(60)
+            if _process is not None:
+                self._remove_when_done(_hr_filename, _process)
+            else:
+                # no process handle when printing via the win32api
+                self._remove_when_done(_hr_filename, min_lifetime=60)
 
         else:
             _hr_filename = self._humanreadable_filename(pdf_file, job_title, spool_dir)
@@ -410,13 +438,10 @@ class X2GoPrintActionPRINT(X2GoPrintAction):
                              '%s' % _hr_filename,
                            ]
             self.logger('executing local print command: %s' % " ".join(cmd_line), loglevel=log.loglevel_DEBUG)
-            subprocess.Popen(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_PRINT_ENV)
+            _process = jobexecutor.start_process(subprocess.Popen, cmd_line, env=_PRINT_ENV)
 
-            # this is nasty!!!!
-            self.logger('waiting 20s longer before deleting the PDF file ,,%s\'\'' % _hr_filename, loglevel=log.loglevel_DEBUG)
-            time.sleep(20)
-            try: os.remove(_hr_filename)
-            except OSError: pass
+            # lpr -r removes the file itself, clean up if lpr failed
+            self._remove_when_done(_hr_filename, _process)
 
 
 class X2GoPrintActionPRINTCMD(X2GoPrintAction):
@@ -471,13 +496,9 @@ class X2GoPrintActionPRINTCMD(X2GoPrintAction):
         cmd_line = self.print_cmd.split()
         cmd_line.append(_hr_filename)
         self.logger('executing external command: %s' % " ".join(cmd_line), loglevel=log.loglevel_DEBUG)
-        subprocess.Popen(cmd_line, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_PRINT_ENV)
+        _process = jobexecutor.start_process(subprocess.Popen, cmd_line, env=_PRINT_ENV)
 
-        # this is nasty!!!!
-        self.logger('waiting 20s longer before deleting the PDF file ,,%s\'\'' % _hr_filename, loglevel=log.loglevel_DEBUG)
-        time.sleep(20)
-        try: os.remove(_hr_filename)
-        except OSError: pass
+        self._remove_when_done(_hr_filename, _process)
 
 
 class X2GoPrintActionDIALOG(X2GoPrintAction):
@@ -20,9 +20,9 @@
 """\
 L{X2GoPrintQueue} sets up a thread that listens for incoming print jobs.
 
-For each incoming print job in an X2Go session's spool directory an 
-individual thread is started (L{X2GoPrintJob}) that handles the processing 
-of the incoming print job.
+Each incoming print job in an X2Go session's spool directory is handed over
+to the shared L{X2GoJobExecutor} that processes the print job with a bounded
+number of worker threads.
 
 """
 __NAME__ = 'x2goprintqueue-pylib'
@@ -37,6 +37,8 @@ import gevent
 import defaults
 import utils
 import log
+import spoolwatch
+import jobexecutor
 
 from defaults import X2GO_PRINTING_FILENAME as _X2GO_PRINTING_FILENAME
 from defaults import BACKENDS as _BACKENDS
@@ -100,6 +102,8 @@ class X2GoPrintQueue(threading.Thread):
         self.printing_backend = utils._get_backend_class(printing_backend, "X2GoClientPrinting")
         if print_action is not None:
             self.set_print_action(print_action, client_instance=self.client_instance, logger=logger, **print_action_args)
+        self._spool_watcher = spoolwatch.X2GoSpoolWatcher(self.spool_dir, accept=lambda f: f.endswith('.ready'), logger=self.logger)
+        self._job_executor = jobexecutor.get_job_executor()
         threading.Thread.__init__(self)
         self.daemon = True
         self._accept_jobs = True
@@ -140,26 +144,37 @@ class X2GoPrintQueue(threading.Thread):
         self._keepalive = False
         self.logger('stopping thread: %s' % repr(self), loglevel=log.loglevel_DEBUG)
 
-    @property
-    def _incoming_print_jobs(self):
+    def _wait_for_print_jobs(self, timeout=None):
+        """\
+        Wait for new print jobs in the spool directory. The C{.ready} file of each new
+        print job is read exactly once.
+
+        @param timeout: maximum time (in seconds) to wait for new print jobs
+        @type timeout: C{float}
+
+        @return: list of C{(job_file, pdf_file, job_title)} tuples
+        @rtype: C{list}
 
-        if os.path.exists(self.spool_dir):
-            l = os.listdir(self.spool_dir)
-            job_files = [ jf for jf in l if jf.endswith('.ready') ]
-            jobs = []
-            for _job_file in job_files:
+        """
+        jobs = []
+        for _job_file in self._spool_watcher.wait(timeout=timeout):
+            try:
                 _job_file_handle = open(os.path.join(self.spool_dir, _job_file), 'r')
-                content = _job_file_handle.read()
                 try:
-                    (pdf_filename, job_title) = content.split('\n')[0:2]
-                except ValueError:
-                    pdf_filename = content
-                    job_title = 'X2Go Print Job'
-                _job_file_handle.close()
+                    content = _job_file_handle.read()
+                finally:
+                    _job_file_handle.close()
+            except IOError:
+                # the job file has vanished in the meantime
+                continue
+            try:
+                (pdf_filename, job_title) = content.split('\n')[0:2]
+            except ValueError:
+                pdf_filename = content
+                job_title = 'X2Go Print Job'
+            if pdf_filename not in self.active_jobs:
                 jobs.append((_job_file, pdf_filename, job_title))
-            return [ j for j in jobs if j[1] not in self.active_jobs.keys() ]
-        else:
-            return []
+        return jobs
 
     def set_print_action(self, print_action, **kwargs):
         """\
@@ -194,32 +209,27 @@ class X2GoPrintQueue(threading.Thread):
 
             while self._accept_jobs:
 
-                if self._incoming_print_jobs:
-
-                    for _job in self._incoming_print_jobs:
-                        self.logger('processing incoming X2Go print job: %s' % _job[1], loglevel=log.loglevel_NOTICE)
-                        _new_printjob_thread = X2GoPrintJob(target=x2go_printjob_handler,
-                                                            kwargs={ 
-                                                            'job_file': _job[0],
-                                                            'pdf_file': _job[1],
-                                                            'job_title': _job[2],
-                                                            'print_action': self.print_action,
-                                                            'parent_thread': self, 
-                                                            'logger': self.logger, 
-                                                          }
-                                                  )
-                        self.active_jobs['%s' % _job[1]] = _new_printjob_thread
-                        _new_printjob_thread.start()
-
-                gevent.sleep(3)
+                for _job in self._wait_for_print_jobs(timeout=1):
+                    self.logger('processing incoming X2Go print job: %s' % _job[1], loglevel=log.loglevel_NOTICE)
+                    self.active_jobs['%s' % _job[1]] = self._job_executor.submit(x2go_printjob_handler,
+                                                                                  name='print job %s' % _job[1],
+                                                                                  job_file=_job[0],
+                                                                                  pdf_file=_job[1],
+                                                                                  job_title=_job[2],
+                                                                                  print_action=self.print_action,
+                                                                                  parent_thread=self,
+                                                                                  logger=self.logger,
+                                                                                 )
 
             gevent.sleep(1)
 
+        self._spool_watcher.close()
+
 
 def x2go_printjob_handler(job_file=None, pdf_file=None, job_title=None, print_action=None, parent_thread=None, logger=None, ):
     """\
-    This function is called as a handler function for each incoming X2Go print job 
-    represented by the class L{X2GoPrintJob}.
+    This function is called as a handler function for each incoming X2Go print job
+    (processed by the shared L{X2GoJobExecutor}).
 
     The handler function will (re-)read the »printing« configuration file (if no
     explicit C{print_action} is passed to this function...). It then will
@@ -231,7 +241,7 @@ def x2go_printjob_handler(job_file=None, pdf_file=None, job_title=None, print_ac
     @type job_title: C{str}
     @param print_action: an instance of either of the possible C{X2GoPrintActionXXX} classes
     @type print_action: C{X2GoPrintActionXXX} nstance
-    @param parent_thread: the L{X2GoPrintQueue} thread that actually created this handler's L{X2GoPrintJob} instance
+    @param parent_thread: the L{X2GoPrintQueue} thread that actually submitted this print job
     @type parent_thread: C{obj}
     @param logger: the L{X2GoPrintQueue}'s logging instance
     @type logger: C{obj}
@@ -253,43 +263,25 @@ def x2go_printjob_handler(job_file=None, pdf_file=None, job_title=None, print_ac
     print_action.session_name = parent_thread.session_name
 
     logger('action for printing is: %s' % print_action, loglevel=log.loglevel_DEBUG)
-    print_action.do_print(pdf_file=os.path.normpath(os.path.join(parent_thread.spool_dir, pdf_file)),
-                          job_title=job_title,
-                          spool_dir=parent_thread.spool_dir,
-                         )
-
-    logger('removing print job files for %s' % pdf_file, loglevel=log.loglevel_DEBUG)
-
-    utils.patiently_remove_file(parent_thread.spool_dir, job_file)
-    logger('removed print job file %s' % job_file, loglevel=log.loglevel_DEBUG)
-    utils.patiently_remove_file(parent_thread.spool_dir, pdf_file)
-    logger('removed print pdf file %s' % pdf_file, loglevel=log.loglevel_DEBUG)
-
-    del parent_thread.active_jobs['%s' % pdf_file]
+    try:
+        # print actions work on copies of the spool file (or have finished with it when
+        # do_print() returns), so the spool files can be removed right away
+        print_action.do_print(pdf_file=os.path.normpath(os.path.join(parent_thread.spool_dir, pdf_file)),
+                              job_title=job_title,
+                              spool_dir=parent_thread.spool_dir,
+                             )
+    finally:
+        logger('removing print job files for %s' % pdf_file, loglevel=log.loglevel_DEBUG)
+
+        utils.patiently_remove_file(parent_thread.spool_dir, job_file)
+        logger('removed print job file %s' % job_file, loglevel=log.loglevel_DEBUG)
+        utils.patiently_remove_file(parent_thread.spool_dir, pdf_file)
+        logger('removed print pdf file %s' % pdf_file, loglevel=log.loglevel_DEBUG)
+
+        del parent_thread.active_jobs['%s' % pdf_file]
     parent_thread.job_history.append(pdf_file)
 
     # in case we print a lot we do not want to risk an endlessly growing 
     # print job history
     if len(parent_thread.job_history) > 100:
         parent_thread.job_history = parent_thread.job_history[-100:]
-
-
-class X2GoPrintJob(threading.Thread):
-    """\
-    For each X2Go print job we create a sub-thread that let's 
-    the print job be processed in the background.
-
-    As a handler for this class the function L{x2go_printjob_handler()} 
-    is used.
-
-    """
-    def __init__(self, **kwargs):
-        """\
-        Construct the X2Go print job thread...
-
-        All parameters (**kwargs) are passed through to the constructor
-        of C{threading.Thread()}.
-
-        """
-        threading.Thread.__init__(self, **kwargs)
-        self.daemon = True
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+X2GoPublishedApplicationsCache class - persistent caching of published applications menus.
+
+"""
+__NAME__ = 'x2gopubappcache-pylib'
+
+# modules
+import os
+import copy
+import hashlib
+import threading
+
+# Python X2Go modules
+import log
+import utils
+
+
+class X2GoPublishedApplicationsCache(object):
+    """\
+    On-disk cache for the raw C{x2gogetapps} output of X2Go servers.
+
+    Each server (identified by user name, host name and port) has one cache file. A cache
+    entry is stored together with the fingerprint the server reported for it (see
+    L{defaults.X2GO_PUBAPP_FINGERPRINT_COMMAND}), so a cached menu can be revalidated by
+    comparing fingerprints without transferring the menu again.
+
+    """
+    def __init__(self, cache_dir, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param cache_dir: directory to store the cache files in
+        @type cache_dir: C{str}
+        @param logger: you can pass an L{X2GoLogger} object to the L{X2GoPublishedApplicationsCache} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def _cache_file(self, server_key):
+        return os.path.join(self.cache_dir, '%s.menu' % hashlib.md5(server_key).hexdigest())
+
+    def get(self, server_key):
+        """\
+        Retrieve the cached menu of a server.
+
+        @param server_key: identifies the server (e.g. C{user@host:port})
+        @type server_key: C{str}
+
+        @return: tuple C{(fingerprint, raw_menu)}, C{(None, None)} if nothing has been cached for this server
+        @rtype: C{tuple}
+
+        """
+        _cache_file = self._cache_file(server_key)
+        self._lock.acquire()
+        try:
+            try:
+                f = open(_cache_file, 'rb')
+                try:
+                    fingerprint = f.readline().strip()
+                    raw_menu = f.read()
+                finally:
+                    f.close()
+            except IOError:
+                return (None, None)
+        finally:
+            self._lock.release()
+
+        if not fingerprint:
+            return (None, None)
+        return (fingerprint, raw_menu)
+
+    def put(self, server_key, fingerprint, raw_menu):
+        """\
+        Store the menu of a server. The cache file gets replaced in a single step
+        (see L{utils.replace_file_contents()}).
+
+        @param server_key: identifies the server (e.g. C{user@host:port})
+        @type server_key: C{str}
+        @param fingerprint: the fingerprint the server reported for C{raw_menu}
+        @type fingerprint: C{str}
+        @param raw_menu: the raw C{x2gogetapps} output
+        @type raw_menu: C{str}
+
+        """
+        _cache_file = self._cache_file(server_key)
+        self._lock.acquire()
+        try:
+            try:
+                utils.replace_file_contents(_cache_file, '%s\n%s' % (fingerprint, raw_menu))
+            except (IOError, OSError), e:
+                self.logger('failed to write published applications cache file %s: %s' % (_cache_file, str(e)), loglevel=log.loglevel_WARN)
+        finally:
+            self._lock.release()
+
+    def drop(self, server_key):
+        """\
+        Remove the cached menu of a server.
+
+        @param server_key: identifies the server (e.g. C{user@host:port})
+        @type server_key: C{str}
+
+        """
+        self._lock.acquire()
+        try:
+            try:
+                os.remove(self._cache_file(server_key))
+            except OSError:
+                pass
+        finally:
+            self._lock.release()
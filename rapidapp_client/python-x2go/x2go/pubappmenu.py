@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+Published applications menu parser - turns the output of the server-side C{x2gogetapps}
+command into i18n capable menu trees.
+
+Each .desktop entry is tokenized exactly once. Keys are dispatched via a lookup table,
+all localized values are kept, so menu trees for any number of languages can be built
+from the parsed entries in a single pass.
+
+"""
+__NAME__ = 'x2gopubappmenu-pylib'
+
+MENU_CATEGORIES = ('Multimedia', 'Development', 'Education', 'Games', 'Graphics', 'Internet',
+                   'Office', 'System', 'Utilities', 'Other Applications', 'TOP', )
+"""Categories of the published applications menu tree."""
+
+# menu categories in the order they get detected from a .desktop entry's Categories key,
+# Categories values mapping to None are ignored
+_CATEGORY_RULES = (
+    (('X2Go-Top', ), 'TOP'),
+    (('Audio', 'Video', ), 'Multimedia'),
+    (('Development', ), 'Development'),
+    (('Education', ), 'Education'),
+    (('Game', ), 'Games'),
+    (('Graphics', ), 'Graphics'),
+    (('Network', ), 'Internet'),
+    (('Office', ), 'Office'),
+    (('Settings', ), None),
+    (('System', ), 'System'),
+    (('Utility', ), 'Utilities'),
+)
+
+# field codes that get stripped off Exec commands
+_EXEC_FIELD_CODES = ('%f', '%F', '%u', '%U', )
+
+# resolved Categories values, catalogs use only a handful of distinct values
+_category_cache = {}
+
+
+def _resolve_category(categories):
+    try:
+        return _category_cache[categories]
+    except KeyError:
+        pass
+    _category = 'Other Applications'
+    for (keywords, category) in _CATEGORY_RULES:
+        if [ k for k in keywords if k in categories ]:
+            _category = category
+            break
+    _category_cache[categories] = _category
+    return _category
+
+
+class X2GoDesktopEntry(object):
+    """\
+    Parsed .desktop entry of a published application.
+
+    """
+    __slots__ = ('names', 'comments', 'exec_cmd', 'terminal', 'category', 'icon', )
+
+    def __init__(self, icon=None):
+        """\
+        @param icon: base64-encoded icon data
+        @type icon: C{str}
+
+        """
+        self.names = {}
+        self.comments = {}
+        self.exec_cmd = ''
+        self.terminal = False
+        self.category = ''
+        self.icon = icon
+
+    def get_name(self, lang_regio, lang_only):
+        """\
+        Retrieve the entry's name for a given language (falls back to the unlocalized name).
+
+        @param lang_regio: language with region (e.g. C{de_DE})
+        @type lang_regio: C{str}
+        @param lang_only: language without region (e.g. C{de})
+        @type lang_only: C{str}
+
+        @return: the localized name
+        @rtype: C{str}
+
+        """
+        names = self.names
+        return names.get(lang_regio) or names.get(lang_only) or names.get(None, '')
+
+    def get_comment(self, lang_regio, lang_only):
+        """\
+        Retrieve the entry's comment for a given language (falls back to the unlocalized
+        comment and then to the localized name).
+
+        @param lang_regio: language with region (e.g. C{de_DE})
+        @type lang_regio: C{str}
+        @param lang_only: language without region (e.g. C{de})
+        @type lang_only: C{str}
+
+        @return: the localized comment
+        @rtype: C{str}
+
+        """
+        comments = self.comments
+        return comments.get(lang_regio) or comments.get(lang_only) or comments.get(None) or self.get_name(lang_regio, lang_only)
+
+    def get_command(self):
+        """\
+        Retrieve the command to launch this entry with.
+
+        @return: the Exec command without field codes, wrapped into a terminal emulator call if required
+        @rtype: C{str}
+
+        """
+        _cmd = self.exec_cmd
+        for _code in _EXEC_FIELD_CODES:
+            _cmd = _cmd.replace(_code, '')
+        if self.terminal:
+            _cmd = "x-terminal-emulator -e '%s'" % _cmd
+        return _cmd
+
+
+def _parse_name(entry, locale, value):
+    entry.names[locale] = value.strip()
+
+def _parse_comment(entry, locale, value):
+    entry.comments[locale] = value.strip()
+
+def _parse_exec(entry, locale, value):
+    if locale is None:
+        entry.exec_cmd = value.strip()
+
+def _parse_terminal(entry, locale, value):
+    if locale is None and 'true' in value.lower():
+        entry.terminal = True
+
+def _parse_categories(entry, locale, value):
+    if locale is None:
+        _category = _resolve_category(value)
+        if _category is not None:
+            entry.category = _category
+
+_KEY_PARSERS = {
+    'Name': _parse_name,
+    'Comment': _parse_comment,
+    'Exec': _parse_exec,
+    'Terminal': _parse_terminal,
+    'Categories': _parse_categories,
+}
+
+
+def split_menu_items(raw_output):
+    """\
+    Cut the output of C{x2gogetapps} into single menu items.
+
+    @param raw_output: the output of the server-side C{x2gogetapps} command
+    @type raw_output: C{str}
+
+    @return: list of C{dict}s, each with a C{desktop} key (the shortened text of a .desktop file)
+        and an C{icon} key (base64-encoded icon data or C{None})
+    @rtype: C{list}
+
+    """
+    _menu = []
+    for _raw_menu_item in raw_output.split('</desktop>\n'):
+        _raw_menu_item = _raw_menu_item.replace('<desktop>\n', '')
+        (_head, _sep, _tail) = _raw_menu_item.partition('<icon>\n')
+        if _sep and '</icon>' in _tail:
+            (_icon_base64, _sep, _rest) = _tail.partition('</icon>\n')
+            _menu_item = _head + _rest
+        else:
+            _menu_item = _raw_menu_item
+            _icon_base64 = None
+        if _menu_item:
+            _menu.append({ 'desktop': _menu_item, 'icon': _icon_base64, })
+    return _menu
+
+
+def parse_desktop_entry(desktop, icon=None):
+    """\
+    Parse the (shortened) text of a .desktop file.
+
+    @param desktop: .desktop file text
+    @type desktop: C{str}
+    @param icon: base64-encoded icon data
+    @type icon: C{str}
+
+    @return: the parsed entry
+    @rtype: L{X2GoDesktopEntry}
+
+    """
+    entry = X2GoDesktopEntry(icon=icon)
+    for line in desktop.split('\n'):
+        (key, sep, value) = line.partition('=')
+        if not sep:
+            continue
+        locale = None
+        if key.endswith(']'):
+            (key, sep, locale) = key[:-1].partition('[')
+        _parser = _KEY_PARSERS.get(key)
+        if _parser is not None:
+            _parser(entry, locale, value)
+    return entry
+
+
+def parse_menu_items(menu_items):
+    """\
+    Parse all menu items as returned by L{split_menu_items()}.
+
+    @param menu_items: list of menu items
+    @type menu_items: C{list}
+
+    @return: list of parsed entries
+    @rtype: C{list} of L{X2GoDesktopEntry}
+
+    """
+    return [ parse_desktop_entry(item['desktop'], icon=item['icon']) for item in menu_items ]
+
+
+def build_menus(entries, langs, render_submenus=True):
+    """\
+    Build the published applications menu trees for several languages at once.
+
+    @param entries: parsed .desktop entries
+    @type entries: C{list} of L{X2GoDesktopEntry}
+    @param langs: locale/language identifiers (e.g. C{de_DE}) to build menu trees for
+    @type langs: C{list}
+    @param render_submenus: sort menu items into category submenus, if C{False} all
+        items go into the C{TOP} category
+    @type render_submenus: C{bool}
+
+    @return: menu trees, keyed by language, each of them a C{dict} that maps (non-empty) categories
+        to lists of menu items (C{dict}s with the keys C{name}, C{comment}, C{exec} and C{icon})
+    @rtype: C{dict}
+
+    """
+    _langs = [ (lang, lang, lang.split('_')[0]) for lang in langs ]
+    _menus = dict([ (lang, dict([ (c, []) for c in MENU_CATEGORIES ])) for lang in langs ])
+
+    for entry in entries:
+        if not entry.exec_cmd:
+            continue
+        _command = entry.get_command()
+        if render_submenus:
+            _category = entry.category or 'Other Applications'
+        else:
+            _category = 'TOP'
+        for (lang, lang_regio, lang_only) in _langs:
+            _menus[lang][_category].append(
+                {
+                    'name': entry.get_name(lang_regio, lang_only),
+                    'comment': entry.get_comment(lang_regio, lang_only),
+                    'exec': _command,
+                    'icon': entry.icon,
+                }
+            )
+
+    for _menu in _menus.values():
+        for _category in _menu.keys():
+            if _menu[_category]:
+                _menu[_category].sort(key=lambda k: k['name'])
+            else:
+                del _menu[_category]
+
+    return _menus
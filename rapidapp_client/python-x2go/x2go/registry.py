@@ -44,6 +44,27 @@ from defaults import X2GO_SSH_ROOTDIR as _X2GO_SSH_ROOTDIR
 
 from defaults import BACKENDS as _BACKENDS
 
+# session states the session registry maintains a lookup index for
+_INDEXED_STATES = ('virgin', 'connected', 'running', 'suspended', 'terminated', 'associated', )
+
+def _index_add(index, key, session_uuid, session_object):
+    index.setdefault(key, {})[session_uuid] = session_object
+
+def _index_remove(index, key, session_uuid):
+    _sessions = index.get(key)
+    if _sessions is not None:
+        _sessions.pop(session_uuid, None)
+        if not _sessions:
+            del index[key]
+
+def _unique(values):
+    _seen = set()
+    _values = []
+    for value in values:
+        if value and value not in _seen:
+            _seen.add(value)
+            _values.append(value)
+    return _values
 
 class X2GoSessionRegistry(object):
     """\
@@ -79,6 +100,15 @@ class X2GoSessionRegistry(object):
         self._skip_auto_registration = False
         self._profile_locks = {}
 
+        # secondary lookup indexes (key -> {session_uuid: session_object}), kept up-to-date by
+        # the registered sessions (see L{X2GoSessionRegistry._index_session()})
+        self._index_lock = threading.RLock()
+        self._state_index = dict([ (state, {}) for state in _INDEXED_STATES ])
+        self._profile_name_index = {}
+        self._profile_id_index = {}
+        self._session_name_index = {}
+        self._index_keys = {}
+
     def keys(self):
         """\
         A list of session registry keys.
@@ -142,11 +172,69 @@ class X2GoSessionRegistry(object):
 
         """
         try:
-            del self.registry[session_uuid]
+            self._index_lock.acquire()
+            try:
+                _session = self.registry.pop(session_uuid)
+                self._unindex_session(session_uuid)
+            finally:
+                self._index_lock.release()
+            _session._index_observer = None
             self.logger('Forgetting session UUID %s' % session_uuid, loglevel=log.loglevel_DEBUG)
         except KeyError:
             pass
 
+    def _index_session(self, session_object):
+        """\
+        (Re-)index a registered L{X2GoSession} instance. Registered sessions call this method
+        whenever one of their indexed attributes (session state, profile name/ID, session name) changes.
+
+        @param session_object: the session to be (re-)indexed
+        @type session_object: L{X2GoSession} instance
+
+        """
+        session_uuid = session_object.get_uuid()
+        self._index_lock.acquire()
+        try:
+            if not self.registry.has_key(session_uuid):
+                return
+            self._unindex_session(session_uuid)
+
+            _states = [ state for state in _INDEXED_STATES if state != 'associated' and getattr(session_object, state, None) ]
+            if session_object.has_terminal_session():
+                _states.append('associated')
+            _profile_name = getattr(session_object, 'profile_name', None)
+            _profile_id = getattr(session_object, 'profile_id', None)
+            _session_name = getattr(session_object, 'session_name', None)
+
+            for state in _states:
+                self._state_index[state][session_uuid] = session_object
+            _index_add(self._profile_name_index, _profile_name, session_uuid, session_object)
+            _index_add(self._profile_id_index, _profile_id, session_uuid, session_object)
+            if _session_name is not None:
+                _index_add(self._session_name_index, _session_name, session_uuid, session_object)
+
+            self._index_keys[session_uuid] = (_states, _profile_name, _profile_id, _session_name)
+        finally:
+            self._index_lock.release()
+
+    def _unindex_session(self, session_uuid):
+        """\
+        Remove a session from all lookup indexes.
+
+        @param session_uuid: the X2Go session's UUID registry hash
+        @type session_uuid: C{str}
+
+        """
+        _keys = self._index_keys.pop(session_uuid, None)
+        if _keys is None:
+            return
+        (_states, _profile_name, _profile_id, _session_name) = _keys
+        for state in _states:
+            self._state_index[state].pop(session_uuid, None)
+        _index_remove(self._profile_name_index, _profile_name, session_uuid)
+        _index_remove(self._profile_id_index, _profile_id, session_uuid)
+        _index_remove(self._session_name_index, _session_name, session_uuid)
+
     def get_profile_id(self, session_uuid):
         """\
         Retrieve the profile ID of a given session UUID hash.
@@ -185,9 +273,7 @@ class X2GoSessionRegistry(object):
 
         """
         _session_summary = {}
-        _r = False
-        if session_uuid in [ s() for s in self.registered_sessions() ]:
-            _r = True
+        _r = self.registry.has_key(session_uuid)
 
         if not status_only:
             _session_summary['uuid'] = _r and session_uuid or None
@@ -257,7 +343,7 @@ class X2GoSessionRegistry(object):
         elif profile_name:
             session_uuids = [ s() for s in self.registered_sessions_of_profile_name(profile_name, return_objects=True) ]
         elif profile_id:
-            session_uuids = [ s() for s in self.registered_sessions_of_profile_name(self.client_instance.to_profile_name(profile_id), return_objects=True) ]
+            session_uuids = self._profile_id_index.get(profile_id, {}).keys()
 
         for _session_uuid in session_uuids:
 
@@ -287,7 +373,7 @@ class X2GoSessionRegistry(object):
                 self(_session_uuid).session_cleanup()
                 self(_session_uuid).__del__()
                 if len(self.virgin_sessions_of_profile_name(profile_name)) > 1:
-                    del self.registry[_session_uuid]
+                    self.forget(_session_uuid)
 
             elif not _last_status['running'] and _current_status['running'] and not _current_status['faulty']:
                 # session has started
@@ -589,7 +675,13 @@ class X2GoSessionRegistry(object):
         self.logger('registering X2Go session %s...' % profile_name, log.loglevel_NOTICE)
         self.logger('registering X2Go session with UUID %s' % session_uuid, log.loglevel_DEBUG)
 
-        self.registry[session_uuid] = s
+        self._index_lock.acquire()
+        try:
+            self.registry[session_uuid] = s
+            s._index_observer = self._index_session
+            self._index_session(s)
+        finally:
+            self._index_lock.release()
         if profile_id not in self.control_sessions.keys():
             self.control_sessions[profile_id] = s.get_control_session()
 
@@ -634,11 +726,11 @@ class X2GoSessionRegistry(object):
             the same L{X2GoClient} instance. This should never happen!
 
         """
-        if match_profile_name is None:
-            reg_sessions = self.registered_sessions()
-        else:
-            reg_sessions = self.registered_sessions_of_profile_name(match_profile_name)
-        found_sessions = [ s for s in reg_sessions if s.session_name == session_name and s.session_name is not None ]
+        if session_name is None:
+            return None
+        found_sessions = self._session_name_index.get(session_name, {}).values()
+        if match_profile_name is not None:
+            found_sessions = [ s for s in found_sessions if s.get_profile_name() == match_profile_name ]
         if len(found_sessions) == 1:
             session = found_sessions[0]
             if return_object:
@@ -650,31 +742,25 @@ class X2GoSessionRegistry(object):
         else:
             return None
 
-    def _sessionsWithState(self, state, return_objects=True, return_profile_names=False, return_profile_ids=False, return_session_names=False):
-        if state == 'associated':
-            sessions = [ ts for ts in self.registry.values() if ts.has_terminal_session() ]
-        elif state == 'registered':
-            sessions = [ ts for ts in self.registry.values() ]
+    def _sessionsWithState(self, state, profile_name=None, return_objects=True, return_profile_names=False, return_profile_ids=False, return_session_names=False):
+        if state == 'registered':
+            _sessions = self.registry
+        else:
+            _sessions = self._state_index[state]
+        if profile_name is not None:
+            # intersect with the sessions of the given profile, iterate over the smaller index
+            _a, _b = self._profile_name_index.get(profile_name, {}), _sessions
+            if len(_a) > len(_b):
+                _a, _b = _b, _a
+            sessions = [ s for (_uuid, s) in _a.items() if _b.has_key(_uuid) ]
         else:
-            sessions = [ ts for ts in self.registry.values() if eval('ts.%s' % state) ]
+            sessions = _sessions.values()
         if return_profile_names:
-            profile_names = []
-            for this_session in sessions:
-                if this_session.profile_name and this_session.profile_name not in profile_names:
-                    profile_names.append(this_session.profile_name)
-            return profile_names
+            return _unique([ s.profile_name for s in sessions ])
         elif return_profile_ids:
-            profile_ids = []
-            for this_session in sessions:
-                if this_session.profile_id and this_session.profile_id not in profile_ids:
-                    profile_ids.append(this_session.profile_id)
-            return profile_ids
+            return _unique([ s.profile_id for s in sessions ])
         elif return_session_names:
-            session_names = []
-            for this_session in sessions:
-                if this_session.session_name and this_session.session_name not in session_names:
-                    session_names.append(this_session.session_name)
-            return session_names
+            return _unique([ s.session_name for s in sessions ])
         elif return_objects:
             return sessions
         else:
@@ -854,7 +940,8 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        return [ s for s in self.registered_sessions(return_objects=return_objects, return_profile_names=return_profile_names, return_profile_ids=return_profile_ids, return_session_names=return_session_names) if s not in self.running_sessions(return_objects=return_objects, return_profile_names=return_profile_names, return_profile_ids=return_profile_ids, return_session_names=return_session_names) ]
+        _running = set(self.running_sessions(return_objects=return_objects, return_profile_names=return_profile_names, return_profile_ids=return_profile_ids, return_session_names=return_session_names))
+        return [ s for s in self.registered_sessions(return_objects=return_objects, return_profile_names=return_profile_names, return_profile_ids=return_profile_ids, return_session_names=return_session_names) if s not in _running ]
 
     def connected_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -872,12 +959,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        if return_objects:
-            return self.connected_sessions() and [ s for s in self.connected_sessions() if s.get_profile_name() == profile_name ]
-        elif return_session_names:
-            return self.connected_sessions() and [ s.session_name for s in self.connected_sessions() if s.get_profile_name() == profile_name ]
-        else:
-            return self.connected_sessions() and [ s.get_uuid() for s in self.connected_sessions() if s.get_profile_name() == profile_name ]
+        return self._sessionsWithState('connected', profile_name=profile_name, return_objects=return_objects, return_session_names=return_session_names)
 
     def associated_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -895,12 +977,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        if return_objects:
-            return self.associated_sessions() and [ s for s in self.associated_sessions() if s.get_profile_name() == profile_name ]
-        elif return_session_names:
-            return self.associated_sessions() and [ s.session_name for s in self.associated_sessions() if s.get_profile_name() == profile_name ]
-        else:
-            return self.associated_sessions() and [ s.get_uuid() for s in self.associated_sessions() if s.get_profile_name() == profile_name ]
+        return self._sessionsWithState('associated', profile_name=profile_name, return_objects=return_objects, return_session_names=return_session_names)
 
     def pubapp_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -918,12 +995,13 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
+        _pubapp_sessions = [ s for s in self.associated_sessions_of_profile_name(profile_name) if s.is_published_applications_provider() ]
         if return_objects:
-            return self.associated_sessions_of_profile_name(profile_name) and [ s for s in self.associated_sessions_of_profile_name(profile_name) if s.is_published_applications_provider() ]
+            return _pubapp_sessions
         elif return_session_names:
-            return self.associated_sessions_of_profile_name(profile_name) and [ s.session_name for s in self.associated_sessions_of_profile_name(profile_name) if s.is_published_applications_provider() ]
+            return [ s.session_name for s in _pubapp_sessions ]
         else:
-            return self.associated_sessions_of_profile_name(profile_name) and [ s.get_uuid() for s in self.associated_sessions_of_profile_name(profile_name) if s.is_published_applications_provider() ]
+            return [ s.get_uuid() for s in _pubapp_sessions ]
 
     def registered_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -941,12 +1019,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        if return_objects:
-            return self.registered_sessions() and [ s for s in self.registered_sessions() if s.get_profile_name() == profile_name ]
-        elif return_session_names:
-            return self.registered_sessions() and [ s.session_name for s in self.registered_sessions() if s.get_profile_name() == profile_name ]
-        else:
-            return self.registered_sessions() and [ s.get_uuid() for s in self.registered_sessions() if s.get_profile_name() == profile_name ]
+        return self._sessionsWithState('registered', profile_name=profile_name, return_objects=return_objects, return_session_names=return_session_names)
 
     def virgin_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -965,12 +1038,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        if return_objects:
-            return self.virgin_sessions() and [ s for s in self.virgin_sessions() if s.get_profile_name() == profile_name ]
-        elif return_session_names:
-            return self.virgin_sessions() and [ s.session_name for s in self.virgin_sessions() if s.get_profile_name() == profile_name ]
-        else:
-            return self.virgin_sessions() and [ s.get_uuid() for s in self.virgin_sessions() if s.get_profile_name() == profile_name ]
+        return self._sessionsWithState('virgin', profile_name=profile_name, return_objects=return_objects, return_session_names=return_session_names)
 
     def running_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -988,12 +1056,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        if return_objects:
-            return self.running_sessions() and [ s for s in self.running_sessions() if s.get_profile_name() == profile_name ]
-        elif return_session_names:
-            return self.running_sessions() and [ s.session_name for s in self.running_sessions() if s.get_profile_name() == profile_name ]
-        else:
-            return self.running_sessions() and [ s.get_uuid() for s in self.running_sessions() if s.get_profile_name() == profile_name ]
+        return self._sessionsWithState('running', profile_name=profile_name, return_objects=return_objects, return_session_names=return_session_names)
 
     def suspended_sessions_of_profile_name(self, profile_name, return_objects=True, return_session_names=False):
         """\
@@ -1011,12 +1074,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{list}
 
         """
-        if return_objects:
-            return self.suspended_sessions() and [ s for s in self.suspended_sessions() if s.get_profile_name() == profile_name ]
-        elif return_session_names:
-            return self.suspended_sessions() and [ s.session_name for s in self.suspended_sessions() if s.get_profile_name() == profile_name ]
-        else:
-            return self.suspended_sessions() and [ s.get_uuid() for s in self.suspended_sessions() if s.get_profile_name() == profile_name ]
+        return self._sessionsWithState('suspended', profile_name=profile_name, return_objects=return_objects, return_session_names=return_session_names)
 
     def control_session_of_profile_name(self, profile_name):
         """\
@@ -1029,7 +1087,7 @@ class X2GoSessionRegistry(object):
         @rtype: C{X2GoControlSession*} instance
 
         """
-        _sessions = self.registered_sessions_of_profile_name(profile_name, return_objects=True)
+        _sessions = self._profile_name_index.get(profile_name, {}).values()
         if _sessions:
             session = _sessions[0]
             return session.control_session
@@ -0,0 +1,649 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+Relay engines that move data between the local end of an X2Go tunnel (a
+TCP/IP socket) and its remote end (a Paramiko/SSH channel).
+
+Relay engines read into preallocated buffers (C{recv_into} where the
+underlying object supports it), never drop the remainder of a partial
+C{send()} and account transferred bytes per direction.
+
+Reverse forwarding tunnels service all their channels from one
+L{X2GoMultiplexRelay} loop. The loop only sends what a peer accepts right
+away, the rest of a chunk is handed off to a greenlet, so a slow peer does
+not stall the other channels. Handed-off chunks keep their buffers, these
+are drawn from a bounded L{X2GoRelayBufferPool}.
+
+"""
+__NAME__ = 'x2gorelay-pylib'
+
+# modules
+import copy
+import time
+import threading
+
+# gevent/greenlet
+import gevent
+from gevent import select, socket
+
+# Python X2Go modules
+import log
+import x2go_exceptions
+from defaults import X2GO_RELAY_BUFSIZE as _X2GO_RELAY_BUFSIZE
+from defaults import X2GO_RELAY_BUFFER_POOL_SIZE as _X2GO_RELAY_BUFFER_POOL_SIZE
+from defaults import X2GO_FWTUNNEL_RELAY_ENGINE as _X2GO_FWTUNNEL_RELAY_ENGINE
+
+UPSTREAM = 'upstream'
+"""Relay direction: from the local socket into the Paramiko/SSH channel."""
+DOWNSTREAM = 'downstream'
+"""Relay direction: from the Paramiko/SSH channel into the local socket."""
+
+
+class X2GoRelayStats(object):
+    """\
+    Per-direction byte and iteration counters of a tunnel relay.
+
+    """
+    def __init__(self):
+        self.bytes = { UPSTREAM: 0, DOWNSTREAM: 0, }
+        self.iterations = { UPSTREAM: 0, DOWNSTREAM: 0, }
+        self.started = time.time()
+
+    def account(self, direction, nbytes):
+        """\
+        Account a relayed chunk of data.
+
+        @param direction: either L{UPSTREAM} or L{DOWNSTREAM}
+        @type direction: C{str}
+        @param nbytes: number of bytes that have been relayed
+        @type nbytes: C{int}
+
+        """
+        self.bytes[direction] += nbytes
+        self.iterations[direction] += 1
+
+    def get_stats(self):
+        """\
+        Retrieve a snapshot of the relay counters.
+
+        @return: byte and iteration counters per direction, the relay's uptime in seconds and
+            the average throughput (bytes per second) per direction
+        @rtype: C{dict}
+
+        """
+        _elapsed = max(time.time() - self.started, 0.001)
+        return {
+            'bytes_up': self.bytes[UPSTREAM],
+            'bytes_down': self.bytes[DOWNSTREAM],
+            'iterations_up': self.iterations[UPSTREAM],
+            'iterations_down': self.iterations[DOWNSTREAM],
+            'elapsed': _elapsed,
+            'throughput_up': self.bytes[UPSTREAM] / _elapsed,
+            'throughput_down': self.bytes[DOWNSTREAM] / _elapsed,
+        }
+
+
+def recv_chunk(source, buf, view):
+    """\
+    Receive a chunk of data from a socket or a Paramiko/SSH channel.
+
+    Sockets receive directly into the preallocated buffer C{buf}. Paramiko/SSH
+    channels do not provide C{recv_into}, for them the received string is
+    handed back unmodified (no additional copy).
+
+    @param source: socket or Paramiko/SSH channel to read from
+    @type source: C{obj}
+    @param buf: preallocated receive buffer
+    @type buf: C{bytearray}
+    @param view: a C{memoryview} on C{buf}
+    @type view: C{memoryview}
+
+    @return: a tuple with the received data (C{memoryview} or C{str}) and its length,
+        a length of C{0} signals EOF
+    @rtype: C{tuple}
+
+    """
+    if hasattr(source, 'recv_into'):
+        nbytes = source.recv_into(buf)
+        return view[:nbytes], nbytes
+    data = source.recv(len(buf))
+    return data, len(data)
+
+def send_all(dest, data):
+    """\
+    Send a chunk of data completely, retrying on partial C{send()} results.
+
+    While the receiving end is blocked, the calling greenlet blocks, too. This propagates
+    backpressure to the sending end of the relay instead of buffering unlimitedly.
+
+    @param dest: socket or Paramiko/SSH channel to write to
+    @type dest: C{obj}
+    @param data: data as returned by L{recv_chunk()}
+    @type data: C{memoryview} or C{str}
+
+    @raise socket.error: if the receiving end has been closed
+
+    """
+    if type(data) is memoryview and not hasattr(dest, 'recv_into'):
+        # Paramiko/SSH channels pack data into SSH messages, they need a string
+        data = data.tobytes()
+    _total = len(data)
+    _sent = 0
+    while _sent < _total:
+        _n = dest.send(data[_sent:])
+        if _n <= 0:
+            raise socket.error('relay peer has been closed')
+        _sent += _n
+
+def send_some(dest, data):
+    """\
+    Send as much of a chunk of data as the receiving end accepts without blocking.
+
+    @param dest: socket or Paramiko/SSH channel to write to
+    @type dest: C{obj}
+    @param data: data as returned by L{recv_chunk()}
+    @type data: C{memoryview} or C{str}
+
+    @return: number of bytes sent
+    @rtype: C{int}
+
+    @raise socket.error: if the receiving end has been closed
+
+    """
+    if hasattr(dest, 'send_ready'):
+        # Paramiko/SSH channels block only if the remote window is exhausted
+        if not dest.send_ready():
+            return 0
+        if type(data) is memoryview:
+            data = data.tobytes()
+    else:
+        if not select.select([], [dest], [], 0)[1]:
+            return 0
+    _n = dest.send(data)
+    if _n <= 0:
+        raise socket.error('relay peer has been closed')
+    return _n
+
+
+class X2GoRelayEngine(object):
+    """\
+    Base class of all relay engines. Relay engine implementations have to
+    provide the L{X2GoRelayEngine.relay()} method.
+
+    """
+    def __init__(self, bufsize=_X2GO_RELAY_BUFSIZE, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param bufsize: size of the preallocated relay buffers (per direction)
+        @type bufsize: C{int}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoRelayEngine} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.bufsize = bufsize
+        self.stats = X2GoRelayStats()
+
+    def relay(self, local, remote, keepalive=None):
+        """\
+        Relay data between C{local} and C{remote} until one of them reaches EOF
+        or C{keepalive()} returns C{False}.
+
+        @param local: local end of the tunnel
+        @type local: C{socket} instance
+        @param remote: remote end of the tunnel
+        @type remote: C{paramiko.Channel} instance
+        @param keepalive: a callable that returns C{False} once relaying should stop
+        @type keepalive: C{func}
+
+        @raise socket.error: on I/O errors on any of the two tunnel ends
+
+        """
+        raise x2go_exceptions.X2GoNotImplementedYetException('relay engine %s does not implement relay()' % self.__class__.__name__)
+
+    def get_stats(self):
+        """\
+        Retrieve the byte/iteration counters of this relay engine.
+
+        @return: see L{X2GoRelayStats.get_stats()}
+        @rtype: C{dict}
+
+        """
+        return self.stats.get_stats()
+
+
+class X2GoSelectRelayEngine(X2GoRelayEngine):
+    """\
+    Relay both tunnel directions from one C{select()} loop.
+
+    """
+    select_timeout = 1.0
+
+    def relay(self, local, remote, keepalive=None):
+        """\
+        Relay data between C{local} and C{remote} until one of them reaches EOF
+        or C{keepalive()} returns C{False}.
+
+        @param local: local end of the tunnel
+        @type local: C{socket} instance
+        @param remote: remote end of the tunnel
+        @type remote: C{paramiko.Channel} instance
+        @param keepalive: a callable that returns C{False} once relaying should stop
+        @type keepalive: C{func}
+
+        @raise socket.error: on I/O errors on any of the two tunnel ends
+
+        """
+        _up_buf = bytearray(self.bufsize)
+        _up_view = memoryview(_up_buf)
+        _down_buf = bytearray(self.bufsize)
+        _down_view = memoryview(_down_buf)
+
+        while keepalive is None or keepalive():
+            r, w, x = select.select([local, remote], [], [], self.select_timeout)
+            if local in r:
+                data, nbytes = recv_chunk(local, _up_buf, _up_view)
+                if nbytes == 0:
+                    break
+                send_all(remote, data)
+                self.stats.account(UPSTREAM, nbytes)
+            if remote in r:
+                data, nbytes = recv_chunk(remote, _down_buf, _down_view)
+                if nbytes == 0:
+                    break
+                send_all(local, data)
+                self.stats.account(DOWNSTREAM, nbytes)
+
+
+class X2GoGreenletRelayEngine(X2GoRelayEngine):
+    """\
+    Relay each tunnel direction in its own greenlet. A stalled receiver only
+    blocks its own direction.
+
+    """
+    def _pump(self, source, dest, direction, keepalive=None):
+        """\
+        Relay one direction of the tunnel.
+
+        """
+        _buf = bytearray(self.bufsize)
+        _view = memoryview(_buf)
+        while keepalive is None or keepalive():
+            data, nbytes = recv_chunk(source, _buf, _view)
+            if nbytes == 0:
+                break
+            send_all(dest, data)
+            self.stats.account(direction, nbytes)
+
+    def relay(self, local, remote, keepalive=None):
+        """\
+        Relay data between C{local} and C{remote} until one of them reaches EOF
+        or C{keepalive()} returns C{False}.
+
+        @param local: local end of the tunnel
+        @type local: C{socket} instance
+        @param remote: remote end of the tunnel
+        @type remote: C{paramiko.Channel} instance
+        @param keepalive: a callable that returns C{False} once relaying should stop
+        @type keepalive: C{func}
+
+        @raise socket.error: on I/O errors on any of the two tunnel ends
+
+        """
+        _pumps = [
+            gevent.spawn(self._pump, local, remote, UPSTREAM, keepalive),
+            gevent.spawn(self._pump, remote, local, DOWNSTREAM, keepalive),
+        ]
+        # as soon as one direction is done, the tunnel is done...
+        gevent.joinall(_pumps, count=1)
+        gevent.killall(_pumps)
+        for _pump in _pumps:
+            if isinstance(_pump.exception, socket.error):
+                raise _pump.exception
+
+
+X2GO_RELAY_ENGINES = {
+    'select': X2GoSelectRelayEngine,
+    'greenlet': X2GoGreenletRelayEngine,
+}
+"""Available relay engines (by name)."""
+
+def get_relay_engine(engine=None, bufsize=_X2GO_RELAY_BUFSIZE, logger=None):
+    """\
+    Instantiate a relay engine.
+
+    @param engine: name of a relay engine in L{X2GO_RELAY_ENGINES} or a L{X2GoRelayEngine}
+        (sub)class, if C{None} the default forwarding tunnel relay engine is used
+    @type engine: C{str} or C{class}
+    @param bufsize: size of the preallocated relay buffers (per direction)
+    @type bufsize: C{int}
+    @param logger: an X2GoLogger object
+    @type logger: C{obj}
+
+    @return: a new relay engine instance
+    @rtype: L{X2GoRelayEngine}
+
+    @raise X2GoFwTunnelException: if the given relay engine is unknown
+
+    """
+    if engine is None:
+        engine = _X2GO_FWTUNNEL_RELAY_ENGINE
+    if type(engine) in (str, unicode):
+        try:
+            engine = X2GO_RELAY_ENGINES[engine]
+        except KeyError:
+            raise x2go_exceptions.X2GoFwTunnelException('unknown relay engine: %s' % engine)
+    return engine(bufsize=bufsize, logger=logger)
+
+
+class X2GoRelayBufferPool(object):
+    """\
+    A bounded pool of reusable relay buffers.
+
+    Buffers are allocated on demand until C{maxbuffers} buffers exist, after that
+    L{X2GoRelayBufferPool.acquire()} blocks until a buffer gets released again.
+
+    """
+    def __init__(self, bufsize=_X2GO_RELAY_BUFSIZE, maxbuffers=_X2GO_RELAY_BUFFER_POOL_SIZE):
+        """\
+        @param bufsize: size of each buffer in the pool
+        @type bufsize: C{int}
+        @param maxbuffers: maximum number of buffers in the pool
+        @type maxbuffers: C{int}
+
+        """
+        self.bufsize = bufsize
+        self.maxbuffers = maxbuffers
+        self.allocated = 0
+        self._free_buffers = []
+        self._pool_lock = threading.Lock()
+        self._available = threading.Semaphore(maxbuffers)
+
+    def acquire(self, blocking=True):
+        """\
+        Take a buffer from the pool.
+
+        @param blocking: wait until a buffer has been returned to the pool if all are in use
+        @type blocking: C{bool}
+
+        @return: a relay buffer, return it to the pool with L{X2GoRelayBufferPool.release()};
+            C{None} if all buffers are in use and C{blocking} is C{False}
+        @rtype: C{bytearray}
+
+        """
+        if not self._available.acquire(blocking):
+            return None
+        self._pool_lock.acquire()
+        try:
+            if self._free_buffers:
+                return self._free_buffers.pop()
+            self.allocated += 1
+        finally:
+            self._pool_lock.release()
+        return bytearray(self.bufsize)
+
+    def release(self, buf):
+        """\
+        Return a buffer to the pool.
+
+        @param buf: a buffer previously obtained via L{X2GoRelayBufferPool.acquire()}
+        @type buf: C{bytearray}
+
+        """
+        self._pool_lock.acquire()
+        try:
+            self._free_buffers.append(buf)
+        finally:
+            self._pool_lock.release()
+        self._available.release()
+
+
+_buffer_pool = None
+
+def get_buffer_pool():
+    """\
+    Retrieve the relay buffer pool that is shared by all reverse forwarding tunnels.
+
+    @return: the shared relay buffer pool
+    @rtype: L{X2GoRelayBufferPool}
+
+    """
+    global _buffer_pool
+    if _buffer_pool is None:
+        _buffer_pool = X2GoRelayBufferPool()
+    return _buffer_pool
+
+
+class X2GoMultiplexRelay(threading.Thread):
+    """\
+    Relay an arbitrary number of socket/channel pairs from one C{select()} loop.
+
+    Each socket/channel pair is registered under a key via L{X2GoMultiplexRelay.add_channel()}
+    and gets relayed until one of its ends reaches EOF, fails or the pair gets removed via
+    L{X2GoMultiplexRelay.remove_channel()}.
+
+    Data that a peer does not accept right away is sent by a greenlet of its own. Until that
+    greenlet is done, the sending end of that direction is not read from anymore (backpressure),
+    all other directions and channels keep going.
+
+    """
+    select_timeout = .5
+    # poll interval while handed-off sends are in progress or the buffer pool is exhausted
+    busy_timeout = .01
+
+    def __init__(self, buffer_pool=None, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param buffer_pool: the buffer pool to draw relay buffers from, if C{None} the
+            shared buffer pool (see L{get_buffer_pool()}) is used
+        @type buffer_pool: L{X2GoRelayBufferPool}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoMultiplexRelay} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        if buffer_pool is None:
+            buffer_pool = get_buffer_pool()
+        self.buffer_pool = buffer_pool
+
+        self.channels = {}
+        self.stats = {}
+        self._endpoints = {}
+        self._sending = {}
+        self._channels_lock = threading.Lock()
+        self._has_channels = threading.Event()
+        self._keepalive = True
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+    def add_channel(self, key, local, remote):
+        """\
+        Start relaying data between C{local} and C{remote}.
+
+        @param key: a unique identifier for the socket/channel pair
+        @type key: C{str}
+        @param local: local end of the tunnel
+        @type local: C{socket} instance
+        @param remote: remote end of the tunnel
+        @type remote: C{paramiko.Channel} instance
+
+        """
+        self._channels_lock.acquire()
+        try:
+            self.channels[key] = (local, remote)
+            self.stats[key] = X2GoRelayStats()
+            self._endpoints[local] = (key, remote, UPSTREAM)
+            self._endpoints[remote] = (key, local, DOWNSTREAM)
+            self._has_channels.set()
+        finally:
+            self._channels_lock.release()
+
+    def remove_channel(self, key):
+        """\
+        Stop relaying a socket/channel pair and close both of its ends.
+
+        @param key: the identifier the socket/channel pair has been added with
+        @type key: C{str}
+
+        """
+        self._channels_lock.acquire()
+        try:
+            if not self.channels.has_key(key):
+                return
+            (local, remote) = self.channels[key]
+            del self.channels[key]
+            del self._endpoints[local]
+            del self._endpoints[remote]
+            _stats = self.stats[key].get_stats()
+            del self.stats[key]
+            if not self.channels:
+                self._has_channels.clear()
+        finally:
+            self._channels_lock.release()
+
+        for _endpoint in (remote, local):
+            try:
+                _endpoint.close()
+            except (socket.error, EOFError):
+                pass
+        self.logger('relay channel %s closed after %s bytes upstream / %s bytes downstream' % (key, _stats['bytes_up'], _stats['bytes_down']), loglevel=log.loglevel_DEBUG)
+
+    def close_all(self):
+        """\
+        Stop relaying and close all registered socket/channel pairs.
+
+        """
+        for key in self.channels.keys():
+            self.remove_channel(key)
+
+    def get_stats(self):
+        """\
+        Retrieve per-channel relay counters.
+
+        @return: a dictionary with the channel keys as keys and their relay counters
+            (see L{X2GoRelayStats.get_stats()}) as values
+        @rtype: C{dict}
+
+        """
+        self._channels_lock.acquire()
+        try:
+            return dict([ (key, stats.get_stats()) for (key, stats) in self.stats.items() ])
+        finally:
+            self._channels_lock.release()
+
+    def stop_thread(self):
+        """\
+        Stop the relay loop and close all registered socket/channel pairs.
+
+        """
+        self._keepalive = False
+        self.close_all()
+        self._has_channels.set()
+
+    def _send_rest(self, key, peer, buf, data):
+        """\
+        Greenlet: send the part of a chunk that a peer has not accepted right away.
+
+        """
+        try:
+            send_all(peer, data)
+        except socket.error, e:
+            self.logger('relay channel %s encountered an error: %s' % (key, str(e)), loglevel=log.loglevel_WARN)
+            self.remove_channel(key)
+        finally:
+            del self._sending[peer]
+            self.buffer_pool.release(buf)
+
+    def run(self):
+        """\
+        The relay loop. It gets run once the L{X2GoMultiplexRelay} has been started
+        with its C{start()} method.
+
+        """
+        _starved = False
+        while self._keepalive:
+
+            self._has_channels.wait()
+
+            self._channels_lock.acquire()
+            # endpoints whose peer is still busy with a handed-off chunk are not read from
+            _endpoints = [ _endpoint for (_endpoint, (_key, _peer, _direction)) in self._endpoints.items() if not self._sending.has_key(_peer) ]
+            self._channels_lock.release()
+
+            _timeout = (self._sending or _starved) and self.busy_timeout or self.select_timeout
+            _starved = False
+            if not _endpoints:
+                gevent.sleep(_timeout)
+                continue
+
+            try:
+                r, w, x = select.select(_endpoints, [], [], _timeout)
+            except (select.error, socket.error, ValueError):
+                # an endpoint has been closed by another thread, it is gone from the
+                # endpoint list in the next iteration
+                continue
+
+            for _endpoint in r:
+                try:
+                    (_key, _peer, _direction) = self._endpoints[_endpoint]
+                except KeyError:
+                    continue
+
+                _buf = self.buffer_pool.acquire(blocking=False)
+                if _buf is None:
+                    # sends to slow peers hold all buffers, try again shortly
+                    _starved = True
+                    break
+                try:
+                    data, nbytes = recv_chunk(_endpoint, _buf, memoryview(_buf))
+                    if nbytes == 0:
+                        self.remove_channel(_key)
+                        continue
+                    _stats = self.stats.get(_key)
+                    if _stats is not None:
+                        _stats.account(_direction, nbytes)
+                    _sent = send_some(_peer, data)
+                    if _sent < nbytes:
+                        # the buffer goes with the handed-off chunk
+                        self._sending[_peer] = gevent.spawn(self._send_rest, _key, _peer, _buf, data[_sent:])
+                        _buf = None
+                except socket.error, e:
+                    self.logger('relay channel %s encountered an error: %s' % (_key, str(e)), loglevel=log.loglevel_WARN)
+                    self.remove_channel(_key)
+                finally:
+                    if _buf is not None:
+                        self.buffer_pool.release(_buf)
@@ -34,6 +34,7 @@ from gevent import select, socket, Timeout
 
 # Python X2Go modules
 import log
+import relay
 
 
 def x2go_transport_tcp_handler(chan, (origin_addr, origin_port), (server_addr, server_port)):
@@ -49,8 +50,8 @@ def x2go_transport_tcp_handler(chan, (origin_addr, origin_port), (server_addr, s
     (currently supported: reverse tunneling auf audio data, reverse tunneling of SSH requests).
 
     If the server port of an incoming Paramiko/SSH channel matches the configured port of an L{X2GoRevFwTunnel} 
-    instance, this instance gets notified of the incoming channel and a new L{X2GoRevFwChannelThread} is 
-    started. This L{X2GoRevFwChannelThread} then takes care of the new channel's incoming data stream.
+    instance, this instance gets notified of the incoming channel and hands the new channel over to its
+    L{relay.X2GoMultiplexRelay} which then takes care of the new channel's data stream.
 
     """
     transport = chan.get_transport()
@@ -75,6 +76,8 @@ class X2GoRevFwTunnel(threading.Thread):
     through Paramiko/SSH.
 
     """
+    multiplex_relay = None
+
     def __init__(self, server_port, remote_host, remote_port, ssh_transport, session_instance=None, logger=None, loglevel=log.loglevel_DEFAULT):
         """\
         Setup a reverse tunnel through Paramiko/SSH.
@@ -115,7 +118,7 @@ class X2GoRevFwTunnel(threading.Thread):
         self.ssh_transport = ssh_transport
         self.session_instance = session_instance
 
-        self.open_channels = {}
+        self.multiplex_relay = relay.X2GoMultiplexRelay(logger=self.logger)
         self.incoming_channel = threading.Condition()
 
         threading.Thread.__init__(self)
@@ -160,6 +163,8 @@ class X2GoRevFwTunnel(threading.Thread):
         if self._accept_channels == True:
             self.cancel_port_forward('', self.server_port)
             self._accept_channels = False
+            if self.multiplex_relay is not None:
+                self.multiplex_relay.close_all()
             self.logger('paused thread: %s' % repr(self), loglevel=log.loglevel_DEBUG)
 
     def resume(self):
@@ -197,9 +202,24 @@ class X2GoRevFwTunnel(threading.Thread):
         """
         self.pause()
         self._keepalive = False
+        if self.multiplex_relay is not None:
+            self.multiplex_relay.stop_thread()
         self.logger('stopping thread: %s' % repr(self), loglevel=log.loglevel_DEBUG)
         self.notify()
 
+    def get_channel_stats(self):
+        """\
+        Retrieve throughput statistics of all open channels of this reverse forwarding tunnel.
+
+        @return: a dictionary with the channels' origin addresses as keys and their relay
+            counters (see L{relay.X2GoRelayStats.get_stats()}) as values
+        @rtype: C{dict}
+
+        """
+        if self.multiplex_relay is not None:
+            return self.multiplex_relay.get_stats()
+        return {}
+
     def _request_port_forwarding(self):
         try:
             self._requested_port = self.ssh_transport.request_port_forward('127.0.0.1', self.server_port, handler=x2go_transport_tcp_handler)
@@ -228,9 +248,10 @@ class X2GoRevFwTunnel(threading.Thread):
         this context means, that its start point on the X2Go server matches the class's
         property C{server_port}.
 
-        Once a new incoming channel gets announced by the L{notify()} method, a new 
-        L{X2GoRevFwChannelThread} instance will be initialized. As a data stream handler,
-        the function L{x2go_rev_forward_channel_handler()} will be used.
+        Once a new incoming channel gets announced by the L{notify()} method, it gets
+        connected to the tunnel's endpoint and handed over to the tunnel's
+        L{relay.X2GoMultiplexRelay} that relays the data streams of all channels of this
+        tunnel.
 
         The channel will last till the connection gets dropped on the X2Go server side or 
         until the tunnel gets paused by an L{X2GoRevFwTunnel.pause()} call or stopped via the
@@ -239,6 +260,7 @@ class X2GoRevFwTunnel(threading.Thread):
         """
         self._request_port_forwarding()
         self._keepalive = True
+        self.multiplex_relay.start()
         while self._keepalive:
 
             self.incoming_channel.acquire()
@@ -255,88 +277,38 @@ class X2GoRevFwTunnel(threading.Thread):
 
             self.incoming_channel.release()
             if self._accept_channels and self._keepalive:
-                _new_chan_thread = X2GoRevFwChannelThread(_chan, (self.remote_host, self.remote_port), 
-                                                          target=x2go_rev_forward_channel_handler, 
-                                                          kwargs={ 
-                                                            'chan': _chan,
-                                                            'addr': self.remote_host,
-                                                            'port': self.remote_port,
-                                                            'parent_thread': self, 
-                                                            'logger': self.logger, 
-                                                          }
-                                                  )
-                _new_chan_thread.start()
-                self.open_channels['[%s]:%s' % _chan.origin_addr] = _new_chan_thread
-
-
-def x2go_rev_forward_channel_handler(chan=None, addr='', port=0, parent_thread=None, logger=None, ):
-    """\
-    Handle the data stream of a requested channel that got set up by a L{X2GoRevFwTunnel} (Paramiko/SSH 
-    reverse forwarding tunnel).
-
-    The channel (and the corresponding connections) close either ...
-
-        - ... if the connecting application closes the connection and thus, drops 
-        the channel, or
-        - ... if the L{X2GoRevFwTunnel} parent thread gets paused. The call
-        of L{X2GoRevFwTunnel.pause()} on the instance can be used to shut down all incoming 
-        tunneled SSH connections associated to this L{X2GoRevFwTunnel} instance
-        from within a Python X2Go application.
-
-    @param chan: channel
-    @type chan: C{class}
-    @param addr: bind address
-    @type addr: C{str}
-    @param port: bind port
-    @type port: C{int}
-    @param parent_thread: the calling L{X2GoRevFwTunnel} instance
-    @type parent_thread: L{X2GoRevFwTunnel} instance
-    @param logger: you can pass an L{X2GoLogger} object to the
-        L{X2GoRevFwTunnel} constructor
-    @type logger: L{X2GoLogger} instance
+                self._relay_channel(_chan)
+
+    def _relay_channel(self, chan):
+        """\
+        Connect an incoming channel to the tunnel's endpoint and register the resulting
+        socket/channel pair with the tunnel's relay.
+
+        @param chan: incoming Paramiko/SSH channel
+        @type chan: C{paramiko.Channel} instance
+
+        """
+        fw_socket = socket.socket()
+        fw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-    """
-    fw_socket = socket.socket()
-    fw_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-    if logger is None:
-        def _dummy_logger(msg, l):
-            pass
-        logger = _dummy_logger
-
-    try:
-        fw_socket.connect((addr, port))
-    except Exception, e:
-        logger('Reverse forwarding request to %s:%d failed: %r' % (addr, port, e), loglevel=log.loglevel_INFO)
-        return
-
-    logger('Connected! Reverse tunnel open %r -> %r -> %r' % (chan.origin_addr,
-                                                              chan.getpeername(), (addr, port)), 
-                                                              loglevel=log.loglevel_INFO)
-    while parent_thread._accept_channels:
-        r, w, x = select.select([fw_socket, chan], [], [])
         try:
-            if fw_socket in r:
-                data = fw_socket.recv(1024)
-                if len(data) == 0:
-                    break
-                chan.send(data)
-            if chan in r:
-                data = chan.recv(1024)
-                if len(data) == 0:
-                    break
-                fw_socket.send(data)
-        except socket.error, e:
-            logger('Reverse tunnel %s encoutered socket error: %s' % (chan, str(e)), loglevel=log.loglevel_WARN)
-
-    chan.close()
-    fw_socket.close()
-    logger('Reverse tunnel %s closed from %r' % (chan, chan.origin_addr,), loglevel=log.loglevel_INFO)
+            fw_socket.connect((self.remote_host, self.remote_port))
+        except Exception, e:
+            self.logger('Reverse forwarding request to %s:%d failed: %r' % (self.remote_host, self.remote_port, e), loglevel=log.loglevel_INFO)
+            chan.close()
+            return
+
+        self.logger('Connected! Reverse tunnel open %r -> %r -> %r' % (chan.origin_addr,
+                                                                       chan.getpeername(), (self.remote_host, self.remote_port)), 
+                                                                       loglevel=log.loglevel_INFO)
+        self.multiplex_relay.add_channel('[%s]:%s' % chan.origin_addr, fw_socket, chan)
 
 
 class X2GoRevFwChannelThread(threading.Thread):
     """\
-    Starts a thread for each incoming Paramiko/SSH data channel trough the reverse
-    forwarding tunnel.
+    Starts a thread for an incoming Paramiko/SSH data channel trough a reverse
+    forwarding tunnel (used by tunnels that do not relay their channels, e.g.
+    L{sftpserver.X2GoRevFwTunnelToSFTP}).
 
     """
     def __init__(self, channel, remote=None, **kwargs):
@@ -69,6 +69,8 @@ import defaults
 import log
 import utils
 import session
+import netmonitor
+import subsystems
 import x2go_exceptions
 
 from defaults import X2GOCLIENT_OS as _X2GOCLIENT_OS
@@ -76,6 +78,8 @@ from defaults import LOCAL_HOME as _LOCAL_HOME
 from defaults import X2GO_CLIENT_ROOTDIR as _X2GO_CLIENT_ROOTDIR
 from defaults import X2GO_SESSIONS_ROOTDIR as _X2GO_SESSIONS_ROOTDIR
 from defaults import X2GO_SSH_ROOTDIR as _X2GO_SSH_ROOTDIR
+from defaults import X2GO_NETMONITOR_INTERVAL as _X2GO_NETMONITOR_INTERVAL
+from defaults import X2GO_SUBSYSTEM_WAIT_TIMEOUT as _X2GO_SUBSYSTEM_WAIT_TIMEOUT
 
 from defaults import BACKENDS as _BACKENDS
 
@@ -129,6 +133,11 @@ class X2GoSession(object):
     sessions etc.).
 
     """
+    # attributes the L{X2GoSessionRegistry} maintains its lookup indexes on
+    _INDEXED_ATTRIBUTES = ('virgin', 'connected', 'running', 'suspended', 'terminated', 'terminal_session',
+                           'profile_name', 'profile_id', 'session_name', )
+    _index_observer = None
+
     def __init__(self, server=None, port=22, control_session=None,
                  use_sshproxy=False,
                  sshproxy_reuse_authinfo=False,
@@ -359,6 +368,8 @@ class X2GoSession(object):
         self.master_session = None
         self.init_control_session()
         self.terminal_session = None
+        self.network_monitor = None
+        self.subsystem_launcher = None
 
         if self.is_connected():
             self.retrieve_server_features()
@@ -423,6 +434,16 @@ class X2GoSession(object):
             self.get_terminal_session().__del__()
             self.terminal_session = None
 
+    def __setattr__(self, name, value):
+        """\
+        Notify the observing L{X2GoSessionRegistry} (if any) about changes of indexed
+        session attributes (session state, profile and session name).
+
+        """
+        object.__setattr__(self, name, value)
+        if name in self._INDEXED_ATTRIBUTES and self._index_observer is not None:
+            self._index_observer(self)
+
     def get_client_instance(self):
         """\
         Return parent L{X2GoClient} instance if avaiable.
@@ -434,6 +455,16 @@ class X2GoSession(object):
         return self.client_instance
     __get_client_instance = get_client_instance
 
+    def _trigger_guardian_refresh(self):
+        """\
+        Ask the parent L{X2GoClient}'s session guardian to refresh this session's profile soon,
+        the server-side session list has just changed.
+
+        """
+        _guardian = getattr(self.client_instance, 'session_guardian', None)
+        if _guardian is not None:
+            _guardian.trigger_refresh(self.profile_name)
+
     def HOOK_on_control_session_death(self):
         """\
         HOOK method: called if a control session (server connection) has unexpectedly encountered a failure.
@@ -542,6 +573,19 @@ class X2GoSession(object):
         else:
             self.logger('HOOK_forwarding_tunnel_setup_failed: Forwarding tunnel request to [%s]:%s for session %s (%s) was denied by remote X2Go/SSH server. Subsystem (%s) startup failed.' % (chain_host, chain_port, self.session_name, self.profile_name, _subsystem), loglevel=log.loglevel_WARN)
 
+    def HOOK_network_quality_update(self, stats):
+        """\
+        HOOK method: called each time the network quality monitor of this session has taken a sample.
+
+        @param stats: the network quality statistics (see L{X2GoSession.get_network_quality()})
+        @type stats: C{dict}
+
+        """
+        if self.client_instance:
+            self.client_instance.HOOK_network_quality_update(profile_name=self.profile_name, session_name=self.session_name, stats=stats)
+        else:
+            self.logger('HOOK_network_quality_update: network quality of session %s (%s): round trip time %s' % (self.session_name, self.profile_name, stats['rtt']), loglevel=log.loglevel_DEBUG)
+
     def HOOK_printing_not_available(self):
         """\
         HOOK method: called if X2Go client-side printing is not available.
@@ -610,6 +654,7 @@ class X2GoSession(object):
 
         """
         low_latency = self.terminal_params.has_key('link') and self.terminal_params['link'].lower() in ('modem', 'isdn')
+        auto_link = self.terminal_params.has_key('link') and self.terminal_params['link'].lower() == 'auto'
 
         if self.control_session is None:
             self.logger('initializing X2GoControlSession', loglevel=log.loglevel_DEBUG)
@@ -625,9 +670,11 @@ class X2GoSession(object):
                                                         sessions_rootdir=self.sessions_rootdir,
                                                         ssh_rootdir=self.ssh_rootdir,
                                                         low_latency=low_latency,
+                                                        auto_link=auto_link,
                                                         logger=self.logger)
         else:
             self.control_session.low_latency = low_latency
+            self.control_session.auto_link = auto_link
     __init_control_session = init_control_session
 
     def is_master_session(self):
@@ -1360,6 +1407,7 @@ class X2GoSession(object):
             self.get_server_hostname()
 
         if self.connected:
+            self.control_session.start_liveness_monitor(on_death=self._on_control_session_death)
             self.update_status()
             self.retrieve_server_features()
             if self.auto_start_or_resume:
@@ -1383,6 +1431,7 @@ class X2GoSession(object):
         self.faults = None
         self.active = False
         self._lock.release()
+        self.stop_network_monitor()
         self.unset_master_session()
         try:
             self.update_status(force_update=True)
@@ -1479,8 +1528,9 @@ class X2GoSession(object):
         @rtype: C{bool}
 
         """
+        _was_connected = self.connected
         self.connected = self.control_session.is_alive()
-        if self.control_session.has_session_died():
+        if self.control_session.has_session_died() and _was_connected:
             self.HOOK_on_control_session_death()
         if not self.connected:
             self._X2GoSession__disconnect()
@@ -1801,6 +1851,8 @@ class X2GoSession(object):
             raise
         finally:
             self._lock.release()
+        if _retval:
+            self._trigger_guardian_refresh()
         return _retval
 
     def _resume(self, session_name=None, session_list=None, cmd=None, progress_event=None):
@@ -1854,9 +1906,8 @@ class X2GoSession(object):
             self._progress_status = 7
             progress_event.set()
 
-            # FIXME: normally this part gets called if you suspend a session that is associated to another client
-            # we do not have a possibility to really check if SSH has released port forwarding channels or
-            # sockets, thus  we plainly have to wait a while
+            # if the session is associated to another client, it gets suspended first; the other client's
+            # port forwarding channels are gone once the server reports the session as suspended
 
             try:
                 _control.test_sftpclient()
@@ -1877,8 +1928,10 @@ class X2GoSession(object):
                     progress_event.set()
 
                     self._lock.release()
-                    gevent.sleep(5)
-                    self._lock.acquire()
+                    try:
+                        _control.wait_for_session_state(self.session_name, states=('S', ))
+                    finally:
+                        self._lock.acquire()
 
                     self._progress_status = 15
                     progress_event.set()
@@ -1937,65 +1990,17 @@ class X2GoSession(object):
                 self._progress_status = 35
                 progress_event.set()
 
-                if self._SUPPORTED_SOUND and self.terminal_session.params.snd_system is not 'none':
-                    self.has_terminal_session() and not self.faulty and self.terminal_session.start_sound()
-                else:
-                    self._SUPPORTED_SOUND = False
-
-                self._progress_status = 40
-                progress_event.set()
-
-                if self._SUPPORTED_TELEKINESIS and self.has_terminal_session() and not self.faulty:
-                    gevent.spawn(self.terminal_session.start_telekinesis)
+                # the session window does not wait for sound, folder sharing, printing, etc.
+                self.start_subsystems()
 
                 self._progress_status = 50
                 progress_event.set()
 
-                try:
-                    if (self._SUPPORTED_PRINTING and self.printing) or \
-                       (self._SUPPORTED_MIMEBOX and self.allow_mimebox) or \
-                       (self._SUPPORTED_FOLDERSHARING and self.allow_share_local_folders):
-                        self.has_terminal_session() and not self.faulty and self.terminal_session.start_sshfs()
-                except x2go_exceptions.X2GoUserException, e:
-                    self.logger('%s' % str(e), loglevel=log.loglevel_WARN)
-                    self.HOOK_sshfs_not_available()
-                    self._SUPPORTED_PRINTING = False
-                    self._SUPPORTED_MIMEBOX = False
-                    self._SUPPORTED_FOLDERSHARING = False
-
-                self._progress_status = 60
-                progress_event.set()
-
+                # the spool directories are known beforehand, the session command can be given them right away
                 if self._SUPPORTED_PRINTING and self.printing:
-                    try:
-                        self.has_terminal_session() and not self.faulty and self.terminal_session.start_printing()
-                        self.has_terminal_session() and not self.faulty and self.session_environment.update({'X2GO_SPOOLDIR': self.terminal_session.get_printing_spooldir(), })
-                    except (x2go_exceptions.X2GoUserException, x2go_exceptions.X2GoSFTPClientException), e:
-                        self.logger('%s' % str(e), loglevel=log.loglevel_WARN)
-                        self.HOOK_printing_not_available()
-                        self._SUPPORTED_PRINTING = False
-                    except x2go_exceptions.X2GoControlSessionException, e:
-                        self.logger('%s' % str(e), loglevel=log.loglevel_ERROR)
-                        self.HOOK_on_control_session_death()
-                        self._X2GoSession__disconnect()
-                        return False
-
-                self._progress_status = 70
-                progress_event.set()
-
+                    self.session_environment.update({'X2GO_SPOOLDIR': self.terminal_session.get_printing_spooldir(), })
                 if self._SUPPORTED_MIMEBOX and self.allow_mimebox:
-                    try:
-                        self.has_terminal_session() and not self.faulty and self.terminal_session.start_mimebox(mimebox_extensions=self.mimebox_extensions, mimebox_action=self.mimebox_action)
-                        self.has_terminal_session() and self.session_environment.update({'X2GO_MIMEBOX': self.terminal_session.get_mimebox_spooldir(), })
-                    except (x2go_exceptions.X2GoUserException, x2go_exceptions.X2GoSFTPClientException), e:
-                        self.logger('%s' % str(e), loglevel=log.loglevel_WARN)
-                        self.HOOK_mimebox_not_available()
-                        self._SUPPORTED_MIMEBOX = False
-                    except x2go_exceptions.X2GoControlSessionException, e:
-                        self.logger('%s' % str(e), loglevel=log.loglevel_ERROR)
-                        self.HOOK_on_control_session_death()
-                        self._X2GoSession__disconnect()
-                        return False
+                    self.session_environment.update({'X2GO_MIMEBOX': self.terminal_session.get_mimebox_spooldir(), })
 
                 self._progress_status = 80
                 progress_event.set()
@@ -2013,16 +2018,26 @@ class X2GoSession(object):
                 self._progress_status = 90
                 progress_event.set()
 
+                self.start_network_monitor()
+
                 # if self.client_instance exists than the folder sharing is handled via the self.set_master_session() evoked by the session registry
                 if (not self.client_instance) and \
                    self._SUPPORTED_FOLDERSHARING and \
                    self.allow_share_local_folders:
-                        gevent.spawn(self.share_all_local_folders)
+                        self.subsystem_launcher.add('folders', self.share_all_local_folders, requires=('sshfs', ))
+                        self.subsystem_launcher.start()
 
                 self._progress_status = 100
                 progress_event.set()
 
-                self.has_terminal_session() and self.terminal_session.session_info_unprotect()
+                # keep the session info unchanged until all subsystems have come up (or have taken too long),
+                # the terminal session is captured here as it may get replaced while we wait
+                _launcher = self.subsystem_launcher
+                _terminal_session = self.terminal_session
+                def _unprotect_session_info():
+                    _launcher.wait(timeout=_X2GO_SUBSYSTEM_WAIT_TIMEOUT)
+                    _terminal_session.session_info_unprotect()
+                gevent.spawn(_unprotect_session_info)
                 return True
 
             else:
@@ -2097,6 +2112,8 @@ class X2GoSession(object):
             raise
         finally:
             self._lock.release()
+        if _retval:
+            self._trigger_guardian_refresh()
         return _retval
 
     def _share_desktop(self, desktop=None, user=None, display=None, share_mode=0, check_desktop_list=True, progress_event=None):
@@ -2205,6 +2222,8 @@ class X2GoSession(object):
                 self.terminated = False
                 self.faulty = False
 
+                self.start_network_monitor()
+
                 self._progress_status = 100
                 progress_event.set()
 
@@ -2291,6 +2310,8 @@ class X2GoSession(object):
             raise
         finally:
             self._lock.release()
+        if _retval:
+            self._trigger_guardian_refresh()
         return _retval
 
     def _suspend(self):
@@ -2362,6 +2383,8 @@ class X2GoSession(object):
             raise
         finally:
             self._lock.release()
+        if _retval:
+            self._trigger_guardian_refresh()
         return _retval
 
     def _terminate(self):
@@ -2627,6 +2650,12 @@ class X2GoSession(object):
 
         retval = False
         if self.has_terminal_session():
+
+            # folder sharing may still be coming up in the background
+            _launcher = self.subsystem_launcher
+            if _launcher is not None and _launcher.subsystems.has_key('sshfs'):
+                _launcher.wait(['sshfs'], timeout=_X2GO_SUBSYSTEM_WAIT_TIMEOUT)
+
             if self.is_folder_sharing_available() and self.is_master_session():
 
                 # for the sake of non-blocking I/O: let's pretend the action has already been successful
@@ -2862,11 +2891,192 @@ class X2GoSession(object):
         return None
     __is_locked = is_locked
 
+    def start_network_monitor(self, interval=_X2GO_NETMONITOR_INTERVAL):
+        """\
+        Start sampling the round trip time and tunnel throughput of this session's
+        connection. A monitor that is already running gets restarted.
+
+        @param interval: sampling interval (in seconds), C{0} disables the network quality monitor
+        @type interval: C{float}
+
+        """
+        self.stop_network_monitor()
+        if not interval or not self.has_control_session() or not self.has_terminal_session():
+            return
+        # a running liveness monitor times round trips anyway, only one stream of probes goes over the connection
+        _rtt_buffer = None
+        if self.control_session.liveness_monitor is not None:
+            _rtt_buffer = self.control_session.liveness_monitor.rtt
+        self.network_monitor = netmonitor.X2GoNetworkMonitor(self.control_session.get_transport(),
+                                                             byte_counters=self.terminal_session.get_tunnel_byte_counters,
+                                                             interval=interval,
+                                                             rtt_buffer=_rtt_buffer,
+                                                             on_sample=self.HOOK_network_quality_update,
+                                                             logger=self.logger,
+                                                            )
+        self.network_monitor.start()
+    __start_network_monitor = start_network_monitor
+
+    def stop_network_monitor(self):
+        """\
+        Stop sampling the network quality of this session.
+
+        """
+        if self.network_monitor is not None:
+            self.network_monitor.stop_thread()
+            self.network_monitor = None
+    __stop_network_monitor = stop_network_monitor
+
+    def get_network_quality(self):
+        """\
+        Retrieve the network quality statistics of this session: SSH round trip times (in seconds)
+        and tunnel throughput (in bytes per second) of the latest samples.
+
+        @return: dictionary with the keys C{samples}, C{failures}, C{interval}, C{rtt}, C{throughput_up}
+            and C{throughput_down} (see L{netmonitor.X2GoNetworkMonitor.get_stats()}), C{None} if the
+            network quality of this session is not being monitored
+        @rtype: C{dict}
+
+        """
+        if self.network_monitor is not None:
+            return self.network_monitor.get_stats()
+        return None
+    __get_network_quality = get_network_quality
+
+    def get_liveness_stats(self):
+        """\
+        Retrieve the liveness statistics of this session's server connection: probes sent,
+        probes missed and SSH round trip times (in seconds).
+
+        @return: see L{liveness.X2GoLivenessMonitor.get_stats()}, C{None} if the server connection
+            is not being probed
+        @rtype: C{dict}
+
+        """
+        if self.has_control_session():
+            return self.control_session.get_liveness_stats()
+        return None
+    __get_liveness_stats = get_liveness_stats
+
+    def _on_control_session_death(self):
+        """\
+        Handle a server connection that has been found dead by the control session's liveness monitor.
+
+        """
+        # another code path may be disconnecting this session right now, only one of them notifies and disconnects
+        self._lock.acquire()
+        if not self.connected:
+            self._lock.release()
+            return
+        self.HOOK_on_control_session_death()
+        self._X2GoSession__disconnect()
+
+    def _start_subsystem(self, start_method, **kwargs):
+        """\
+        Bring up a subsystem of this session's terminal session.
+
+        @param start_method: name of the terminal session's start method (e.g. C{start_sound})
+        @type start_method: C{str}
+        @param kwargs: keyword arguments for the start method
+        @type kwargs: C{dict}
+
+        @raise X2GoSessionException: if this L{X2GoSession} does not have an associated (healthy) terminal session
+
+        """
+        if not self.has_terminal_session() or self.faulty:
+            raise x2go_exceptions.X2GoSessionException('this X2GoSession object does not have any associated terminal')
+        getattr(self.terminal_session, start_method)(**kwargs)
+
+    def _on_subsystem_failure(self, name, exception):
+        """\
+        Handle a subsystem that failed to come up.
+
+        @param name: subsystem name
+        @type name: C{str}
+        @param exception: the exception the subsystem failed with
+        @type exception: C{Exception}
+
+        """
+        if isinstance(exception, x2go_exceptions.X2GoControlSessionException):
+            self.logger('%s' % str(exception), loglevel=log.loglevel_ERROR)
+            self._lock.acquire()
+            if not self.connected:
+                self._lock.release()
+                return
+            self.HOOK_on_control_session_death()
+            self._X2GoSession__disconnect()
+        elif name == 'sshfs' and isinstance(exception, x2go_exceptions.X2GoUserException):
+            self.HOOK_sshfs_not_available()
+            self._SUPPORTED_PRINTING = False
+            self._SUPPORTED_MIMEBOX = False
+            self._SUPPORTED_FOLDERSHARING = False
+        elif name == 'printing' and isinstance(exception, (x2go_exceptions.X2GoUserException, x2go_exceptions.X2GoSFTPClientException)):
+            self.HOOK_printing_not_available()
+            self._SUPPORTED_PRINTING = False
+        elif name == 'mimebox' and isinstance(exception, (x2go_exceptions.X2GoUserException, x2go_exceptions.X2GoSFTPClientException)):
+            self.HOOK_mimebox_not_available()
+            self._SUPPORTED_MIMEBOX = False
+
+    def start_subsystems(self):
+        """\
+        Bring up sound, telekinesis, folder sharing (SSHFS), printing and the MIME box of this
+        session concurrently in the background. Printing and the MIME box get started once
+        folder sharing is ready.
+
+        """
+        self.subsystem_launcher = subsystems.X2GoSubsystemLauncher(logger=self.logger)
+        _launcher = self.subsystem_launcher
+
+        def _add(name, start_method, requires=(), **kwargs):
+            _launcher.add(name, self._start_subsystem, requires=requires,
+                          on_failure=lambda e: self._on_subsystem_failure(name, e),
+                          start_method=start_method, **kwargs)
+
+        if self._SUPPORTED_SOUND and self.terminal_session.params.snd_system is not 'none':
+            _add('sound', 'start_sound')
+        else:
+            self._SUPPORTED_SOUND = False
+
+        if self._SUPPORTED_TELEKINESIS:
+            _add('telekinesis', 'start_telekinesis')
+
+        if (self._SUPPORTED_PRINTING and self.printing) or \
+           (self._SUPPORTED_MIMEBOX and self.allow_mimebox) or \
+           (self._SUPPORTED_FOLDERSHARING and self.allow_share_local_folders):
+            _add('sshfs', 'start_sshfs')
+
+            if self._SUPPORTED_PRINTING and self.printing:
+                _add('printing', 'start_printing', requires=('sshfs', ))
+
+            if self._SUPPORTED_MIMEBOX and self.allow_mimebox:
+                _add('mimebox', 'start_mimebox', requires=('sshfs', ),
+                     mimebox_extensions=self.mimebox_extensions, mimebox_action=self.mimebox_action)
+
+        _launcher.start()
+    __start_subsystems = start_subsystems
+
+    def get_subsystem_status(self):
+        """\
+        Retrieve readiness and start-up time of the subsystems (sound, folder sharing,
+        printing, etc.) of this session.
+
+        @return: dictionary with the subsystem names as keys and status dictionaries (see
+            L{subsystems.X2GoSubsystemLauncher.get_status()}) as values
+        @rtype: C{dict}
+
+        """
+        if self.subsystem_launcher is not None:
+            return self.subsystem_launcher.get_status()
+        return {}
+    __get_subsystem_status = get_subsystem_status
+
     def session_cleanup(self):
         """\
         Clean up X2Go session.
 
         """
+        self.stop_network_monitor()
+
         # release terminal session's proxy
         if self.has_terminal_session():
             self.terminal_session.release_proxy()
@@ -535,10 +535,26 @@ class X2GoRevFwTunnelToSFTP(rforward.X2GoRevFwTunnel):
         self.open_channels = {}
         self.incoming_channel = threading.Condition()
 
+        self._ready = threading.Event()
+
         threading.Thread.__init__(self)
         self.daemon = True
         self._accept_channels = True
 
+    def wait_ready(self, timeout=None):
+        """\
+        Wait for the reverse port forwarding request of this tunnel to be answered by the X2Go server.
+
+        @param timeout: maximum time (in seconds) to wait
+        @type timeout: C{float}
+
+        @return: C{True} if the tunnel is ready
+        @rtype: C{bool}
+
+        """
+        self._ready.wait(timeout)
+        return self.ready
+
     def run(self):
         """\
         This method gets run once an L{X2GoRevFwTunnelToSFTP} has been started with its
@@ -559,9 +575,13 @@ class X2GoRevFwTunnelToSFTP(rforward.X2GoRevFwTunnel):
         stopped via the C{X2GoRevFwTunnelToSFTP.stop_thread()} method.
 
         """
-        self._request_port_forwarding()
-        self._keepalive = True
-        self.ready = True
+        try:
+            self._request_port_forwarding()
+            self._keepalive = True
+            self.ready = True
+        finally:
+            # wake up L{wait_ready()} callers, even if the port forwarding request failed
+            self._ready.set()
         while self._keepalive:
 
             self.incoming_channel.acquire()
@@ -636,8 +656,9 @@ def x2go_rev_forward_sftpchannel_handler(chan=None, auth_key=None, logger=None):
     # start ssh server session
     t.start_server(server=server, event=event)
 
-    while t.is_active():
-        gevent.sleep(1)
+    # the sFTP server transport terminates on the channel itself, wait for it
+    # to finish instead of polling its state
+    t.join()
 
     t.stop_thread()
     logger('sFTP channel %s closed down' % chan, loglevel=log.loglevel_DEBUG)
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoSpoolWatcher} reports files that appear in a spool directory (print job
+spool, MIME box).
+
+On Linux, the spool directory is watched via inotify and files are reported as soon
+as they have been closed after writing (or moved into the spool directory). On
+other platforms (or if inotify is not available) the spool directory gets polled.
+
+"""
+__NAME__ = 'x2gospoolwatch-pylib'
+
+# modules
+import os
+import sys
+import copy
+import time
+import errno
+import struct
+import ctypes
+import ctypes.util
+import gevent
+import gevent.select
+
+# Python X2Go modules
+import log
+
+from defaults import X2GO_SPOOL_POLL_INTERVAL as _X2GO_SPOOL_POLL_INTERVAL
+from defaults import X2GO_SPOOL_USE_INOTIFY as _X2GO_SPOOL_USE_INOTIFY
+
+# inotify constants, see inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_NONBLOCK = 04000
+_IN_CLOEXEC = 02000000
+_IN_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_DELETE | _IN_MOVED_FROM | _IN_DELETE_SELF | _IN_MOVE_SELF
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+_libc = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        _libc.inotify_init1
+        _libc.inotify_add_watch
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def inotify_available():
+    """\
+    Check if inotify can be used on this system.
+
+    @return: C{True} if inotify is available
+    @rtype: C{bool}
+
+    """
+    return _libc is not None
+
+
+class X2GoSpoolWatcher(object):
+    """\
+    Watch a spool directory for new files. Each file is reported only once (until it
+    disappears from the spool directory again).
+
+    """
+    def __init__(self, spool_dir, accept=None, poll_interval=_X2GO_SPOOL_POLL_INTERVAL, use_inotify=_X2GO_SPOOL_USE_INOTIFY,
+                 logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param spool_dir: the spool directory to watch
+        @type spool_dir: C{str}
+        @param accept: a function that gets passed a file name and returns C{True} if the file
+            shall be reported (default: report all files)
+        @type accept: C{func}
+        @param poll_interval: interval (in seconds) for polling the spool directory if inotify is not available
+        @type poll_interval: C{float}
+        @param use_inotify: use inotify (on Linux) instead of polling the spool directory
+        @type use_inotify: C{bool}
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoSpoolWatcher} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.spool_dir = spool_dir
+        self.accept = accept
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and inotify_available()
+
+        self._fd = None
+        self._seen = set()
+        self._pending = []
+        self._last_poll = 0
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """\
+        Stop watching the spool directory.
+
+        """
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def _start_inotify(self):
+        """\
+        Set up an inotify watch on the spool directory.
+
+        @return: C{True} if the spool directory is watched via inotify now
+        @rtype: C{bool}
+
+        """
+        _fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if _fd < 0:
+            self.logger('inotify is not usable (%s), polling spool directory %s' % (os.strerror(ctypes.get_errno()), self.spool_dir), loglevel=log.loglevel_WARN)
+            self.use_inotify = False
+            return False
+
+        _spool_dir = self.spool_dir
+        if type(_spool_dir) is unicode:
+            _spool_dir = _spool_dir.encode(sys.getfilesystemencoding())
+        if _libc.inotify_add_watch(_fd, _spool_dir, _IN_WATCH_MASK) < 0:
+            # the spool directory might not exist yet, try again later
+            os.close(_fd)
+            return False
+
+        self._fd = _fd
+        self.logger('watching spool directory %s via inotify' % self.spool_dir, loglevel=log.loglevel_DEBUG)
+
+        # pick up files that have arrived before the watch got set up
+        self._rescan()
+        return True
+
+    def _add(self, file_name):
+        if file_name not in self._seen and (self.accept is None or self.accept(file_name)):
+            self._seen.add(file_name)
+            self._pending.append(file_name)
+
+    def _rescan(self):
+        """\
+        List the spool directory and update the index of seen files.
+
+        """
+        try:
+            _file_names = os.listdir(self.spool_dir)
+        except OSError:
+            _file_names = []
+        self._seen.intersection_update(_file_names)
+        for _file_name in _file_names:
+            self._add(_file_name)
+
+    def _read_events(self):
+        """\
+        Process all pending inotify events.
+
+        """
+        try:
+            _buf = os.read(self._fd, 65536)
+        except OSError, e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            raise
+
+        _offset = 0
+        while _offset + _INOTIFY_EVENT.size <= len(_buf):
+            (_wd, _mask, _cookie, _length) = _INOTIFY_EVENT.unpack_from(_buf, _offset)
+            _offset += _INOTIFY_EVENT.size
+            _file_name = _buf[_offset:_offset+_length].rstrip('\0')
+            _offset += _length
+
+            if _mask & _IN_Q_OVERFLOW:
+                self._rescan()
+            elif _mask & (_IN_DELETE_SELF | _IN_MOVE_SELF | _IN_IGNORED):
+                # the spool directory is gone, watch it again once it gets re-created
+                self.close()
+                self._seen.clear()
+                return
+            elif _mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                self._add(_file_name)
+            elif _mask & (_IN_DELETE | _IN_MOVED_FROM):
+                self._seen.discard(_file_name)
+
+    def wait(self, timeout=None):
+        """\
+        Wait for new files in the spool directory.
+
+        @param timeout: maximum time (in seconds) to wait for new files, C{None} means: wait forever
+        @type timeout: C{float}
+
+        @return: names of files that appeared since the last call, empty on timeout
+        @rtype: C{list}
+
+        """
+        if not self._pending:
+
+            if self.use_inotify and self._fd is None:
+                self._start_inotify()
+
+            if self._fd is not None:
+                if not self._pending:
+                    (_readable, _, _) = gevent.select.select([self._fd], [], [], timeout)
+                    if _readable:
+                        self._read_events()
+            else:
+                _delay = max(self._last_poll + self.poll_interval - time.time(), 0)
+                if timeout is not None and _delay > timeout:
+                    gevent.sleep(timeout)
+                else:
+                    gevent.sleep(_delay)
+                    self._last_poll = time.time()
+                    self._rescan()
+
+        _new_files = self._pending
+        self._pending = []
+        return _new_files
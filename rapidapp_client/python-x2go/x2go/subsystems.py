@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+L{X2GoSubsystemLauncher} brings up the subsystems of an X2Go session (sound,
+folder sharing, printing, MIME box, telekinesis, etc.) concurrently.
+
+Each subsystem runs in its own greenlet as soon as the subsystems it depends on
+are ready. If a dependency fails, its dependents get skipped. Readiness and
+start-up time of every subsystem are recorded (see L{X2GoSubsystemLauncher.get_status()}).
+
+"""
+__NAME__ = 'x2gosubsystems-pylib'
+
+# modules
+import copy
+import time
+import threading
+import gevent
+
+# Python X2Go modules
+import log
+
+# subsystem states
+STATE_PENDING = 'pending'
+STATE_RUNNING = 'running'
+STATE_READY = 'ready'
+STATE_FAILED = 'failed'
+STATE_SKIPPED = 'skipped'
+
+
+class X2GoSubsystem(object):
+    """\
+    A subsystem that has been registered with an L{X2GoSubsystemLauncher}.
+
+    """
+    def __init__(self, name, target, requires=(), on_failure=None, kwargs={}):
+        """\
+        @param name: subsystem name
+        @type name: C{str}
+        @param target: the function that brings up the subsystem
+        @type target: C{func}
+        @param requires: names of the subsystems that have to be ready before this subsystem gets started
+        @type requires: C{list}
+        @param on_failure: function that gets passed the exception if C{target} fails
+        @type on_failure: C{func}
+        @param kwargs: keyword arguments for the C{target} function
+        @type kwargs: C{dict}
+
+        """
+        self.name = name
+        self.target = target
+        self.requires = tuple(requires)
+        self.on_failure = on_failure
+        self.kwargs = kwargs
+        self.state = STATE_PENDING
+        self.started = None
+        self.finished = None
+        self.exception = None
+        self.greenlet = None
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return '<X2GoSubsystem %s (%s)>' % (self.name, self.state)
+
+    @property
+    def duration(self):
+        """\
+        Time (in seconds) the subsystem took (or has been taking so far) to come up,
+        C{None} if it has not been started.
+
+        """
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def is_done(self):
+        """\
+        Check if the subsystem has come up, has failed or has been skipped.
+
+        @return: C{True} if the subsystem is not pending or running anymore
+        @rtype: C{bool}
+
+        """
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """\
+        Wait for the subsystem to come up (or fail).
+
+        @param timeout: maximum time (in seconds) to wait
+        @type timeout: C{float}
+
+        @return: C{True} if the subsystem is ready
+        @rtype: C{bool}
+
+        """
+        self._done.wait(timeout)
+        return self.state == STATE_READY
+
+
+class X2GoSubsystemLauncher(object):
+    """\
+    Dependency-aware launcher for the subsystems of an X2Go session.
+
+    """
+    def __init__(self, logger=None, loglevel=log.loglevel_DEFAULT):
+        """\
+        @param logger: you can pass an L{X2GoLogger} object to the
+            L{X2GoSubsystemLauncher} constructor
+        @type logger: C{obj}
+        @param loglevel: if no L{X2GoLogger} object has been supplied a new one will be
+            constructed with the given loglevel
+        @type loglevel: C{int}
+
+        """
+        if logger is None:
+            self.logger = log.X2GoLogger(loglevel=loglevel)
+        else:
+            self.logger = copy.deepcopy(logger)
+        self.logger.tag = __NAME__
+
+        self.subsystems = {}
+        self._order = []
+
+    def add(self, name, target, requires=(), on_failure=None, **kwargs):
+        """\
+        Register a subsystem. Subsystems registered after L{start()} has been called
+        get started with the next L{start()} call.
+
+        @param name: subsystem name
+        @type name: C{str}
+        @param target: the function that brings up the subsystem
+        @type target: C{func}
+        @param requires: names of the subsystems that have to be ready before this subsystem gets started
+        @type requires: C{list}
+        @param on_failure: function that gets passed the exception if C{target} fails
+        @type on_failure: C{func}
+        @param kwargs: keyword arguments for the C{target} function
+        @type kwargs: C{dict}
+
+        @return: the registered subsystem
+        @rtype: L{X2GoSubsystem}
+
+        """
+        subsystem = X2GoSubsystem(name, target, requires=requires, on_failure=on_failure, kwargs=kwargs)
+        self.subsystems[name] = subsystem
+        self._order.append(name)
+        return subsystem
+
+    def start(self):
+        """\
+        Start all registered subsystems that have not been started yet. This method
+        does not block.
+
+        """
+        for name in self._order:
+            subsystem = self.subsystems[name]
+            if subsystem.greenlet is None:
+                subsystem.greenlet = gevent.spawn(self._launch, subsystem)
+
+    def _launch(self, subsystem):
+        """\
+        Greenlet: wait for the dependencies of a subsystem, then bring it up.
+
+        @param subsystem: the subsystem to launch
+        @type subsystem: L{X2GoSubsystem}
+
+        """
+        try:
+            for _name in subsystem.requires:
+                _dependency = self.subsystems.get(_name)
+                if _dependency is None or not _dependency.wait():
+                    subsystem.state = STATE_SKIPPED
+                    self.logger('subsystem %s skipped, it requires subsystem %s' % (subsystem.name, _name), loglevel=log.loglevel_INFO)
+                    return
+
+            subsystem.state = STATE_RUNNING
+            subsystem.started = time.time()
+            try:
+                subsystem.target(**subsystem.kwargs)
+                subsystem.state = STATE_READY
+            except Exception, e:
+                subsystem.state = STATE_FAILED
+                subsystem.exception = e
+            subsystem.finished = time.time()
+
+            if subsystem.state == STATE_READY:
+                self.logger('subsystem %s is ready after %.2fs' % (subsystem.name, subsystem.duration), loglevel=log.loglevel_INFO)
+            else:
+                self.logger('subsystem %s failed after %.2fs: %s' % (subsystem.name, subsystem.duration, str(subsystem.exception)), loglevel=log.loglevel_WARN)
+                if subsystem.on_failure is not None:
+                    subsystem.on_failure(subsystem.exception)
+        finally:
+            subsystem._done.set()
+
+    def is_ready(self, name):
+        """\
+        Check if a subsystem is ready.
+
+        @param name: subsystem name
+        @type name: C{str}
+
+        @return: C{True} if the subsystem has come up
+        @rtype: C{bool}
+
+        """
+        return self.subsystems.has_key(name) and self.subsystems[name].state == STATE_READY
+
+    def wait(self, names=None, timeout=None):
+        """\
+        Wait for subsystems to come up (or fail).
+
+        @param names: names of the subsystems to wait for, C{None} means: all registered subsystems
+        @type names: C{list}
+        @param timeout: maximum time (in seconds) to wait
+        @type timeout: C{float}
+
+        @return: C{True} if all these subsystems are ready
+        @rtype: C{bool}
+
+        """
+        if names is None:
+            names = self._order[:]
+        _start = time.time()
+        _ready = True
+        for name in names:
+            if not self.subsystems.has_key(name):
+                _ready = False
+                continue
+            _remaining = None
+            if timeout is not None:
+                _remaining = max(timeout - (time.time() - _start), 0)
+            _ready = self.subsystems[name].wait(_remaining) and _ready
+        return _ready
+
+    def get_status(self):
+        """\
+        Retrieve readiness and start-up time of all registered subsystems.
+
+        @return: dictionary with the subsystem names as keys and dictionaries with the keys C{state}
+            (one of C{pending}, C{running}, C{ready}, C{failed} and C{skipped}), C{duration}
+            (in seconds, C{None} if not started) and C{error} (C{None} unless failed) as values
+        @rtype: C{dict}
+
+        """
+        _status = {}
+        for (name, subsystem) in self.subsystems.items():
+            _status[name] = {
+                'state': subsystem.state,
+                'duration': subsystem.duration,
+                'error': subsystem.exception is not None and str(subsystem.exception) or None,
+            }
+        return _status
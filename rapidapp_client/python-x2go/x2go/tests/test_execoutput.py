@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+Tests for the reader of framed X2Go server-side command output.
+
+"""
+
+import cStringIO
+import unittest
+
+# Python X2Go modules
+import x2go.execoutput as execoutput
+
+_UUID = '0123456789abcdef0123456789abcdef'
+
+def _framed(payload, junk='injected by .bashrc\n'):
+    return '%sX2GODATABEGIN:%s\n%sX2GODATAEND:%s\n%s' % (junk, _UUID, payload, _UUID, junk)
+
+
+class _Channel(object):
+
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.closed = False
+
+    def recv(self, size):
+        _chunk = self.data[:min(size, self.chunk_size)]
+        self.data = self.data[len(_chunk):]
+        return _chunk
+
+    def close(self):
+        self.closed = True
+
+
+class _ChannelFile(object):
+
+    def __init__(self, data, chunk_size=4096):
+        self.channel = _Channel(data, chunk_size)
+
+
+class TestX2GoExecOutputReader(unittest.TestCase):
+
+    def test_payload_between_markers(self):
+        _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO(_framed('line 1\nline 2\n')), _UUID)
+        self.assertEqual(_reader.read(), 'line 1\nline 2\n')
+
+    def test_markers_across_chunk_boundaries(self):
+        _payload = 'session-1|running\nsession-2|suspended\n'
+        for _chunk_size in range(1, len(_framed(_payload)) + 1):
+            _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO(_framed(_payload)), _UUID, chunk_size=_chunk_size)
+            self.assertEqual(_reader.read(), _payload, 'chunk size %s' % _chunk_size)
+
+    def test_lines_across_chunk_boundaries(self):
+        _payload = 'a\nbb\n\nccc\n'
+        for _chunk_size in range(1, len(_framed(_payload)) + 1):
+            _reader = execoutput.X2GoExecOutputReader(_ChannelFile(_framed(_payload), _chunk_size), _UUID)
+            self.assertEqual(_reader.readlines(), ['a\n', 'bb\n', '\n', 'ccc\n'], 'chunk size %s' % _chunk_size)
+
+    def test_payload_without_trailing_newline(self):
+        _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO(_framed('no newline')), _UUID)
+        self.assertEqual(_reader.read(), 'no newline\n')
+
+    def test_empty_payload(self):
+        _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO(_framed('')), _UUID)
+        self.assertEqual(_reader.read(), '')
+
+    def test_missing_markers(self):
+        _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO('X2GODATABEGIN:%s\ntruncated\n' % _UUID), _UUID)
+        self.assertEqual(_reader.read(), 'truncated\n')
+        _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO('no markers at all\n'), _UUID)
+        self.assertEqual(_reader.read(), '')
+
+    def test_foreign_markers_are_payload(self):
+        _payload = 'X2GODATAEND:%s\n' % ('f' * len(_UUID))
+        _reader = execoutput.X2GoExecOutputReader(cStringIO.StringIO(_framed(_payload)), _UUID, chunk_size=7)
+        self.assertEqual(_reader.read(), _payload)
+
+    def test_on_close_after_consumption(self):
+        _calls = []
+        _stream = _ChannelFile(_framed('data\n'), 3)
+        _reader = execoutput.X2GoExecOutputReader(_stream, _UUID, on_close=lambda: _calls.append(1))
+        self.assertEqual(_reader.read(), 'data\n')
+        _reader.close()
+        self.assertEqual(_calls, [1])
+        self.assertFalse(_stream.channel.closed)
+
+    def test_close_before_consumption(self):
+        _calls = []
+        _stream = _ChannelFile(_framed('data\n'))
+        _reader = execoutput.X2GoExecOutputReader(_stream, _UUID, on_close=lambda: _calls.append(1))
+        _reader.__enter__()
+        _reader.__exit__(None, None, None)
+        self.assertEqual(_calls, [1])
+        self.assertTrue(_stream.channel.closed)
+        self.assertEqual(_reader.read(), '')
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestX2GoExecOutputReader))
+    return suite
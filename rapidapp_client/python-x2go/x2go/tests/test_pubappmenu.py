@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+#
+# Python X2Go is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# Python X2Go is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+"""\
+Tests for the published applications menu parser. Run this file directly to benchmark
+the parser against the previous regular expression based implementation.
+
+"""
+
+import re
+import sys
+import timeit
+import unittest
+
+# Python X2Go modules
+import x2go.pubappmenu as pubappmenu
+
+_DESKTOP_ENTRY = """\
+<desktop>
+[Desktop Entry]
+Name=%(name)s
+Name[de]=%(name)s (de)
+Name[fr_FR]=%(name)s (fr_FR)
+Comment=Run %(name)s
+Comment[de]=%(name)s starten
+Exec=%(name)s %%U
+Terminal=%(terminal)s
+Categories=%(categories)s
+</desktop>
+<desktop>
+<icon>
+aWNvbi1vZi0lKG5hbWUpcw==
+</icon>
+[Desktop Entry]
+Name=%(name)s-tool
+Exec=%(name)s-tool %%f
+Categories=Settings;
+</desktop>
+"""
+
+_CATEGORIES = ('AudioVideo;', 'Development;IDE;', 'Education;', 'Game;', 'Graphics;', 'Network;WebBrowser;',
+               'Office;', 'System;', 'Utility;', 'X2Go-Top;', 'Science;', )
+
+def _catalog(size):
+    return ''.join([ _DESKTOP_ENTRY % { 'name': 'app%04d' % i,
+                                       'terminal': i % 7 and 'false' or 'True',
+                                       'categories': _CATEGORIES[i % len(_CATEGORIES)], }
+                     for i in range(size) ])
+
+def _legacy_menu(raw_output, lang, render_submenus):
+    """\
+    The menu tree builder as used by C{X2GoControlSession.get_published_applications()} before
+    the introduction of L{x2go.pubappmenu}.
+
+    """
+    _raw_menu_items = raw_output.split('</desktop>\n')
+    _raw_menu_items = [ i.replace('<desktop>\n', '') for i in _raw_menu_items ]
+    _menu = []
+    for _raw_menu_item in _raw_menu_items:
+        if '<icon>\n' in _raw_menu_item and '</icon>' in _raw_menu_item:
+            _menu_item = _raw_menu_item.split('<icon>\n')[0] + _raw_menu_item.split('</icon>\n')[1]
+            _icon_base64 = _raw_menu_item.split('<icon>\n')[1].split('</icon>\n')[0]
+        else:
+            _menu_item = _raw_menu_item
+            _icon_base64 = None
+        if _menu_item:
+            _menu.append({ 'desktop': _menu_item, 'icon': _icon_base64, })
+
+    _category_map = dict([ (c, []) for c in pubappmenu.MENU_CATEGORIES ])
+    _empty_menus = _category_map.keys()
+    for item in _menu:
+        _menu_entry_name = ''
+        _menu_entry_fallback_name = ''
+        _menu_entry_comment = ''
+        _menu_entry_fallback_comment = ''
+        _menu_entry_exec = ''
+        _menu_entry_cat = ''
+        _menu_entry_shell = False
+        lang_regio = lang
+        lang_only = lang_regio.split('_')[0]
+        for line in item['desktop'].split('\n'):
+            if re.match('^Name\[%s\]=.*' % lang_regio, line) or re.match('Name\[%s\]=.*' % lang_only, line):
+                _menu_entry_name = line.split("=")[1].strip()
+            elif re.match('^Name=.*', line):
+                _menu_entry_fallback_name = line.split("=")[1].strip()
+            elif re.match('^Comment\[%s\]=.*' % lang_regio, line) or re.match('Comment\[%s\]=.*' % lang_only, line):
+                _menu_entry_comment = line.split("=")[1].strip()
+            elif re.match('^Comment=.*', line):
+                _menu_entry_fallback_comment = line.split("=")[1].strip()
+            elif re.match('^Exec=.*', line):
+                _menu_entry_exec = line.split("=")[1].strip()
+            elif re.match('^Terminal=.*(t|T)(r|R)(u|U)(e|E).*', line):
+                _menu_entry_shell = True
+            elif re.match('^Categories=.*', line):
+                if 'X2Go-Top' in line: _menu_entry_cat = 'TOP'
+                elif 'Audio' in line or 'Video' in line: _menu_entry_cat = 'Multimedia'
+                elif 'Development' in line: _menu_entry_cat = 'Development'
+                elif 'Education' in line: _menu_entry_cat = 'Education'
+                elif 'Game' in line: _menu_entry_cat = 'Games'
+                elif 'Graphics' in line: _menu_entry_cat = 'Graphics'
+                elif 'Network' in line: _menu_entry_cat = 'Internet'
+                elif 'Office' in line: _menu_entry_cat = 'Office'
+                elif 'Settings' in line: continue
+                elif 'System' in line: _menu_entry_cat = 'System'
+                elif 'Utility' in line: _menu_entry_cat = 'Utilities'
+                else: _menu_entry_cat = 'Other Applications'
+        if not _menu_entry_exec:
+            continue
+        _menu_entry_exec = _menu_entry_exec.replace('%f', '').replace('%F','').replace('%u','').replace('%U','')
+        if _menu_entry_shell:
+            _menu_entry_exec = "x-terminal-emulator -e '%s'" % _menu_entry_exec
+        if not _menu_entry_cat: _menu_entry_cat = 'Other Applications'
+        if not render_submenus: _menu_entry_cat = 'TOP'
+        if _menu_entry_cat in _empty_menus: _empty_menus.remove(_menu_entry_cat)
+        if not _menu_entry_name: _menu_entry_name = _menu_entry_fallback_name
+        if not _menu_entry_comment: _menu_entry_comment = _menu_entry_fallback_comment
+        if not _menu_entry_comment: _menu_entry_comment = _menu_entry_name
+        _category_map[_menu_entry_cat].append({ 'name': _menu_entry_name, 'comment': _menu_entry_comment,
+                                                'exec': _menu_entry_exec, 'icon': item['icon'], })
+    for _cat in _empty_menus:
+        del _category_map[_cat]
+    for _cat in _category_map.keys():
+        _category_map[_cat] = sorted(_category_map[_cat], key=lambda k: k['name'])
+    return _category_map
+
+def _menus(raw_output, langs, render_submenus):
+    _entries = pubappmenu.parse_menu_items(pubappmenu.split_menu_items(raw_output))
+    return pubappmenu.build_menus(_entries, langs, render_submenus=render_submenus)
+
+
+class TestX2GoPublishedApplicationsMenu(unittest.TestCase):
+
+    def test_matches_legacy_menu(self):
+        _raw_output = _catalog(50)
+        for render_submenus in (True, False):
+            _new = _menus(_raw_output, ['en_US', 'de_DE', 'fr_FR'], render_submenus)
+            for lang in ('en_US', 'de_DE', 'fr_FR'):
+                self.assertEqual(_new[lang], _legacy_menu(_raw_output, lang, render_submenus))
+
+    def test_exec_with_equal_signs(self):
+        _raw_output = '<desktop>\nName=env\nExec=env FOO=bar baz %F\n</desktop>\n'
+        _menu = _menus(_raw_output, ['en_US'], True)['en_US']
+        self.assertEqual(_menu['Other Applications'][0]['exec'], 'env FOO=bar baz ')
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(TestX2GoPublishedApplicationsMenu))
+    return suite
+
+if __name__ == '__main__':
+    _size = len(sys.argv) > 1 and int(sys.argv[1]) or 500
+    _raw_output = _catalog(_size)
+    _langs = ['en_US', 'de_DE', 'fr_FR']
+    _legacy = min(timeit.repeat(lambda: [ _legacy_menu(_raw_output, lang, True) for lang in _langs ], number=5, repeat=3)) / 5
+    _new = min(timeit.repeat(lambda: _menus(_raw_output, _langs, True), number=5, repeat=3)) / 5
+    print 'menu build for %s .desktop entries, %s languages' % (2 * _size, len(_langs))
+    print '  legacy parser: %.2f ms' % (_legacy * 1000)
+    print '  pubappmenu:    %.2f ms' % (_new * 1000)
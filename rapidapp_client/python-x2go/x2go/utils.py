@@ -29,6 +29,7 @@ import locale
 import re
 import types
 import copy
+import time
 import socket
 import gevent
 import string
@@ -41,6 +42,9 @@ from defaults import X2GOCLIENT_OS as _X2GOCLIENT_OS
 from defaults import X2GO_SESSIONPROFILE_DEFAULTS as _X2GO_SESSIONPROFILE_DEFAULTS
 from defaults import X2GO_MIMEBOX_ACTIONS as _X2GO_MIMEBOX_ACTIONS
 from defaults import pack_methods_nx3
+from defaults import X2GO_LINK_AUTO_TIERS as _X2GO_LINK_AUTO_TIERS
+from defaults import X2GO_POLL_INTERVAL_MIN as _X2GO_POLL_INTERVAL_MIN
+from defaults import X2GO_POLL_INTERVAL_MAX as _X2GO_POLL_INTERVAL_MAX
 
 from defaults import BACKENDS as _BACKENDS
 
@@ -51,6 +55,7 @@ if _X2GOCLIENT_OS != 'Windows':
     from defaults import X_DISPLAY as _X_DISPLAY
 
 if _X2GOCLIENT_OS == 'Windows':
+    import win32api
     import win32gui
     import win32print
     import win32con
@@ -67,6 +72,30 @@ def is_in_nx3packmethods(method):
     return method in pack_methods_nx3
 
 
+def select_link_settings(rtt, throughput, tiers=_X2GO_LINK_AUTO_TIERS):
+    """\
+    Choose the NX link class and pack method that suit a measured link quality.
+
+    @param rtt: round trip time (in seconds)
+    @type rtt: C{float}
+    @param throughput: throughput (in bytes per second)
+    @type throughput: C{float}
+    @param tiers: link tiers to choose from (see L{defaults.X2GO_LINK_AUTO_TIERS})
+    @type tiers: C{tuple}
+
+    @return: tuple C{(link, pack)}, C{pack} is C{None} if the chosen tier's pack method is
+        not a valid NX3 compression method
+    @rtype: C{tuple}
+
+    """
+    for (link, min_throughput, max_rtt, pack) in tiers:
+        if throughput >= min_throughput and (max_rtt is None or rtt <= max_rtt):
+            break
+    if not is_in_nx3packmethods(pack):
+        pack = None
+    return (link, pack)
+
+
 def find_session_line_in_x2golistsessions(session_name, stdout):
     """\
     Return the X2Go session meta information as returned by the 
@@ -227,6 +256,7 @@ def _convert_SessionProfileOptions_2_SessionParams(options):
             '2': 'adsl',
             '3': 'wan',
             '4': 'lan',
+            '5': 'auto',
     }
 
     for opt, val in options.iteritems():
@@ -409,6 +439,42 @@ def touch_file(filename, mode='a'):
     f.close()
 
 
+def replace_file_contents(filename, data, mode='wb'):
+    """\
+    Write a file via a temporary file that replaces the original file in a single step
+    (C{rename()} on POSIX systems, C{MoveFileEx()} on Windows). Concurrent readers find
+    either the old or the new content, never a partially written or a missing file.
+
+    @param filename: name of the file to (re)write, missing directories get created
+    @type filename: C{str}
+    @param data: the new file content
+    @type data: C{str}
+    @param mode: the file mode (as used for Python file objects)
+    @type mode: C{str}
+
+    @raise IOError: if the file could not be written
+    @raise OSError: if the file could not be replaced
+
+    """
+    _dirname = os.path.dirname(filename)
+    if _dirname and not os.path.isdir(_dirname):
+        os.makedirs(_dirname)
+    _tmp_filename = '%s.tmp' % filename
+    f = open(_tmp_filename, mode)
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    if _X2GOCLIENT_OS == 'Windows':
+        # os.rename() does not replace existing files on Windows
+        try:
+            win32api.MoveFileEx(_tmp_filename, filename, win32con.MOVEFILE_REPLACE_EXISTING)
+        except win32api.error, e:
+            raise OSError(e.args[0], e.args[2])
+    else:
+        os.rename(_tmp_filename, filename)
+
+
 def unique(seq):
     """\
     Imitates the behaviour of the GNU/uniq command.
@@ -463,6 +529,9 @@ def patiently_remove_file(dirname, filename):
             os.remove(os.path.join(dirname, filename))
             _not_removed = False
         except:
+            if not os.path.exists(os.path.join(dirname, filename)):
+                # someone else has removed the file already
+                break
             # file is probably locked
             gevent.sleep(5)
 
@@ -900,3 +969,35 @@ def which(basename):
                 return os.path.join(path, basename)
 
     return None
+
+
+def poll_until(condition, timeout=None, interval=_X2GO_POLL_INTERVAL_MIN, max_interval=_X2GO_POLL_INTERVAL_MAX):
+    """\
+    Wait (cooperatively) for a condition to become true. The condition is checked
+    immediately, then with an interval that doubles after each unsuccessful check.
+
+    @param condition: function that returns a true value once the awaited state has been reached
+    @type condition: C{func}
+    @param timeout: deadline (in seconds), C{None} means: wait forever
+    @type timeout: C{float}
+    @param interval: initial interval (in seconds) between checks
+    @type interval: C{float}
+    @param max_interval: maximum interval (in seconds) between checks
+    @type max_interval: C{float}
+
+    @return: the condition's last result (a false value if the deadline has been reached)
+    @rtype: C{obj}
+
+    """
+    _deadline = timeout is not None and time.time() + timeout or None
+    while True:
+        _result = condition()
+        if _result:
+            return _result
+        if _deadline is not None:
+            _remaining = _deadline - time.time()
+            if _remaining <= 0:
+                return _result
+            interval = min(interval, _remaining)
+        gevent.sleep(interval)
+        interval = min(interval * 2, max_interval)
@@ -31,6 +31,7 @@ import splash
 import sessiontitle
 import listdesktops
 import serverinfo
+import geventloop
 
 wx.SetDefaultPyEncoding("utf-8")
 
@@ -118,6 +119,7 @@ class PyHocaGUI(wx.App, x2go.X2GoClient):
 
         self.args = args
 
+        # maximum interval between two dispatches of wxPython events (see L{geventloop.PyHocaGUI_GeventLoop})
         self.gevent_sleep_when_idle = 0.25
 
         if logger is None:
@@ -221,7 +223,24 @@ class PyHocaGUI(wx.App, x2go.X2GoClient):
         if not self.args.disable_splash:
             splash.PyHocaGUI_SplashScreen(self, splash_image=self.args.splash_image)
 
-        self.Bind(wx.EVT_IDLE, self.OnIdle)
+        self.gevent_loop = geventloop.PyHocaGUI_GeventLoop(self)
+
+    def MainLoop(self):
+        """\
+        Run the application's main loop, the gevent hub and wxPython share it
+        (see L{geventloop.PyHocaGUI_GeventLoop}).
+
+        """
+        self.gevent_loop.run()
+        self.OnExit()
+
+    def ExitMainLoop(self):
+        """\
+        Leave the application's main loop.
+
+        """
+        self.gevent_loop.exit()
+        wx.App.ExitMainLoop(self)
 
     def OnInit(self):
         """\
@@ -241,29 +260,6 @@ class PyHocaGUI(wx.App, x2go.X2GoClient):
         except: pass
         return True
 
-    def OnIdle(self, evt):
-        """\
-        Integration of gevent/libevent and wxPython.
-
-        Whenever wxPython seems to be idle, inject a gevent.sleep().
-
-        @return: always C{True}
-        @rtype: C{bool}
-
-        """
-        try:
-            gevent.sleep(self.gevent_sleep_when_idle)
-        except KeyboardInterrupt:
-            self._pyhoca_logger('Received Ctrl-C keyboard interrupt... Wait till %s has exited cleanly.' % self.appname, loglevel=x2go.loglevel_NOTICE)
-            self.WakeUpIdle()
-            self.ExitMainLoop()
-        except SystemExit:
-            self._pyhoca_logger('Received SIGTERM signal... Wait till %s has exited cleanly.' % self.appname, loglevel=x2go.loglevel_NOTICE)
-            self.WakeUpIdle()
-            self.ExitMainLoop()
-        evt.RequestMore()
-        return True
-
     def startGUI(self):
         """\
         Startup method for L{PyHocaGUI}.
@@ -593,8 +589,7 @@ class PyHocaGUI(wx.App, x2go.X2GoClient):
             self._hide_notifications_map[profile_name] = []
             gevent.spawn(self._init_pubapp_session, session_uuid)
             #apprime
-            self._pyhoca_logger('====>>>>x2go.guardian.X2GoSessionGuardian.seconds = 0', loglevel=x2go.log.loglevel_INFO, )
-            x2go.guardian.X2GoSessionGuardian.seconds = 0
+            self.session_guardian.trigger_refresh(profile_name)
 
         except x2go.X2GoSessionRegistryException:
             # there might have been a disconnect event inbetween...
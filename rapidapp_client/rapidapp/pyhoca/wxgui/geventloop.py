@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2010-2014 by Mike Gabriel <mike.gabriel@das-netzwerkteam.de>
+# Copyright (C) 2010-2014 by Dick Kniep <dick.kniep@lindix.nl>
+#
+# PyHoca GUI is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# PyHoca GUI is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program; if not, write to the
+# Free Software Foundation, Inc.,
+# 51 Franklin St, Fifth Floor, Boston, MA 02110-1301, USA.
+
+import os
+import time
+import wx
+import gevent
+import gevent.event
+
+import x2go
+
+# shortest interval (in seconds) between two dispatches of pending wxPython events
+_MIN_POLL_INTERVAL = 0.01
+# interval (in seconds) of the timer that services the gevent hub while a modal dialog runs its own wx event loop
+_MODAL_HUB_INTERVAL = 0.05
+# time (in seconds) the gevent hub gets per timer service while greenlets have work
+_BUSY_HUB_SLICE = 0.02
+# if a plain context switch to the gevent hub takes longer than this (in seconds), greenlets had work
+_BUSY_THRESHOLD = 0.001
+
+
+class PyHocaGUI_GeventLoop(object):
+    """\
+    Integration of gevent/libevent and wxPython.
+
+    The gevent hub owns the main loop: it blocks on I/O and on gevent timers, so network
+    traffic of sessions (Paramiko transports, tunnels, sshfs, sound) gets serviced the moment
+    it arrives. The main greenlet wakes up at least every C{gevent_sleep_when_idle} seconds
+    (of the main application instance) and dispatches all pending wxPython events. After
+    wxPython events have been dispatched, it comes back within a few milliseconds. No
+    wxPython idle events get requested, so an idle client does not burn CPU.
+
+    While a modal dialog runs its own wxPython event loop, the main loop cannot come around.
+    A C{wx.Timer} then services the gevent hub every few milliseconds.
+
+    """
+    def __init__(self, _PyHocaGUI, min_interval=_MIN_POLL_INTERVAL):
+        """\
+        gevent/wxPython integration (constructor).
+
+        @param _PyHocaGUI: main application instance
+        @type _PyHocaGUI: C{obj}
+        @param min_interval: shortest interval (in seconds) between two dispatches of pending wxPython events
+        @type min_interval: C{float}
+
+        """
+        self._PyHocaGUI = _PyHocaGUI
+        self._pyhoca_logger = self._PyHocaGUI._pyhoca_logger
+
+        self.min_interval = min_interval
+        self.interval = min_interval
+
+        self._running = False
+        self._wakeup = gevent.event.Event()
+        self._last_dispatch = None
+        self._dispatching_since = None
+
+        self._timer = wx.Timer(self._PyHocaGUI)
+        self._PyHocaGUI.Bind(wx.EVT_TIMER, self.OnTimer, self._timer)
+
+        self._started = None
+        self._cpu_started = None
+        self._ticks = 0
+        self._events = 0
+        self._modal_services = 0
+        self._hub_latency = 0.0
+        self._max_hub_latency = 0.0
+
+    def run(self):
+        """\
+        Run the main loop until L{exit()} gets called. This replaces C{wx.App.MainLoop()}.
+
+        """
+        _evtloop = getattr(wx, 'GUIEventLoop', wx.EventLoop)()
+        _old_evtloop = wx.EventLoop.GetActive()
+        wx.EventLoop.SetActive(_evtloop)
+
+        self._running = True
+        self._started = time.time()
+        self._cpu_started = sum(os.times()[:2])
+        self._timer.Start(max(int(_MODAL_HUB_INTERVAL * 1000), 1))
+        try:
+            while self._running:
+                _dispatched = self._dispatch(_evtloop)
+                if _dispatched:
+                    self.interval = self.min_interval
+                else:
+                    self.interval = min(self.interval * 2, max(self._PyHocaGUI.gevent_sleep_when_idle, self.min_interval))
+
+                _due = time.time() + self.interval
+                try:
+                    # the gevent hub runs (and blocks on I/O) until the interval is over or we get woken up
+                    if not self._wakeup.wait(self.interval):
+                        _latency = max(time.time() - _due, 0)
+                        self._hub_latency += _latency
+                        self._max_hub_latency = max(self._max_hub_latency, _latency)
+                    self._wakeup.clear()
+                except KeyboardInterrupt:
+                    self._pyhoca_logger('Received Ctrl-C keyboard interrupt... Wait till %s has exited cleanly.' % self._PyHocaGUI.appname, loglevel=x2go.loglevel_NOTICE)
+                    self._running = False
+                except SystemExit:
+                    self._pyhoca_logger('Received SIGTERM signal... Wait till %s has exited cleanly.' % self._PyHocaGUI.appname, loglevel=x2go.loglevel_NOTICE)
+                    self._running = False
+                self._ticks += 1
+        finally:
+            self._timer.Stop()
+            wx.EventLoop.SetActive(_old_evtloop)
+
+        _stats = self.get_stats()
+        self._pyhoca_logger('gevent/wxPython integration: %s main loop iterations, %s wxPython events, %s hub services during modal dialogs, CPU usage %.2f%%, average/maximum hub latency %.1fms/%.1fms' % (_stats['ticks'], _stats['events'], _stats['modal_services'], _stats['cpu_usage'] * 100, _stats['avg_hub_latency'] * 1000, _stats['max_hub_latency'] * 1000), loglevel=x2go.loglevel_DEBUG)
+
+    def _dispatch(self, evtloop):
+        """\
+        Dispatch all pending wxPython events.
+
+        @param evtloop: the main loop's wxPython event loop
+        @type evtloop: C{wx.EventLoop}
+
+        @return: number of dispatched events
+        @rtype: C{int}
+
+        """
+        self._last_dispatch = time.time()
+        _dispatched = 0
+        while self._running and evtloop.Pending():
+            self._dispatching_since = time.time()
+            evtloop.Dispatch()
+            self._dispatching_since = None
+            _dispatched += 1
+        self._PyHocaGUI.ProcessIdle()
+        self._events += _dispatched
+        self._last_dispatch = time.time()
+        return _dispatched
+
+    def exit(self):
+        """\
+        Make L{run()} return as soon as possible.
+
+        """
+        self._running = False
+        self.wake()
+
+    def wake(self):
+        """\
+        Dispatch pending wxPython events as soon as possible, e.g. after a greenlet has changed the GUI.
+
+        """
+        self._wakeup.set()
+
+    def OnTimer(self, evt):
+        """\
+        Hand over control to the gevent hub if the main loop has not come around for a
+        while (i.e., a modal dialog is running its own wxPython event loop).
+
+        @param evt: event
+        @type evt: C{obj}
+
+        """
+        _now = time.time()
+        if self._dispatching_since is not None:
+            # a wxPython event handler has been running a nested event loop for a while
+            _nested = _now - self._dispatching_since > _MODAL_HUB_INTERVAL
+        else:
+            # a greenlet is running a nested event loop, the main loop has missed its wake-up
+            _nested = self._last_dispatch is not None and _now - self._last_dispatch > self.interval + _MODAL_HUB_INTERVAL
+        if not _nested:
+            return
+        try:
+            _start = time.time()
+            gevent.sleep(0)
+            if time.time() - _start > _BUSY_THRESHOLD:
+                # let the greenlets that have work make some progress
+                gevent.sleep(_BUSY_HUB_SLICE)
+        except KeyboardInterrupt:
+            self._pyhoca_logger('Received Ctrl-C keyboard interrupt... Wait till %s has exited cleanly.' % self._PyHocaGUI.appname, loglevel=x2go.loglevel_NOTICE)
+            self._PyHocaGUI.ExitMainLoop()
+        except SystemExit:
+            self._pyhoca_logger('Received SIGTERM signal... Wait till %s has exited cleanly.' % self._PyHocaGUI.appname, loglevel=x2go.loglevel_NOTICE)
+            self._PyHocaGUI.ExitMainLoop()
+        self._modal_services += 1
+
+    def get_stats(self):
+        """\
+        Retrieve statistics of the gevent/wxPython integration.
+
+        @return: dictionary with the keys C{ticks} (main loop iterations), C{events} (dispatched
+            wxPython events), C{modal_services} (hub services by the timer while a modal dialog was
+            running), C{interval} (current poll interval), C{avg_hub_latency}, C{max_hub_latency}
+            (in seconds, how late the hub handed control back to the main loop because greenlets
+            kept it busy) and C{cpu_usage} (CPU time of the process per wall clock time since L{run()}
+            has been called)
+        @rtype: C{dict}
+
+        """
+        _ticks = self._ticks or 1
+        _wall_time = self._started is not None and time.time() - self._started or 0.0
+        _cpu_time = self._cpu_started is not None and sum(os.times()[:2]) - self._cpu_started or 0.0
+        return {
+            'ticks': self._ticks,
+            'events': self._events,
+            'modal_services': self._modal_services,
+            'interval': self.interval,
+            'avg_hub_latency': self._hub_latency / _ticks,
+            'max_hub_latency': self._max_hub_latency,
+            'cpu_usage': _wall_time and _cpu_time / _wall_time or 0.0,
+        }
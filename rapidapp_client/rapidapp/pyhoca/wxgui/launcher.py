@@ -8,6 +8,8 @@ import gettext
 import subprocess
 import copy
 import socket
+import time
+import hashlib
 import urllib2
 import zipfile
 from subprocess import Popen
@@ -23,6 +25,7 @@ from x2go import X2GOCLIENT_OS
 from x2go import CURRENT_LOCAL_USER
 from x2go import BACKENDS
 from x2go import X2GoLogger
+import gevent
 
 from pyhoca.wxgui import __VERSION__
 from frontend import PyHocaGUI
@@ -31,6 +34,12 @@ from messages import PyHoca_MessageWindow_Ok
 import defaults
 import basepath
 
+#Apprime self-update
+_UPDATE_URL = "http://ldap.ap.appocloud.com/updates/"
+# reuse the result of a version check for this many seconds
+_UPDATE_CHECK_MAX_AGE = 6 * 3600
+_UPDATE_CHUNK_SIZE = 65536
+
 
 class PyHocaGUI_Launcher(object):
 
@@ -45,6 +54,7 @@ VERSION: %s
 """ % (self.PROG_NAME, self.PROG_PID, self.VERSION)
 
         self.default_options = defaults.default_options
+        self.update_dir = os.path.join(os.path.abspath(os.path.curdir), "updates")
 
     def setup_progname(self, pname):
         self.PROG_NAME = pname
@@ -354,41 +364,213 @@ VERSION: %s
         return a, logger, liblogger
 
 
+    def _readUpdateState(self, name):
+        try:
+            f = open(os.path.join(self.update_dir, name), 'r')
+            try:
+                return f.read().strip()
+            finally:
+                f.close()
+        except IOError:
+            return None
+
+    def _writeUpdateState(self, name, value):
+        if not os.path.isdir(self.update_dir):
+            os.makedirs(self.update_dir)
+        f = open(os.path.join(self.update_dir, name), 'w')
+        try:
+            f.write(value)
+        finally:
+            f.close()
+
+    def _removeUpdateState(self, name):
+        if os.path.exists(os.path.join(self.update_dir, name)):
+            os.remove(os.path.join(self.update_dir, name))
+
     def checkNewVersion(self):
         #Apprime Check
+        # a recent result of the version check gets reused
+        _cached = (self._readUpdateState('version_check') or '').split()
+        if len(_cached) == 3 and _cached[0] == self.VERSION:
+            try:
+                if 0 <= time.time() - float(_cached[1]) <= _UPDATE_CHECK_MAX_AGE:
+                    return _cached[2]
+            except ValueError:
+                pass
+
         response = None
         updateRequired = "0"
         try:
-            response = urllib2.urlopen("http://ldap.ap.appocloud.com/updates/version.php?prgname=%s&version=%s" % (self.PROG_NAME, self.VERSION), timeout=3 )
+            response = urllib2.urlopen(_UPDATE_URL + "version.php?prgname=%s&version=%s" % (self.PROG_NAME, self.VERSION), timeout=3 )
             if(response.getcode() != 200):
                 sys.stdout.write('====>>>>>VG: Version check failed. Response code = %d\n' % response.getcode() )
-                return 0
-            updateRequired = response.read().strip();
+                return "0"
+            updateRequired = response.read().strip() or "0";
             sys.stdout.write('====>>>>>VG: Updater gave %s\n' % updateRequired)
         except Exception as ex:
-            sys.stdout.write('====>>>>>VG: Unable to do version check %s\n' % ex.message)
-            return 0
+            sys.stdout.write('====>>>>>VG: Unable to do version check %s\n' % ex)
+            return "0"
+        try:
+            self._writeUpdateState('version_check', '%s %s %s' % (self.VERSION, time.time(), updateRequired))
+        except (IOError, OSError) as ex:
+            sys.stdout.write('====>>>>>VG: Unable to cache version check %s\n' % ex)
         if(updateRequired != '0'):
             sys.stdout.write('====>>>>>VG: New version found. Update\n')
         return updateRequired
-    
+
+    def _downloadFile(self, url, filename):
+        """\
+        Stream a file to disk in chunks. A partial download from a previous attempt gets resumed
+        (HTTP range request).
+
+        @return: C{False} if the server does not provide the file
+        @rtype: C{bool}
+
+        """
+        _offset = os.path.exists(filename) and os.path.getsize(filename) or 0
+        request = urllib2.Request(url)
+        if _offset:
+            request.add_header('Range', 'bytes=%d-' % _offset)
+        try:
+            response = urllib2.urlopen(request, timeout=30)
+        except urllib2.HTTPError as ex:
+            if ex.code == 416:
+                # the partial download is complete already
+                return True
+            if ex.code == 404:
+                return False
+            raise
+        try:
+            if _offset and response.getcode() != 206:
+                # the server does not support resuming, start over
+                _offset = 0
+            sys.stdout.write('====>>>>VG: downloading %s (resuming at byte %d)\n' % (url, _offset))
+            output = open(filename, _offset and 'ab' or 'wb')
+            try:
+                while True:
+                    chunk = response.read(_UPDATE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    output.write(chunk)
+            finally:
+                output.close()
+        finally:
+            response.close()
+        return True
+
+    def _expectedChecksum(self, url):
+        """\
+        Retrieve the published SHA-256 checksum of an update file, C{None} if there is none.
+
+        """
+        try:
+            response = urllib2.urlopen(url + ".sha256", timeout=3)
+            try:
+                return (response.read().split() or [None])[0]
+            finally:
+                response.close()
+        except urllib2.HTTPError as ex:
+            if ex.code == 404:
+                return None
+            raise
+
+    def _verifyUpdate(self, filename, checksum):
+        if checksum is not None:
+            h = hashlib.sha256()
+            f = open(filename, 'rb')
+            try:
+                while True:
+                    chunk = f.read(_UPDATE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+            finally:
+                f.close()
+            if h.hexdigest() != checksum.lower():
+                sys.stdout.write('====>>>>VG: checksum mismatch for %s\n' % filename)
+                return False
+        else:
+            sys.stdout.write('====>>>>VG: no checksum published for %s, checking the archive only\n' % filename)
+        try:
+            with zipfile.ZipFile(filename, "r") as z:
+                return z.testzip() is None
+        except zipfile.BadZipfile:
+            return False
+
+    def downloadUpdate(self, newversion):
+        """\
+        Download (and verify) an update. A delta update from the running version is preferred,
+        the full update is the fallback. A verified update gets installed on the next start.
+
+        @return: C{True} if the update is ready to be installed
+        @rtype: C{bool}
+
+        """
+        if not os.path.isdir(self.update_dir):
+            os.makedirs(self.update_dir)
+        # remove leftovers of other versions
+        for name in os.listdir(self.update_dir):
+            if name == 'version_check' or name.startswith(newversion + '.'):
+                continue
+            if os.path.isdir(os.path.join(self.update_dir, name)):
+                shutil.rmtree(os.path.join(self.update_dir, name), ignore_errors=True)
+            else:
+                os.remove(os.path.join(self.update_dir, name))
+
+        outputFilename = os.path.join(self.update_dir, newversion + ".zip")
+        for (kind, updatefile) in (('delta', _UPDATE_URL + "%s-%s.upd" % (self.VERSION, newversion)),
+                                   ('full', _UPDATE_URL + newversion + ".upd")):
+            partFilename = os.path.join(self.update_dir, "%s.%s.part" % (newversion, kind))
+            if not self._downloadFile(updatefile, partFilename):
+                sys.stdout.write('====>>>>VG: no %s update available for version %s\n' % (kind, newversion))
+                continue
+            if self._verifyUpdate(partFilename, self._expectedChecksum(updatefile)):
+                if os.path.exists(outputFilename):
+                    os.remove(outputFilename)
+                os.rename(partFilename, outputFilename)
+                self._writeUpdateState('pending', newversion)
+                sys.stdout.write('====>>>>VG: %s update to version %s is ready\n' % (kind, newversion))
+                return True
+            # never resume from a corrupt download
+            os.remove(partFilename)
+        return False
+
+    def pendingUpdate(self):
+        """\
+        Check for an update that has been downloaded (and verified) before.
+
+        @return: the version of the update, C{None} if there is none
+        @rtype: C{str}
+
+        """
+        newversion = self._readUpdateState('pending')
+        if newversion and os.path.isfile(os.path.join(self.update_dir, newversion + ".zip")):
+            return newversion
+        return None
+
+    def backgroundUpdate(self):
+        """\
+        Check for a new version and download it (runs in a greenlet while the GUI is up).
+
+        """
+        try:
+            newver = self.checkNewVersion()
+            if newver != '0' and self.pendingUpdate() != newver:
+                self.downloadUpdate(newver)
+        except Exception as ex:
+            sys.stdout.write('====>>>>>VG: Unable to download update %s\n' % ex)
+
     def update2latest(self, newversion):
         sys.stdout.write('====>>>>VG: Updating to new version\n')
         updatedirname = ""
         try:
-            downloadpath = os.path.abspath(os.path.curdir) + "/updates"
-            shutil.rmtree(downloadpath, ignore_errors=True) #remove any previous updates
-            os.mkdir(downloadpath)
-            outputFilename = downloadpath + "/" + newversion + ".zip";
-            updatefile = "http://ldap.ap.appocloud.com/updates/" + newversion + ".upd"
-            response = urllib2.urlopen(updatefile)
-            zippedData = response.read()
-            output = open(outputFilename,'wb')
-            output.write(zippedData)
-            output.close()
+            # a failing update must not be retried on every start
+            self._removeUpdateState('pending')
+            outputFilename = os.path.join(self.update_dir, newversion + ".zip")
+            updatedirname = os.path.join(self.update_dir, newversion)
+            shutil.rmtree(updatedirname, ignore_errors=True)
             with zipfile.ZipFile(outputFilename, "r") as z:
-                z.extractall(downloadpath)
-            updatedirname = downloadpath + "/" + newversion
+                z.extractall(self.update_dir)
             #execute the update
             #updatecmd = "index.bat " + "\""+updatedirname + "\" \"" + os.path.abspath(os.path.curdir) + "\""
             updatecmd = "index.bat" 
@@ -402,7 +584,7 @@ VERSION: %s
                 os.execl(python, python, * sys.argv)
         
         except Exception as ex:
-            sys.stdout.write('====>>>>>VG: Unable to do version check %s\n' % ex.message)
+            sys.stdout.write('====>>>>>VG: Unable to install update %s\n' % ex)
             return
             
     
@@ -425,13 +607,15 @@ VERSION: %s
 
         thisPyHocaGUI = None
         try:
-            #Apprime - check new version availability and upgrade
-            newver = self.checkNewVersion()
+            #Apprime - install an update that has been downloaded in the background before
             sys.stdout.write('====>>>>>VG: basepath = %s \n' % os.path.abspath(os.path.curdir))
-            if (newver != '0'):
+            newver = self.pendingUpdate()
+            if newver is not None:
                 self.update2latest(newver)
             #Apprime code end
             thisPyHocaGUI = PyHocaGUI(args, logger, liblogger, appname=self.PROG_NAME, version=self.VERSION)
+            #Apprime - check new version availability without delaying the startup
+            gevent.spawn(self.backgroundUpdate)
             thisPyHocaGUI.MainLoop()
         except KeyboardInterrupt:
             if thisPyHocaGUI is not None:
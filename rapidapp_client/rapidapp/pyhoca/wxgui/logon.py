@@ -112,6 +112,7 @@ class PyHocaGUI_DialogBoxPassword(wx.Dialog):
 
         self.Bind(wx.EVT_BUTTON, self.OnLogin, self.loginBtn)
         self.Bind(wx.EVT_TEXT_ENTER, self.OnLogin, self.userTxt)
+        self.userTxt.Bind(wx.EVT_KILL_FOCUS, self.OnUserEntered)
         self.Bind(wx.EVT_TEXT_ENTER, self.OnLogin, self.passwordTxt)
         self.Bind(wx.EVT_BUTTON, self.OnCancel, self.cancelBtn)
 
@@ -163,6 +164,9 @@ class PyHocaGUI_DialogBoxPassword(wx.Dialog):
             if not self.current_profile_config['user'] and not self.sshproxy_auth:
                 self.userTxt.SetFocus()
 
+        # ask the load balancer for the user's server node while the password is being typed
+        self._PyHocaGUI.prefetch_load_balancer_node(self.userTxt.GetValue())
+
         if self.sshproxy_auth:
 
             if self.current_profile_config.has_key('sshproxyuser'):
@@ -210,6 +214,17 @@ class PyHocaGUI_DialogBoxPassword(wx.Dialog):
         self.Move((move_x, move_y))
         self.Show()
 
+    def OnUserEntered(self, evt):
+        """\
+        If the user leaves the username field of the logon window.
+
+        @param evt: event
+        @type evt: C{obj}
+
+        """
+        self._PyHocaGUI.prefetch_load_balancer_node(self.userTxt.GetValue())
+        evt.Skip()
+
     def OnLogin(self, evt):
         """\
         If the user clicks ,,Ok'' in the logon window.
@@ -303,6 +303,7 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         self.SSHProxyPort = wx.SpinCtrl(self.tab_Connection, -1, "22", min=1, max=65534)
         self.SSHProxyAutoLogin = wx.CheckBox(self.tab_Connection, -1, _(u"Discover SSH keys or use SSH agent for proxy authentication"))
 
+        self.LinkSpeedAuto = wx.CheckBox(self.tab_LinkQuality, -1, _(u"Detect the link speed automatically before each session start or resume"))
         self.LinkSpeed = wx.Slider(self.tab_LinkQuality, -1, 0, 0, 4)
         self.ModemLabel = wx.StaticText(self.tab_LinkQuality, -1, "|\n "+_(u"Modem"), style=wx.ALIGN_CENTRE)
         self.ISDNLabel = wx.StaticText(self.tab_LinkQuality, -1, "|\n "+_(u"ISDN"), style=wx.ALIGN_CENTRE)
@@ -430,6 +431,7 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         self.Bind(wx.EVT_RADIOBUTTON, self.OnSetKeyboard, self.CustomSetKeyboard)
         self.Bind(wx.EVT_CHECKBOX, self.OnSoundEnable, self.EnableSound)
         self.Bind(wx.EVT_CHECKBOX, self.OnDefaultSoundPort, self.DefaultSoundPort)
+        self.Bind(wx.EVT_CHECKBOX, self.OnLinkSpeedAuto, self.LinkSpeedAuto)
         self.Bind(wx.EVT_RADIOBUTTON, self.OnPulseAudio, self.PulseAudio)
         self.Bind(wx.EVT_RADIOBUTTON, self.OnEsd, self.Esd)
         self.Bind(wx.EVT_BUTTON, self.OnSelectSharedFolderPath, self.SharedFolderPathBrowseButton)
@@ -668,6 +670,8 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         sizer_4 = wx.BoxSizer(wx.VERTICAL)
         sizer_4_1 = wx.StaticBoxSizer(self.staticbox_LinkSpeed, wx.VERTICAL)
         sizer_4_1_1 = wx.BoxSizer(wx.VERTICAL)
+        sizer_4_1_1.Add(self.LinkSpeedAuto)
+        sizer_4_1_1.Add((0,8))
         sizer_4_1_1_1 = wx.BoxSizer(wx.VERTICAL)
         sizer_4_1_1_1.Add(self.LinkSpeed)
         sizer_4_1_1_2 = wx.GridSizer(1,5,0,0)
@@ -1016,11 +1020,14 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
             self.UsePublishedApplications.Enable(False)
             self.RootlessSession.Enable(False)
 
+        # link speed 5 means: detect the link speed automatically
+        self.LinkSpeedAuto.SetValue(self.profile_config['speed'] == 5)
         if self.profile_config['speed'] in range(5):
             _link_speed = self.profile_config['speed']
         else:
             _link_speed = self.profileManagerDefaults['speed']
         self.LinkSpeed.SetValue(_link_speed)
+        self._toggle_LinkSpeed()
         if '%s-%%' % self.profile_config['pack'] in self._compressions and self.profile_config['quality'] and (self.profile_config['quality'] in range(1,10)):
             self.Compression.SetValue('%s-%%' % self.profile_config['pack'])
             self.ImageQuality.SetValue(self.profile_config['quality'])
@@ -1399,7 +1406,10 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         self.profile_config['command'] = _command
         self.profile_config['xdmcpserver'] = self.XDMCPServer.GetValue()
 
-        _link_idx = self.LinkSpeed.GetValue()
+        if self.LinkSpeedAuto.GetValue():
+            _link_idx = 5
+        else:
+            _link_idx = self.LinkSpeed.GetValue()
         self.profile_config['speed'] = _link_idx
 
         self.profile_config['pack'] = self.Compression.GetValue().rstrip('-%')
@@ -1583,6 +1593,7 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         self.SSHProxyPortLabel.Enable(False)
         self.SSHProxyPort.Enable(False)
         self.SSHProxyAutoLogin.Enable(False)
+        self.LinkSpeedAuto.Enable(False)
         self.LinkSpeed.Enable(False)
         self.ModemLabel.Enable(False)
         self.ISDNLabel.Enable(False)
@@ -1642,12 +1653,8 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         self.UseSSHProxy.Enable(True)
         self.staticbox_Proxy.Enable(True)
         self.staticbox_LinkSpeed.Enable(True)
-        self.LinkSpeed.Enable(True)
-        self.ModemLabel.Enable(True)
-        self.ISDNLabel.Enable(True)
-        self.ADSLLabel.Enable(True)
-        self.WANLabel.Enable(True)
-        self.LANLabel.Enable(True)
+        self.LinkSpeedAuto.Enable(True)
+        self._toggle_LinkSpeed()
         self.staticbox_Compression.Enable(True)
         self.CompressionLabel.Enable(True)
         self.Compression.Enable(True)
@@ -2252,6 +2259,29 @@ class PyHocaGUI_ProfileManager(wx.Dialog):
         """
         self._toggle_DefaultSoundPort()
 
+    def OnLinkSpeedAuto(self, event):
+        """\
+        Gets called if the user chooses to have the link speed detected automatically.
+
+        @param event: event
+        @type event: C{obj}
+
+        """
+        self._toggle_LinkSpeed()
+
+    def _toggle_LinkSpeed(self):
+        """\
+        Gets called indirectly on activation/deactivation of the automatic-link-speed checkbox.
+
+        """
+        _manual = not self.LinkSpeedAuto.GetValue()
+        self.LinkSpeed.Enable(_manual)
+        self.ModemLabel.Enable(_manual)
+        self.ISDNLabel.Enable(_manual)
+        self.ADSLLabel.Enable(_manual)
+        self.WANLabel.Enable(_manual)
+        self.LANLabel.Enable(_manual)
+
     def _toggle_DefaultSoundPort(self):
         """\
         Gets called indirectly on activation/deactivation of the default-sound-port checkbox.
@@ -150,6 +150,12 @@ class PyHocaGUI_DialogBoxServerInfo(wx.Dialog):
 
         self.infoArea.AppendText(newline)
         self.infoArea.AppendText("Network latency \t= %d ms ( <75 is good )\n" % self._PyHocaGUI.getServerLatency())
+        for session_uuid in self._PyHocaGUI.client_running_sessions_of_profile_name(self.current_profile_name):
+            quality = self._PyHocaGUI.get_session_network_quality(session_uuid)
+            if quality and quality['rtt']:
+                self.infoArea.AppendText("SSH RTT \t\t= %d / %d / %d ms ( median / p90 / p99 of %d samples )\n" % (quality['rtt']['p50']*1000, quality['rtt']['p90']*1000, quality['rtt']['p99']*1000, quality['samples']))
+            if quality and quality['throughput_down']:
+                self.infoArea.AppendText("Throughput \t= %d / %d KiB/s ( median down / up )\n" % (quality['throughput_down']['p50']/1024, quality['throughput_up']['p50']/1024))
         cmdlatency = "failed"
         starttime = datetime.datetime.now()
         #run status cmd on server and get as string